@@ -3,9 +3,9 @@ Smart Personal Assistant - Backend API
 المساعد الشخصي الذكي - الخادم الرئيسي
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from contextlib import asynccontextmanager
 import logging
 from datetime import datetime
@@ -17,8 +17,14 @@ load_dotenv()
 
 # استيراد الـ routers
 from app.routers import calls, messages, settings, reports, voice_training
-from app.services.database import DatabaseService
+from app.services.container import ServiceContainer, get_services
+from app.services.http_pool import get_pool_stats
+from app.services.speech_engines import get_engine_stats
+from app.services.thinking_sounds import get_thinking_sound_cache
+from app.services.tts_cache import get_tts_cache
 from app.utils.logger import setup_logger
+from app.utils.metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, metrics_summary
+from app.utils.upload_limit import UploadSizeLimitMiddleware
 
 # إعداد Logger
 logger = setup_logger(__name__)
@@ -30,9 +36,10 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Starting Smart Personal Assistant Backend...")
     
-    # تهيئة قاعدة البيانات
-    db_service = DatabaseService()
-    await db_service.initialize()
+    # كل الخدمات المشتركة تُبنى هنا مرة واحدة وتصل للـ routers عبر Depends(get_services)
+    services = ServiceContainer()
+    await services.startup()
+    app.state.services = services
     
     # تهيئة المجلدات المطلوبة
     os.makedirs("temp_audio", exist_ok=True)
@@ -45,7 +52,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("🛑 Shutting down Smart Personal Assistant Backend...")
-    await db_service.close()
+    await services.shutdown()
     logger.info("✅ Cleanup completed")
 
 # إنشاء تطبيق FastAPI
@@ -67,6 +74,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# حد حجم الصوت المرفوع للـ endpoints الثنائية (يُطبق أثناء الاستقبال)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=int(os.getenv("MAX_AUDIO_UPLOAD_BYTES", str(10 * 1024 * 1024))),
+    paths=(
+        "/api/calls/handle-incoming/upload",
+        "/api/calls/handle-incoming/raw",
+        "/api/messages/handle/upload",
+        "/api/messages/handle/raw",
+    )
+)
+
 # تضمين الـ Routers
 app.include_router(calls.router, prefix="/api/calls", tags=["المكالمات"])
 app.include_router(messages.router, prefix="/api/messages", tags=["الرسائل"])
@@ -122,18 +141,35 @@ async def health_check():
     }
 
 @app.get("/api/status")
-async def api_status():
+async def api_status(services: ServiceContainer = Depends(get_services)):
     """حالة الـ API وإحصائيات الاستخدام"""
+    
+    summary = metrics_summary()
+    
     return {
         "status": "active",
-        "uptime": "unknown",  # يمكن تحسينها لاحقاً
+        "uptime_seconds": summary["uptime_seconds"],
         "stats": {
-            "total_calls_today": 0,  # من قاعدة البيانات
-            "active_users": 0,
-            "avg_response_time": "1.2s"
-        }
+            # منذ بدء الـ process (لكل worker)
+            "calls": summary["calls"],
+            "calls_in_flight": summary["calls_in_flight"],
+            "avg_response_time": summary["avg_response_time"]
+        },
+        "latency": summary["stages"],
+        "database_latency": summary["database"],
+        "upstream": summary["upstream"],
+        "services": services.stats(),
+        "http_pools": get_pool_stats(),
+        "speech_engines": get_engine_stats(),
+        "thinking_sounds": get_thinking_sound_cache().stats(),
+        "tts_cache": get_tts_cache().stats()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """المقاييس بصيغة Prometheus"""
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # =====================================
 # معالج الأخطاء العام
 # =====================================
@@ -53,7 +53,7 @@ class CallResponse(BaseModel):
     response_text: str = Field(..., description="نص الرد")
     emotion: EmotionType = Field(..., description="المشاعر المستخدمة")
     delay_ms: int = Field(..., description="التأخير قبل الرد (ميلي ثانية)")
-    thinking_sound: Optional[str] = Field(None, description="صوت التفكير")
+    thinking_sound: Optional[str] = Field(None, description="مقطع صوت التفكير (base64 MP3) - ملصوق أيضاً في بداية response_audio")
 
 class CallSummary(BaseModel):
     """ملخص المكالمة"""
@@ -231,6 +231,9 @@ class AIResponse(BaseModel):
     requires_follow_up: bool = False
     suggested_actions: List[str] = Field(default_factory=list)
     thinking_time_ms: int = Field(..., ge=0)
+    # الردود المتدفقة فقط
+    time_to_first_token_ms: Optional[int] = Field(None, ge=0)
+    tokens_per_second: Optional[float] = Field(None, ge=0.0)
 
 # =====================================
 # Error Response
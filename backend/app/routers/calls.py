@@ -3,100 +3,144 @@ Router للمكالمات
 Calls API Endpoints
 """
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, UploadFile, File, Form, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional
+from urllib.parse import quote
 import logging
 import base64
+import json
 import asyncio
 import random
+import time
+import uuid
 
 from app.models.schemas import CallRequest, CallResponse, EmotionType
-from app.services.ai_service import AIService
-from app.services.edge_tts_service import EdgeTTSService
-from app.services.speech_service import SpeechService
-from app.services.database import DatabaseService
-from app.services.summary_service import SummaryService
+from app.services.call_views import CallView
+from app.services.call_session import CallSession
+from app.services.container import ServiceContainer, get_services
+from app.services.database import DatabaseService, decode_cursor, encode_cursor
+from app.services.speech_engines import AudioInput
 from app.models.schemas import ConversationContext
+from app.utils.metrics import CALL_STAGE_SECONDS, CALLS_IN_FLIGHT, CALLS_TOTAL
+from app.utils.streaming import prime_stream
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# تهيئة الخدمات الجديدة (Groq + Edge TTS)
-ai_service = AIService()
-tts_service = EdgeTTSService()  # Edge TTS - مجاني وطبيعي!
-stt_service = SpeechService()   # Groq Whisper - مجاني وسريع!
-db_service = DatabaseService()
-summary_service = SummaryService()
-
-@router.post("/handle-incoming", response_model=CallResponse)
-async def handle_incoming_call(
-    request: CallRequest,
-    background_tasks: BackgroundTasks
-):
+async def process_incoming_call(
+    user_id: str,
+    caller_phone: str,
+    caller_name: Optional[str],
+    audio: Optional[AudioInput],
+    background_tasks: BackgroundTasks,
+    services: ServiceContainer,
+    stream_audio: bool = False
+) -> Dict[str, Any]:
     """
-    معالجة مكالمة واردة
+    المعالجة المشتركة لكل أشكال handle-incoming (JSON / multipart / raw)
     
-    هذا الـ endpoint يستقبل مكالمة واردة ويقوم بـ:
     1. تحويل صوت المتصل إلى نص (STT)
     2. تحليل النص وتوليد رد ذكي (AI)
-    3. تحويل الرد إلى صوت بصوت المستخدم (TTS)
-    4. إرجاع الصوت للتطبيق للتشغيل
+    3. تحويل الرد إلى صوت (TTS)
+    
+    Returns:
+        Dict فيه الصوت كـ bytes خام في audio، أو مع stream_audio=True
+        مولد chunks في audio_stream يبدأ قبل انتهاء التوليف
     """
     
-    try:
-        # Initialize services
-        ai, tts, stt, db, summary = get_services()
-        
-        logger.info(f"📞 Incoming call from: {request.caller_phone}")
-        
-        # الحصول على إعدادات المستخدم
-        user_settings = await db.get_user_settings(request.user_id)
-        
-        # التحقق من أن الرد التلقائي مفعل
-        if not user_settings.get("auto_answer_enabled", True):
-            raise HTTPException(status_code=403, detail="Auto answer is disabled")
-        
-        # التحقق من قائمة الأشخاص المسموح بهم
-        allowed_contacts = user_settings.get("allowed_contacts", [])
-        if allowed_contacts and request.caller_phone not in allowed_contacts:
-            logger.info(f"⛔ Caller {request.caller_phone} not in allowed list")
-            raise HTTPException(status_code=403, detail="Caller not allowed")
-        
-        # 1. تحويل الصوت إلى نص
-        if request.audio_data:
+    start = time.perf_counter()
+    status_label = "error"
+    
+    with CALLS_IN_FLIGHT.track_in_progress():
+        try:
+            result = await _answer_call(
+                user_id,
+                caller_phone,
+                caller_name,
+                audio,
+                background_tasks,
+                services,
+                stream_audio
+            )
+            status_label = "ok"
+            # الزمن الكلي للمكالمات الناجحة فقط - المرفوضة تنتهي قبل STT
+            CALL_STAGE_SECONDS.observe(time.perf_counter() - start, stage="total")
+            return result
+        except HTTPException as e:
+            if e.status_code == 403:
+                status_label = "rejected"
+            raise
+        finally:
+            CALLS_TOTAL.inc(status=status_label)
+
+async def _answer_call(
+    user_id: str,
+    caller_phone: str,
+    caller_name: Optional[str],
+    audio: Optional[AudioInput],
+    background_tasks: BackgroundTasks,
+    services: ServiceContainer,
+    stream_audio: bool
+) -> Dict[str, Any]:
+    """مراحل الرد على المكالمة - كل مرحلة تُقاس في call_stage_duration_seconds"""
+    
+    ai, tts, stt, db = services.ai, services.tts, services.stt, services.db
+    
+    logger.info(f"📞 Incoming call from: {caller_phone}")
+    
+    # الحصول على إعدادات المستخدم
+    with CALL_STAGE_SECONDS.time(stage="settings"):
+        user_settings = await db.get_user_settings(user_id)
+    
+    # التحقق من أن الرد التلقائي مفعل
+    if not user_settings.get("auto_answer_enabled", True):
+        raise HTTPException(status_code=403, detail="Auto answer is disabled")
+    
+    # التحقق من قائمة الأشخاص المسموح بهم
+    allowed_contacts = user_settings.get("allowed_contacts", [])
+    if allowed_contacts and caller_phone not in allowed_contacts:
+        logger.info(f"⛔ Caller {caller_phone} not in allowed list")
+        raise HTTPException(status_code=403, detail="Caller not allowed")
+    
+    # 1. تحويل الصوت إلى نص
+    if audio:
+        with CALL_STAGE_SECONDS.time(stage="stt"):
             stt_result = await stt.speech_to_text(
-                request.audio_data,
+                audio,
                 language="ar",
-                user_id=request.user_id
+                user_id=user_id
             )
-            
-            if not stt_result["success"]:
-                raise HTTPException(status_code=500, detail="Speech recognition failed")
-            
-            caller_text = stt_result["text"]
-            logger.info(f"🎤 Caller said: {caller_text[:100]}")
-        else:
-            caller_text = "مرحباً"  # رسالة افتراضية
-        
-        # 2. الحصول على السياق
+        
+        if not stt_result["success"]:
+            raise HTTPException(status_code=500, detail="Speech recognition failed")
+        
+        caller_text = stt_result["text"]
+        logger.info(f"🎤 Caller said: {caller_text[:100]}")
+    else:
+        caller_text = "مرحباً"  # رسالة افتراضية
+    
+    # 2. الحصول على السياق
+    with CALL_STAGE_SECONDS.time(stage="history"):
         conversation_history = await db.get_conversation_history(
-            request.user_id,
-            request.caller_phone,
+            user_id,
+            caller_phone,
             limit=10
         )
-        
-        context = ConversationContext(
-            user_id=request.user_id,
-            caller_phone=request.caller_phone,
-            previous_messages=[
-                {"role": "user", "content": msg.get("content", "")}
-                for msg in conversation_history
-            ],
-            caller_relationship="friend"  # يمكن تحسينها
-        )
-        
-        # 3. توليد الرد الذكي
+    
+    context = ConversationContext(
+        user_id=user_id,
+        caller_phone=caller_phone,
+        previous_messages=[
+            {"role": "user", "content": msg.get("content", "")}
+            for msg in conversation_history
+        ],
+        caller_relationship="friend"  # يمكن تحسينها
+    )
+    
+    # 3. توليد الرد الذكي
+    with CALL_STAGE_SECONDS.time(stage="llm"):
         ai_response = await ai.analyze_and_respond(
             caller_text,
             context,
@@ -106,46 +150,135 @@ async def handle_incoming_call(
                 "dialect": "مصرية عامية"
             }
         )
-        
-        logger.info(f"🤖 AI Response: {ai_response.text[:100]}")
-        
-        # 4. إضافة تأخير طبيعي
-        use_thinking = user_settings.get("use_thinking_sounds", True)
-        delay_ms = random.randint(
-            user_settings.get("response_delay_min_ms", 800),
-            user_settings.get("response_delay_max_ms", 2000)
-        )
-        
-        # 5. تحويل الرد إلى صوت
-        tts_result = await tts.text_to_speech(
-            text=ai_response.text,
-            user_id=request.user_id,
-            emotion=ai_response.emotion,
-            speed=user_settings.get("voice_speed", 1.0),
-            add_thinking_sounds=use_thinking
-        )
+    
+    logger.info(f"🤖 AI Response: {ai_response.text[:100]}")
+    
+    # 4. إضافة تأخير طبيعي
+    use_thinking = user_settings.get("use_thinking_sounds", True)
+    delay_ms = random.randint(
+        user_settings.get("response_delay_min_ms", 800),
+        user_settings.get("response_delay_max_ms", 2000)
+    )
+    
+    # 5. تحويل الرد إلى صوت (bytes خام - بدون base64)
+    # المحركات بدون streaming_output: الصوت كاملاً مرة واحدة بدل stream بـ chunk واحد
+    if stream_audio and tts.capabilities.streaming_output:
+        thinking_sound = tts.get_thinking_sound(ai_response.emotion) if use_thinking else None
+        
+        # زمن tts هنا حتى أول chunk - الباقي يُرسل للعميل أثناء التوليف
+        with CALL_STAGE_SECONDS.time(stage="tts"):
+            try:
+                audio_stream = await prime_stream(
+                    tts.stream_speech(
+                        text=ai_response.text,
+                        user_id=user_id,
+                        emotion=ai_response.emotion,
+                        speed=user_settings.get("voice_speed", 1.0)
+                    ),
+                    prefix=thinking_sound
+                )
+            except Exception as e:
+                logger.error(f"❌ Error in TTS stream: {e}")
+                raise HTTPException(status_code=500, detail="Text-to-speech failed")
+        
+        audio_payload = {"audio_stream": audio_stream, "thinking_sound": thinking_sound}
+    else:
+        with CALL_STAGE_SECONDS.time(stage="tts"):
+            tts_result = await tts.text_to_speech(
+                text=ai_response.text,
+                user_id=user_id,
+                emotion=ai_response.emotion,
+                speed=user_settings.get("voice_speed", 1.0),
+                add_thinking_sounds=use_thinking,
+                as_base64=False
+            )
         
         if not tts_result["success"]:
             raise HTTPException(status_code=500, detail="Text-to-speech failed")
         
-        # 6. حفظ المحادثة في الخلفية
-        background_tasks.add_task(
-            save_call_interaction,
+        audio_payload = {
+            "audio": tts_result["audio_bytes"],
+            # مقطع التفكير الملصوق في بداية audio (None لو لم يُستخدم)
+            "thinking_sound": tts_result.get("thinking_sound_bytes")
+        }
+    
+    # 6. حفظ المحادثة في الخلفية
+    background_tasks.add_task(
+        save_call_interaction,
+        db,
+        user_id,
+        caller_phone,
+        caller_name,
+        caller_text,
+        ai_response.text
+    )
+    
+    return {
+        "call_id": f"call_{user_id}_{random.randint(1000, 9999)}",
+        "text": ai_response.text,
+        "emotion": ai_response.emotion,
+        "delay_ms": delay_ms,
+        **audio_payload
+    }
+
+def binary_call_response(result: Dict[str, Any]) -> Response:
+    """
+    صوت الرد كـ audio/mpeg والبيانات الوصفية في الـ headers
+    
+    chunks Edge TTS تُرسل للعميل فور وصولها فيبدأ التشغيل قبل انتهاء التوليف،
+    والمحركات بدون streaming_output ترد بالصوت كاملاً
+    """
+    
+    headers = {
+        "X-Call-Id": result["call_id"],
+        # الـ headers لازم تكون latin-1
+        "X-Response-Text": quote(result["text"]),
+        "X-Emotion": result["emotion"].value,
+        "X-Delay-Ms": str(result["delay_ms"]),
+        # عدد bytes مقطع التفكير في بداية الصوت - للتطبيق لو أراد تخطيه
+        "X-Thinking-Sound-Bytes": str(len(result["thinking_sound"] or b""))
+    }
+    
+    if "audio_stream" not in result:
+        return Response(content=result["audio"], media_type="audio/mpeg", headers=headers)
+    return StreamingResponse(content=result["audio_stream"], media_type="audio/mpeg", headers=headers)
+
+@router.post("/handle-incoming", response_model=CallResponse)
+async def handle_incoming_call(
+    request: CallRequest,
+    background_tasks: BackgroundTasks,
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    معالجة مكالمة واردة
+    
+    هذا الـ endpoint يستقبل مكالمة واردة ويقوم بـ:
+    1. تحويل صوت المتصل إلى نص (STT)
+    2. تحليل النص وتوليد رد ذكي (AI)
+    3. تحويل الرد إلى صوت بصوت المستخدم (TTS)
+    4. إرجاع الصوت للتطبيق للتشغيل
+    """
+    
+    try:
+        result = await process_incoming_call(
             request.user_id,
             request.caller_phone,
             request.caller_name,
-            caller_text,
-            ai_response.text
+            request.audio_data,
+            background_tasks,
+            services
         )
         
-        # 7. إرجاع الاستجابة
         return CallResponse(
-            call_id=f"call_{request.user_id}_{random.randint(1000, 9999)}",
-            response_audio=tts_result["audio_base64"],
-            response_text=ai_response.text,
-            emotion=ai_response.emotion,
-            delay_ms=delay_ms,
-            thinking_sound="mmm_sound_base64" if use_thinking else None
+            call_id=result["call_id"],
+            response_audio=base64.b64encode(result["audio"]).decode('utf-8'),
+            response_text=result["text"],
+            emotion=result["emotion"],
+            delay_ms=result["delay_ms"],
+            thinking_sound=(
+                base64.b64encode(result["thinking_sound"]).decode('utf-8')
+                if result["thinking_sound"] else None
+            )
         )
         
     except HTTPException:
@@ -154,12 +287,196 @@ async def handle_incoming_call(
         logger.error(f"❌ Error handling call: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/handle-incoming/upload", response_class=Response)
+async def handle_incoming_call_upload(
+    background_tasks: BackgroundTasks,
+    user_id: str = Form(...),
+    caller_phone: str = Form(...),
+    caller_name: Optional[str] = Form(None),
+    audio: Optional[UploadFile] = File(None, description="صوت المتصل (بدون base64)"),
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    معالجة مكالمة واردة - رفع multipart
+    
+    الصوت يُرفع كملف والرد audio/mpeg متدفق (بدون base64 في JSON)
+    """
+    
+    try:
+        audio_bytes = await audio.read() if audio is not None else None
+        
+        result = await process_incoming_call(
+            user_id,
+            caller_phone,
+            caller_name,
+            audio_bytes,
+            background_tasks,
+            services,
+            stream_audio=True
+        )
+        
+        return binary_call_response(result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error handling call upload: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/handle-incoming/raw",
+    response_class=Response,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}
+        }
+    }
+)
+async def handle_incoming_call_raw(
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    user_id: str,
+    caller_phone: str,
+    caller_name: Optional[str] = None,
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    معالجة مكالمة واردة - جسم application/octet-stream
+    
+    الصوت يُقرأ كـ stream (حد الحجم يُطبق أثناء القراءة) والرد audio/mpeg متدفق
+    """
+    
+    try:
+        audio = bytearray()
+        async for chunk in http_request.stream():
+            audio.extend(chunk)
+        
+        result = await process_incoming_call(
+            user_id,
+            caller_phone,
+            caller_name,
+            audio or None,
+            background_tasks,
+            services,
+            stream_audio=True
+        )
+        
+        return binary_call_response(result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error handling raw call: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.websocket("/ws/{call_id}")
+async def call_session_ws(
+    websocket: WebSocket,
+    call_id: str,
+    user_id: str,
+    caller_phone: str,
+    caller_name: Optional[str] = None,
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    جلسة مكالمة حية (full-duplex)
+    
+    بدل رفع الجملة كاملة وانتظار الرد، التطبيق يرسل frames صوتية باستمرار
+    ويستقبل النص الجزئي وtokens الرد وأصوات الجمل أول بأول
+    
+    صيغة الـ frames: PCM16 mono little-endian بمعدل WS_AUDIO_SAMPLE_RATE (16000)،
+    النص الجزئي لآخر WS_PARTIAL_WINDOW_SECONDS ثانية فقط. ملف مضغوط (wav / webm / ogg)
+    مقسم على frames مقبول أيضاً لكن بدون نص جزئي. الجملة محدودة بـ WS_MAX_UTTERANCE_BYTES
+    
+    call_id في المسار للربط فقط (logs) - سجل المكالمة يُحفظ بـ UUID من الخادم
+    يصل للتطبيق في حدث ready، وهو المستخدم مع end-call و summary
+    """
+    
+    ai, tts, stt, db = services.ai, services.tts, services.stt, services.db
+    
+    user_settings = await db.get_user_settings(user_id)
+    
+    # نفس قواعد handle-incoming
+    if not user_settings.get("auto_answer_enabled", True):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    allowed_contacts = user_settings.get("allowed_contacts", [])
+    if allowed_contacts and caller_phone not in allowed_contacts:
+        logger.info(f"⛔ Caller {caller_phone} not in allowed list")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    
+    # id السجل من الخادم دائماً: id من العميل قد يطابق مكالمة مستخدم آخر
+    # (upsert يستبدلها) أو لا يكون UUID (عمود calls.id في Supabase)
+    record_id = str(uuid.uuid4())
+    logger.info(f"📞 Live call session {call_id} -> {record_id} from: {caller_phone}")
+    
+    conversation_history = await db.get_conversation_history(
+        user_id,
+        caller_phone,
+        limit=10
+    )
+    
+    # سجل مكالمة واحد للجلسة - كل دور يُضاف لمحادثته فيعمل end-call
+    # والملخص على الجلسة الحية مثل أي مكالمة
+    conversation: List[Dict[str, str]] = []
+    call_saved = False
+    
+    async def on_turn_complete(caller_text: str, response_text: str):
+        nonlocal call_saved
+        conversation.extend([
+            {"role": "user", "content": caller_text},
+            {"role": "assistant", "content": response_text}
+        ])
+        
+        try:
+            if call_saved:
+                await db.queue_call_update(record_id, {"conversation": list(conversation)})
+            else:
+                await db.queue_call({
+                    "id": record_id,
+                    "user_id": user_id,
+                    "caller_phone": caller_phone,
+                    "caller_name": caller_name or "غير معروف",
+                    "status": "ongoing",
+                    "conversation": list(conversation)
+                })
+                call_saved = True
+        except Exception as e:
+            logger.error(f"❌ Error saving call session turn: {e}")
+    
+    session = CallSession(
+        websocket=websocket,
+        call_id=record_id,
+        user_id=user_id,
+        caller_phone=caller_phone,
+        user_settings=user_settings,
+        ai_service=ai,
+        tts_service=tts,
+        stt_service=stt,
+        previous_messages=[
+            {"role": "user", "content": msg.get("content", "")}
+            for msg in conversation_history
+        ],
+        on_turn_complete=on_turn_complete
+    )
+    
+    try:
+        await session.run()
+    except WebSocketDisconnect:
+        logger.info(f"📴 Caller disconnected: {call_id} ({record_id})")
+
 @router.post("/end-call")
 async def end_call(
     call_id: str,
     user_id: str,
     duration_seconds: int,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    services: ServiceContainer = Depends(get_services)
 ):
     """
     إنهاء مكالمة وتوليد ملخص ذكي
@@ -169,13 +486,13 @@ async def end_call(
         logger.info(f"📴 Ending call: {call_id}")
         
         # الحصول على بيانات المكالمة
-        call_data = await db_service.get_call(call_id)
+        call_data = await services.db.get_call(call_id)
         
         if not call_data:
             raise HTTPException(status_code=404, detail="Call not found")
         
         # تحديث حالة المكالمة
-        await db_service.update_call(call_id, {
+        await services.db.queue_call_update(call_id, {
             "status": "completed",
             "duration_seconds": duration_seconds,
             "end_time": "now"
@@ -184,6 +501,7 @@ async def end_call(
         # توليد الملخص في الخلفية
         background_tasks.add_task(
             generate_and_save_summary,
+            services,
             call_id,
             user_id
         )
@@ -194,16 +512,18 @@ async def end_call(
             "call_id": call_id
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error ending call: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/summary/{call_id}")
-async def get_call_summary(call_id: str):
+async def get_call_summary(call_id: str, services: ServiceContainer = Depends(get_services)):
     """الحصول على ملخص مكالمة"""
     
     try:
-        call_data = await db_service.get_call(call_id)
+        call_data = await services.db.get_call(call_id)
         
         if not call_data:
             raise HTTPException(status_code=404, detail="Call not found")
@@ -220,33 +540,87 @@ async def get_call_summary(call_id: str):
 @router.get("/history")
 async def get_call_history(
     user_id: str,
-    limit: int = 50,
-    date_from: str = None
+    limit: int = Query(50, ge=1, le=1000),
+    date_from: str = None,
+    cursor: Optional[str] = None,
+    view: CallView = "list",
+    services: ServiceContainer = Depends(get_services)
 ):
-    """الحصول على سجل المكالمات"""
+    """
+    الحصول على سجل المكالمات (الأحدث أولاً) صفحة بصفحة
+    
+    - cursor: next_cursor من الصفحة السابقة - بدونه تبدأ من الأحدث
+    - view: list (الافتراضي - بدون المحادثة) / stats / full (مع المحادثة كاملة)
+    """
+    
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
-        calls = await db_service.get_user_calls(
+        calls = await services.db.get_user_calls(
             user_id,
             limit=limit,
-            date_from=date_from
+            date_from=date_from,
+            view=view,
+            before=before
         )
         
         return {
             "success": True,
             "total": len(calls),
-            "calls": calls
+            "calls": calls,
+            # صفحة ناقصة = لا يوجد أقدم
+            "next_cursor": encode_cursor(calls[-1]) if len(calls) == limit else None
         }
         
     except Exception as e:
         logger.error(f"❌ Error getting call history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/history/export")
+async def export_call_history(
+    user_id: str,
+    date_from: str = None,
+    view: CallView = "full",
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    تصدير سجل المكالمات كاملاً كـ NDJSON (سطر JSON لكل مكالمة، الأحدث أولاً)
+    
+    المكالمات تُقرأ وتُرسل صفحة بصفحة - لا يُحمل السجل كاملاً في الذاكرة
+    """
+    
+    async def ndjson():
+        buffer = []
+        size = 0
+        try:
+            async for call in services.db.iter_user_calls(user_id, view=view, date_from=date_from):
+                line = json.dumps(call, ensure_ascii=False, default=str) + "\n"
+                buffer.append(line)
+                size += len(line)
+                if size >= 64 * 1024:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+        except Exception as e:
+            # الـ response بدأ بالفعل - التصدير ينتهي هنا والخطأ في السجل
+            logger.error(f"❌ Error exporting call history for {user_id}: {e}")
+        if buffer:
+            yield "".join(buffer)
+    
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(f'calls_{user_id}.ndjson')}"}
+    )
+
 # =====================================
 # Background Tasks
 # =====================================
 
 async def save_call_interaction(
+    db: DatabaseService,
     user_id: str,
     caller_phone: str,
     caller_name: str,
@@ -267,20 +641,21 @@ async def save_call_interaction(
             ]
         }
         
-        await db_service.save_call(call_data)
-        logger.info(f"💾 Call interaction saved for user: {user_id}")
+        # يُكتب مع باقي تفاعلات الدفعة - لا استعلام لكل مكالمة
+        await db.queue_call(call_data)
+        logger.info(f"💾 Call interaction queued for user: {user_id}")
         
     except Exception as e:
         logger.error(f"❌ Error saving call interaction: {e}")
 
-async def generate_and_save_summary(call_id: str, user_id: str):
+async def generate_and_save_summary(services: ServiceContainer, call_id: str, user_id: str):
     """توليد وحفظ الملخص الذكي"""
     
     try:
         logger.info(f"📝 Generating summary for call: {call_id}")
         
         # الحصول على بيانات المكالمة
-        call_data = await db_service.get_call(call_id)
+        call_data = await services.db.get_call(call_id)
         
         if not call_data:
             logger.error(f"Call {call_id} not found")
@@ -288,13 +663,13 @@ async def generate_and_save_summary(call_id: str, user_id: str):
         
         # توليد الملخص
         conversation_history = call_data.get("conversation", [])
-        summary = await summary_service.generate_call_summary(
+        summary = await services.summary.generate_call_summary(
             call_data,
             conversation_history
         )
         
         # حفظ الملخص
-        await db_service.update_call(call_id, {
+        await services.db.queue_call_update(call_id, {
             "summary": summary.dict()
         })
         
@@ -3,93 +3,260 @@ Router للرسائل
 Messages API Endpoints
 """
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, UploadFile, File, Form, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, Union
+from urllib.parse import quote
 import logging
 
 from app.models.schemas import MessageRequest, MessageResponse, MessageType, EmotionType
-from app.services.ai_service import AIService
-from app.services.tts_service import TTSService
-from app.services.stt_service import STTService
+from app.services.container import ServiceContainer, get_services
 from app.services.database import DatabaseService
 from app.models.schemas import ConversationContext
+from app.utils.streaming import prime_stream
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# الخدمات
-ai_service = AIService()
-tts_service = TTSService()
-stt_service = STTService()
-db_service = DatabaseService()
+async def process_message(
+    user_id: str,
+    sender_phone: str,
+    message_type: MessageType,
+    message_text: Optional[str],
+    audio: Optional[Union[str, bytes]],
+    platform: str,
+    background_tasks: BackgroundTasks,
+    services: ServiceContainer
+) -> MessageResponse:
+    """المعالجة المشتركة لكل أشكال handle (JSON / multipart / raw)"""
+    
+    logger.info(f"💬 Message from: {sender_phone}")
+    
+    # تحويل الصوت إلى نص إذا كانت رسالة صوتية
+    if message_type == MessageType.VOICE and audio:
+        stt_result = await services.stt.speech_to_text(
+            audio,
+            language="ar"
+        )
+        message_text = stt_result["text"]
+    else:
+        message_text = message_text or ""
+    
+    # الحصول على السياق
+    conversation_history = await services.db.get_conversation_history(
+        user_id,
+        sender_phone,
+        limit=20
+    )
+    
+    context = ConversationContext(
+        user_id=user_id,
+        caller_phone=sender_phone,
+        previous_messages=[
+            {"role": msg.get("role", "user"), "content": msg.get("content", "")}
+            for msg in conversation_history
+        ]
+    )
+    
+    # توليد الرد
+    ai_response = await services.ai.analyze_and_respond(
+        message_text,
+        context
+    )
+    
+    # حفظ في الخلفية
+    background_tasks.add_task(
+        save_message_interaction,
+        services.db,
+        user_id,
+        sender_phone,
+        message_text,
+        ai_response.text,
+        platform
+    )
+    
+    return MessageResponse(
+        message_id=f"msg_{user_id}",
+        response_text=ai_response.text,
+        emotion=ai_response.emotion,
+        send_immediately=True,
+        delay_seconds=None
+    )
 
 @router.post("/handle", response_model=MessageResponse)
 async def handle_message(
     request: MessageRequest,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    services: ServiceContainer = Depends(get_services)
 ):
     """
     معالجة رسالة واردة
     """
     
     try:
-        logger.info(f"💬 Message from: {request.sender_phone}")
-        
-        # تحويل الصوت إلى نص إذا كانت رسالة صوتية
-        if request.message_type == MessageType.VOICE and request.audio_data:
-            stt_result = await stt_service.speech_to_text(
-                request.audio_data,
-                language="ar"
-            )
-            message_text = stt_result["text"]
-        else:
-            message_text = request.message_text or ""
-        
-        # الحصول على السياق
-        conversation_history = await db_service.get_conversation_history(
+        return await process_message(
             request.user_id,
             request.sender_phone,
-            limit=20
+            request.message_type,
+            request.message_text,
+            request.audio_data,
+            request.platform,
+            background_tasks,
+            services
         )
         
-        context = ConversationContext(
-            user_id=request.user_id,
-            caller_phone=request.sender_phone,
-            previous_messages=[
-                {"role": msg.get("role", "user"), "content": msg.get("content", "")}
-                for msg in conversation_history
-            ]
-        )
+    except Exception as e:
+        logger.error(f"❌ Error handling message: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/handle/upload", response_model=MessageResponse)
+async def handle_message_upload(
+    background_tasks: BackgroundTasks,
+    user_id: str = Form(...),
+    sender_phone: str = Form(...),
+    message_text: Optional[str] = Form(None),
+    platform: str = Form("whatsapp"),
+    audio: Optional[UploadFile] = File(None, description="الرسالة الصوتية (بدون base64)"),
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    معالجة رسالة واردة - رفع multipart
+    
+    لو فيه ملف صوتي تُعامل كرسالة صوتية
+    """
+    
+    try:
+        audio_bytes = await audio.read() if audio is not None else None
         
-        # توليد الرد
-        ai_response = await ai_service.analyze_and_respond(
+        return await process_message(
+            user_id,
+            sender_phone,
+            MessageType.VOICE if audio_bytes else MessageType.TEXT,
             message_text,
-            context
+            audio_bytes,
+            platform,
+            background_tasks,
+            services
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error handling message upload: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/handle/raw",
+    response_model=MessageResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}
+        }
+    }
+)
+async def handle_message_raw(
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    user_id: str,
+    sender_phone: str,
+    platform: str = "whatsapp",
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    معالجة رسالة صوتية - جسم application/octet-stream
+    """
+    
+    try:
+        audio = bytearray()
+        async for chunk in http_request.stream():
+            audio.extend(chunk)
+        
+        if not audio:
+            raise HTTPException(status_code=400, detail="Empty audio body")
+        
+        return await process_message(
+            user_id,
+            sender_phone,
+            MessageType.VOICE,
+            None,
+            bytes(audio),
+            platform,
+            background_tasks,
+            services
         )
         
-        # حفظ في الخلفية
-        background_tasks.add_task(
-            save_message_interaction,
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error handling raw message: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/handle/speech", response_class=StreamingResponse)
+async def handle_message_speech(
+    request: MessageRequest,
+    background_tasks: BackgroundTasks,
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    معالجة رسالة والرد برسالة صوتية
+    
+    الرد audio/mpeg متدفق من محرك TTS مباشرة (بدون ملف مؤقت أو base64) لو
+    المحرك يدعم streaming_output، والنص والمشاعر في الـ headers
+    """
+    
+    try:
+        response = await process_message(
             request.user_id,
             request.sender_phone,
-            message_text,
-            ai_response.text,
-            request.platform
+            request.message_type,
+            request.message_text,
+            request.audio_data,
+            request.platform,
+            background_tasks,
+            services
         )
         
-        return MessageResponse(
-            message_id=f"msg_{request.user_id}",
-            response_text=ai_response.text,
-            emotion=ai_response.emotion,
-            send_immediately=True,
-            delay_seconds=None
+        headers = {
+            "X-Message-Id": response.message_id,
+            # الـ headers لازم تكون latin-1
+            "X-Response-Text": quote(response.response_text),
+            "X-Emotion": response.emotion.value
+        }
+        
+        # المحركات بدون streaming_output: الصوت كاملاً مرة واحدة
+        if not services.tts.capabilities.streaming_output:
+            tts_result = await services.tts.text_to_speech(
+                text=response.response_text,
+                user_id=request.user_id,
+                emotion=response.emotion,
+                as_base64=False
+            )
+            if not tts_result["success"]:
+                raise HTTPException(status_code=500, detail="Text-to-speech failed")
+            return Response(content=tts_result["audio_bytes"], media_type="audio/mpeg", headers=headers)
+        
+        audio_stream = await prime_stream(services.tts.stream_speech(
+            text=response.response_text,
+            user_id=request.user_id,
+            emotion=response.emotion
+        ))
+        
+        return StreamingResponse(
+            content=audio_stream,
+            media_type="audio/mpeg",
+            headers=headers
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"❌ Error handling message: {e}")
+        logger.error(f"❌ Error handling message speech: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 async def save_message_interaction(
+    db: DatabaseService,
     user_id: str,
     sender_phone: str,
     message: str,
@@ -99,7 +266,7 @@ async def save_message_interaction(
     """حفظ الرسالة"""
     
     try:
-        await db_service.save_message({
+        await db.queue_message({
             "user_id": user_id,
             "sender_phone": sender_phone,
             "message": message,
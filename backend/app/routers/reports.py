@@ -3,21 +3,23 @@ Router للتقارير والملخصات
 Reports API Endpoints
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime, timedelta
 import logging
 
-from app.services.database import DatabaseService
-from app.services.summary_service import SummaryService
+from app.services.analytics import DURATION, EMOTION, HOUR, PRIORITY, STATUS, WEEKDAY
+from app.services.container import ServiceContainer, get_services
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-db_service = DatabaseService()
-summary_service = SummaryService()
 
 @router.get("/daily/{user_id}")
-async def get_daily_report(user_id: str, date: str = None):
+async def get_daily_report(
+    user_id: str,
+    date: str = None,
+    services: ServiceContainer = Depends(get_services)
+):
     """الحصول على تقرير يومي"""
     
     try:
@@ -25,10 +27,11 @@ async def get_daily_report(user_id: str, date: str = None):
             date = datetime.now().strftime("%Y-%m-%d")
         
         # الحصول على المكالمات
-        calls = await db_service.get_user_calls(
+        calls = await services.db.get_user_calls(
             user_id,
             limit=1000,
-            date_from=date
+            date_from=date,
+            view="stats"
         )
         
         # تصفية المكالمات لليوم المحدد
@@ -38,9 +41,10 @@ async def get_daily_report(user_id: str, date: str = None):
         ]
         
         # توليد التقرير
-        report = await summary_service.generate_daily_report(
+        report = await services.summary.generate_daily_report(
             user_id,
-            daily_calls
+            daily_calls,
+            date
         )
         
         return {
@@ -53,41 +57,30 @@ async def get_daily_report(user_id: str, date: str = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/weekly/{user_id}")
-async def get_weekly_report(user_id: str):
+async def get_weekly_report(user_id: str, services: ServiceContainer = Depends(get_services)):
     """الحصول على تقرير أسبوعي"""
     
     try:
         # آخر 7 أيام
         week_start = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+        week_end = datetime.now().strftime("%Y-%m-%d")
         
-        calls = await db_service.get_user_calls(
-            user_id,
-            limit=1000,
-            date_from=week_start
-        )
-        
-        # تجميع حسب اليوم
-        daily_reports = {}
-        for call in calls:
-            date = call.get("created_at", "")[:10]
-            if date not in daily_reports:
-                daily_reports[date] = []
-            daily_reports[date].append(call)
+        # كل مكالمات الأسبوع صفحة بصفحة (بدون حد 1000)
+        calls = [
+            call async for call in services.db.iter_user_calls(user_id, view="stats", date_from=week_start)
+        ]
         
-        # توليد تقارير يومية
-        reports = []
-        for date, day_calls in daily_reports.items():
-            report = await summary_service.generate_daily_report(
-                user_id,
-                day_calls
-            )
-            reports.append(report)
+        # التقارير اليومية والأسبوعية في مرور واحد
+        report = await services.summary.generate_weekly_report(user_id, calls, week_start, week_end)
         
         return {
             "success": True,
             "week_start": week_start,
-            "week_end": datetime.now().strftime("%Y-%m-%d"),
-            "daily_reports": reports
+            "week_end": week_end,
+            "daily_reports": report["daily_reports"],
+            "weekly_stats": report["weekly_stats"],
+            "trends": report["trends"],
+            "recommendations": report["recommendations"]
         }
         
     except Exception as e:
@@ -95,30 +88,31 @@ async def get_weekly_report(user_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/stats/{user_id}")
-async def get_statistics(user_id: str, days: int = 7):
+async def get_statistics(
+    user_id: str,
+    days: int = 7,
+    services: ServiceContainer = Depends(get_services)
+):
     """الحصول على الإحصائيات"""
     
     try:
         date_from = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
         
-        # المكالمات
-        calls = await db_service.get_user_calls(
-            user_id,
-            limit=1000,
-            date_from=date_from
-        )
-        
-        # أكثر المتصلين
-        top_callers = await db_service.get_top_callers(user_id, days)
+        # الإحصائيات المجمعة لأيام الفترة - بدون قراءة المكالمات
+        period = await services.db.get_period_rollup(user_id, date_from)
         
-        # الإحصائيات
         stats = {
             "period_days": days,
-            "total_calls": len(calls),
-            "answered": len([c for c in calls if c.get("status") == "completed"]),
-            "missed": len([c for c in calls if c.get("status") == "missed"]),
-            "avg_duration": sum(c.get("duration_seconds", 0) for c in calls) / len(calls) if calls else 0,
-            "top_callers": top_callers
+            "total_calls": period.calls,
+            "answered": period.count(STATUS, "completed"),
+            "missed": period.count(STATUS, "missed"),
+            "avg_duration": period.duration_seconds / period.calls if period.calls else 0,
+            "emotion_breakdown": period.breakdown(EMOTION),
+            "priority_breakdown": period.breakdown(PRIORITY),
+            "duration_buckets": period.breakdown(DURATION),
+            "calls_by_hour": period.histogram(HOUR),
+            "calls_by_weekday": period.breakdown(WEEKDAY),
+            "top_callers": period.top_callers(10)
         }
         
         return {
@@ -3,34 +3,37 @@ Router للإعدادات
 Settings API Endpoints
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 import logging
 
 from app.models.schemas import UserSettings, SettingsUpdate
-from app.services.database import DatabaseService
+from app.services.container import ServiceContainer, get_services
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-db_service = DatabaseService()
 
 @router.get("/{user_id}", response_model=UserSettings)
-async def get_settings(user_id: str):
+async def get_settings(user_id: str, services: ServiceContainer = Depends(get_services)):
     """الحصول على إعدادات المستخدم"""
     
     try:
-        settings = await db_service.get_user_settings(user_id)
+        settings = await services.db.get_user_settings(user_id)
         return settings
     except Exception as e:
         logger.error(f"Error getting settings: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{user_id}")
-async def update_settings(user_id: str, settings: UserSettings):
+async def update_settings(
+    user_id: str,
+    settings: UserSettings,
+    services: ServiceContainer = Depends(get_services)
+):
     """تحديث إعدادات المستخدم"""
     
     try:
-        success = await db_service.save_user_settings(
+        success = await services.db.save_user_settings(
             user_id,
             settings.dict()
         )
@@ -45,18 +48,22 @@ async def update_settings(user_id: str, settings: UserSettings):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.patch("/{user_id}")
-async def patch_setting(user_id: str, update: SettingsUpdate):
+async def patch_setting(
+    user_id: str,
+    update: SettingsUpdate,
+    services: ServiceContainer = Depends(get_services)
+):
     """تحديث إعداد واحد"""
     
     try:
         # الحصول على الإعدادات الحالية
-        settings = await db_service.get_user_settings(user_id)
+        settings = await services.db.get_user_settings(user_id)
         
         # تحديث الحقل
         settings[update.field] = update.value
         
         # حفظ
-        success = await db_service.save_user_settings(user_id, settings)
+        success = await services.db.save_user_settings(user_id, settings)
         
         if success:
             return {"success": True, "field": update.field, "value": update.value}
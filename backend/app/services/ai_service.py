@@ -4,10 +4,11 @@ AI Service - OpenRouter Integration
 """
 
 import os
+import time
 import httpx
 import json
 import asyncio
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Union
 from datetime import datetime
 import logging
 
@@ -16,9 +17,14 @@ from app.models.schemas import (
     AIResponse, 
     EmotionType
 )
+from app.services.http_pool import get_openrouter_pool
+from app.utils.metrics import track_upstream
 
 logger = logging.getLogger(__name__)
 
+# الرد الاحتياطي عند فشل OpenRouter
+FALLBACK_RESPONSE_TEXT = "عذراً، أنا مشغول حالياً. سأعاود الاتصال بك لاحقاً."
+
 class AIService:
     """خدمة الذكاء الاصطناعي للتحليل والرد"""
     
@@ -27,6 +33,9 @@ class AIService:
         self.base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
         self.model = os.getenv("OPENROUTER_MODEL", "anthropic/claude-3-sonnet")
         
+        # pool واحد مشترك بين كل نسخ AIService في الـ process
+        self.http_pool = get_openrouter_pool()
+        
         if not self.api_key:
             logger.warning("⚠️ OPENROUTER_API_KEY not found in environment")
     
@@ -82,14 +91,95 @@ class AIService:
             logger.error(f"❌ Error in AI analysis: {e}", exc_info=True)
             
             # رد احتياطي
-            return AIResponse(
-                text="عذراً، أنا مشغول حالياً. سأعاود الاتصال بك لاحقاً.",
-                emotion=EmotionType.NEUTRAL,
-                confidence=0.5,
-                requires_follow_up=True,
-                suggested_actions=["اتصل لاحقاً"],
-                thinking_time_ms=500
+            return self._fallback_response()
+    
+    async def analyze_and_respond_stream(
+        self,
+        user_message: str,
+        context: ConversationContext,
+        user_personality: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Union[str, AIResponse]]:
+        """
+        نسخة متدفقة من analyze_and_respond
+        
+        Args:
+            user_message: رسالة المستخدم
+            context: سياق المحادثة
+            user_personality: شخصية المستخدم وأسلوبه
+        
+        Yields:
+            str: كل token فور وصوله من OpenRouter
+            AIResponse: الرد النهائي (المشاعر والإجراءات والتوقيتات) كآخر عنصر
+        """
+        start_time = time.perf_counter()
+        first_token_at: Optional[float] = None
+        tokens: List[str] = []
+        usage: Dict[str, Any] = {}
+        
+        try:
+            system_prompt = self._build_system_prompt(user_personality)
+            messages = self._build_conversation_messages(
+                user_message,
+                context,
+                system_prompt
             )
+            
+            async for token in self._stream_openrouter(messages, usage=usage):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                tokens.append(token)
+                yield token
+                
+        except Exception as e:
+            if not tokens:
+                logger.error(f"❌ Error in AI stream, using fallback reply: {e}", exc_info=True)
+                yield FALLBACK_RESPONSE_TEXT
+                yield self._fallback_response()
+                return
+            
+            # نكمل بما وصل بالفعل
+            logger.error(f"❌ AI stream interrupted after {len(tokens)} tokens: {e}")
+        
+        end_time = time.perf_counter()
+        ai_text = "".join(tokens)
+        
+        time_to_first_token_ms = None
+        tokens_per_second = None
+        if first_token_at is not None:
+            time_to_first_token_ms = int((first_token_at - start_time) * 1000)
+            
+            # OpenRouter يرسل usage في آخر chunk - وإلا نعد الـ deltas
+            completion_tokens = usage.get("completion_tokens") or len(tokens)
+            generation_seconds = end_time - first_token_at
+            if generation_seconds > 0:
+                tokens_per_second = round(completion_tokens / generation_seconds, 2)
+        
+        logger.info(
+            f"⚡ LLM stream: first token {time_to_first_token_ms}ms, "
+            f"{tokens_per_second} tokens/sec"
+        )
+        
+        yield AIResponse(
+            text=ai_text,
+            emotion=self._detect_emotion(ai_text, user_message),
+            confidence=0.85,
+            requires_follow_up=self._check_follow_up_needed(ai_text),
+            suggested_actions=self._extract_actions(ai_text),
+            thinking_time_ms=int((end_time - start_time) * 1000),
+            time_to_first_token_ms=time_to_first_token_ms,
+            tokens_per_second=tokens_per_second
+        )
+    
+    def _fallback_response(self) -> AIResponse:
+        """الرد الاحتياطي عند فشل OpenRouter"""
+        return AIResponse(
+            text=FALLBACK_RESPONSE_TEXT,
+            emotion=EmotionType.NEUTRAL,
+            confidence=0.5,
+            requires_follow_up=True,
+            suggested_actions=["اتصل لاحقاً"],
+            thinking_time_ms=500
+        )
     
     def _build_system_prompt(self, user_personality: Optional[Dict[str, Any]] = None) -> str:
         """بناء System Prompt للذكاء الاصطناعي"""
@@ -172,16 +262,17 @@ class AIService:
         
         return messages
     
-    async def _call_openrouter(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
-        """استدعاء OpenRouter API"""
-        
-        headers = {
+    def _build_headers(self) -> Dict[str, str]:
+        """Headers طلبات OpenRouter"""
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": "https://smart-assistant.app",
             "X-Title": "Smart Personal Assistant"
         }
-        
+    
+    def _build_payload(self, messages: List[Dict[str, str]], stream: bool = False) -> Dict[str, Any]:
+        """جسم طلب chat/completions"""
         payload = {
             "model": self.model,
             "messages": messages,
@@ -189,10 +280,20 @@ class AIService:
             "max_tokens": 500,
             "top_p": 0.9,
         }
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    async def _call_openrouter(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """استدعاء OpenRouter API"""
+        
+        headers = self._build_headers()
+        payload = self._build_payload(messages)
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
+            with track_upstream("openrouter"):
+                # اتصال مشترك (keep-alive / HTTP2) بدل TCP + TLS جديد لكل طلب
+                response = await self.http_pool.post(
                     f"{self.base_url}/chat/completions",
                     headers=headers,
                     json=payload
@@ -203,12 +304,12 @@ class AIService:
                 
                 # استخراج النص من الاستجابة
                 ai_text = result["choices"][0]["message"]["content"]
-                
-                return {
-                    "text": ai_text,
-                    "confidence": 0.85,
-                    "model": self.model
-                }
+            
+            return {
+                "text": ai_text,
+                "confidence": 0.85,
+                "model": self.model
+            }
                 
         except httpx.HTTPStatusError as e:
             logger.error(f"❌ HTTP error from OpenRouter: {e.response.status_code}")
@@ -218,6 +319,69 @@ class AIService:
             logger.error(f"❌ Error calling OpenRouter API: {e}")
             raise
     
+    async def _stream_openrouter(
+        self,
+        messages: List[Dict[str, str]],
+        usage: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        استدعاء OpenRouter مع stream=True وقراءة أحداث SSE
+        
+        لو usage موجود يُملأ بإحصائيات الـ tokens من آخر chunk
+        """
+        
+        headers = self._build_headers()
+        payload = self._build_payload(messages, stream=True)
+        
+        try:
+            with track_upstream("openrouter"):
+                async with self.http_pool.stream(
+                    "POST",
+                    f"{self.base_url}/chat/completions",
+                    headers=headers,
+                    json=payload
+                ) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        response.raise_for_status()
+                    
+                    async for line in response.aiter_lines():
+                        # OpenRouter يرسل تعليقات keep-alive تبدأ بـ ":"
+                        if not line.startswith("data:"):
+                            continue
+                        
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        
+                        try:
+                            chunk = json.loads(data)
+                        except json.JSONDecodeError:
+                            continue
+                        
+                        if usage is not None and chunk.get("usage"):
+                            usage.update(chunk["usage"])
+                        
+                        choices = chunk.get("choices") or []
+                        if not choices:
+                            continue
+                        
+                        token = (choices[0].get("delta") or {}).get("content")
+                        if token:
+                            yield token
+                                
+        except httpx.HTTPStatusError as e:
+            logger.error(f"❌ HTTP error from OpenRouter stream: {e.response.status_code}")
+            logger.error(f"Response: {e.response.text}")
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error streaming from OpenRouter API: {e}")
+            raise
+    
+    def detect_emotion(self, ai_text: str, user_message: str) -> EmotionType:
+        """اكتشاف المشاعر (للاستخدام من خارج الخدمة مع الردود المتدفقة)"""
+        return self._detect_emotion(ai_text, user_message)
+    
     def _detect_emotion(self, ai_text: str, user_message: str) -> EmotionType:
         """اكتشاف المشاعر من النص"""
         
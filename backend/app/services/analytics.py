@@ -0,0 +1,291 @@
+"""
+تحليلات المكالمات
+Fixed-size call histograms (hour, weekday, emotion, status, priority, duration)
+shared by the reports, the insights and the daily rollups
+"""
+
+import bisect
+from datetime import date as Date
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.schemas import CallStatus, EmotionType
+
+OTHER = "other"
+
+POSITIVE_SENTIMENT = 0.3
+
+# حدود فئات المدة بالثواني: <30s | 30s-1m | 1-3m | 3-5m | 5-10m | 10m+
+DURATION_EDGES = (30, 60, 180, 300, 600)
+
+# (كود لكل بُعد بعد إضافة offset البعد) - موضع كل بُعد في عدادات CallHistogram
+Codes = Tuple[int, ...]
+
+
+class Dimension:
+    """
+    بُعد واحد بقيم ثابتة -> أكواد متتالية
+
+    other: القيم غير المعروفة تُحسب في آخر خانة بدل أن تضيف خانات جديدة
+    """
+
+    def __init__(self, name: str, labels: Sequence[str], other: bool = True):
+        self.name = name
+        self.labels = tuple(labels) + ((OTHER,) if other else ())
+        self.size = len(self.labels)
+        self.offset = 0
+        self._codes = {label: code for code, label in enumerate(self.labels)}
+        self._other = self.size - 1
+        # value -> كود مع offset: dict.get واحد لكل مكالمة في call_codes
+        self.lookup: Dict[Any, int] = {}
+        self.default = 0
+
+    def code(self, value: Any) -> int:
+        return self._codes.get(value, self._other)
+
+    def place(self, offset: int):
+        self.offset = offset
+        self.lookup = {label: offset + code for label, code in self._codes.items()}
+        self.default = offset + self._other
+
+
+HOUR = Dimension("hour", [str(hour) for hour in range(24)], other=False)
+WEEKDAY = Dimension("weekday", ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"), other=False)
+EMOTION = Dimension("emotion", [emotion.value for emotion in EmotionType])
+STATUS = Dimension("status", [status.value for status in CallStatus])
+PRIORITY = Dimension("priority", ("low", "medium", "high", "urgent"))
+DURATION = Dimension("duration", ("<30s", "30s-1m", "1-3m", "3-5m", "5-10m", "10m+"), other=False)
+
+# ترتيب الأكواد في Codes
+DIMENSIONS = (HOUR, WEEKDAY, EMOTION, STATUS, PRIORITY, DURATION)
+
+WIDTH = 0
+for _dimension in DIMENSIONS:
+    _dimension.place(WIDTH)
+    WIDTH += _dimension.size
+
+# "07" -> كود الساعة مباشرة من نص ISO
+_HOUR_CODES = {f"{hour:02d}": HOUR.offset + hour for hour in range(24)}
+
+# الحقول التي يتغير كودها لو تغيرت (في المكالمة أو داخل الملخص)
+CODED_FIELDS = ("created_at", "start_time", "caller_emotion", "status", "priority_level", "duration_seconds", "summary")
+
+
+# =====================================
+# القيم من المكالمة
+# =====================================
+
+def lifted(call: Dict[str, Any], field: str) -> Any:
+    """حقل في المكالمة نفسها (شكل stats) أو داخل الملخص (السجل الكامل)"""
+
+    value = call.get(field)
+    if value is None:
+        summary = call.get("summary")
+        if isinstance(summary, dict):
+            value = summary.get(field)
+    return getattr(value, "value", value)
+
+
+def call_emotion(call: Dict[str, Any]) -> str:
+    return str(lifted(call, "caller_emotion") or "neutral")
+
+
+def hour_of(timestamp: Any) -> int:
+    """الساعة من نص ISO مباشرة - بدون fromisoformat لكل مكالمة"""
+
+    text = str(timestamp or "")
+    hour = text[11:13]
+    return int(hour) % 24 if hour.isdigit() else 0
+
+
+@lru_cache(maxsize=4096)
+def weekday_of(day: str) -> int:
+    """يوم الأسبوع (0 = الاثنين) - محفوظ لآخر الأيام فلا يُحلل التاريخ لكل مكالمة"""
+
+    try:
+        return Date.fromisoformat(day).weekday()
+    except ValueError:
+        return 0
+
+
+def duration_bucket(seconds: Any) -> int:
+    return bisect.bisect_right(DURATION_EDGES, seconds or 0)
+
+
+def call_codes(call: Dict[str, Any]) -> Codes:
+    """
+    أكواد المكالمة في كل الأبعاد (مع offset) - مرة واحدة لكل مكالمة
+
+    على المسار الساخن لكل التقارير: dict.get لكل بُعد بدون تحويل الوقت
+    """
+
+    created_at = str(call.get("created_at") or "")
+    start = call.get("start_time") or created_at
+    day = created_at[:10]
+
+    weekday = WEEKDAY.offset + weekday_of(day)
+
+    emotion = call.get("caller_emotion")
+    priority = call.get("priority_level")
+    if (emotion is None or priority is None) and isinstance(call.get("summary"), dict):
+        emotion = emotion or call["summary"].get("caller_emotion")
+        priority = priority or call["summary"].get("priority_level")
+
+    return (
+        _HOUR_CODES.get(start[11:13], HOUR.offset) if isinstance(start, str) else HOUR.offset + hour_of(start),
+        weekday,
+        EMOTION.lookup.get(emotion or "neutral", EMOTION.default),
+        STATUS.lookup.get(call.get("status"), STATUS.default),
+        PRIORITY.lookup.get(priority, PRIORITY.default),
+        DURATION.offset + bisect.bisect_right(DURATION_EDGES, call.get("duration_seconds") or 0)
+    )
+
+
+def recode(codes: Codes, updates: Dict[str, Any]) -> Codes:
+    """أكواد المكالمة بعد تحديث جزئي - الأبعاد التي لم يمسها التحديث كما هي"""
+
+    hour, weekday, emotion, status, priority, duration = codes
+    if "start_time" in updates or "created_at" in updates:
+        hour = HOUR.offset + hour_of(updates.get("start_time") or updates.get("created_at"))
+    if "created_at" in updates:
+        weekday = WEEKDAY.offset + weekday_of(str(updates["created_at"])[:10])
+    if "caller_emotion" in updates or "summary" in updates:
+        emotion = EMOTION.offset + EMOTION.code(call_emotion(updates))
+    if "status" in updates:
+        status = STATUS.offset + STATUS.code(updates["status"])
+    if "priority_level" in updates or "summary" in updates:
+        priority = PRIORITY.offset + PRIORITY.code(lifted(updates, "priority_level"))
+    if "duration_seconds" in updates:
+        duration = DURATION.offset + duration_bucket(updates["duration_seconds"])
+    return (hour, weekday, emotion, status, priority, duration)
+
+
+# =====================================
+# العدادات
+# =====================================
+
+class CallHistogram:
+    """
+    عدادات ثابتة الحجم لمجموعة مكالمات - مصفوفة واحدة بطول WIDTH لكل الأبعاد
+
+    إضافة مكالمة = زيادة واحدة لكل بُعد بدون بحث أو count على القوائم،
+    والمجموعات الكبيرة تُحسب كلها بـ numpy.bincount واحد (grouped)
+    """
+
+    __slots__ = ("calls", "duration_seconds", "sentiment_sum", "sentiment_count", "positive", "counts")
+
+    def __init__(self):
+        self.calls = 0
+        self.duration_seconds = 0
+        self.sentiment_sum = 0.0
+        self.sentiment_count = 0
+        self.positive = 0
+        self.counts = [0] * WIDTH
+
+    def add(self, codes: Codes, duration: int, sentiment: Optional[float] = None, sign: int = 1):
+        """sign=-1 يطرح مكالمة (تحديث الإحصائيات المجمعة)"""
+
+        self.calls += sign
+        self.duration_seconds += sign * duration
+        counts = self.counts
+        for code in codes:
+            counts[code] += sign
+        if sentiment is not None:
+            self.sentiment_sum += sign * sentiment
+            self.sentiment_count += sign
+            if sentiment > POSITIVE_SENTIMENT:
+                self.positive += sign
+
+    def merge(self, other: "CallHistogram"):
+        self.calls += other.calls
+        self.duration_seconds += other.duration_seconds
+        self.sentiment_sum += other.sentiment_sum
+        self.sentiment_count += other.sentiment_count
+        self.positive += other.positive
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+
+    @classmethod
+    def grouped(
+        cls,
+        groups: Sequence[int],
+        codes: Sequence[Codes],
+        durations: Sequence[int],
+        sentiments: Sequence[Optional[float]],
+        n_groups: int
+    ) -> List["CallHistogram"]:
+        """
+        عدادات كل مجموعة (يوم مثلاً) من أعمدة المكالمات بـ numpy
+
+        كل الأبعاد لكل المجموعات في bincount واحد على (مجموعة * WIDTH + كود)
+        """
+
+        group = np.asarray(groups, dtype=np.int64)
+        matrix = np.asarray(codes, dtype=np.int64).reshape(len(group), len(DIMENSIONS))
+        duration = np.asarray(durations, dtype=np.float64)
+        # None -> nan
+        sentiment = np.asarray(sentiments, dtype=np.float64)
+        scored = ~np.isnan(sentiment)
+
+        counts = np.bincount(
+            (group[:, None] * WIDTH + matrix).ravel(),
+            minlength=n_groups * WIDTH
+        ).reshape(n_groups, WIDTH)
+        calls = np.bincount(group, minlength=n_groups)
+        durations_sum = np.bincount(group, weights=duration, minlength=n_groups)
+        sentiment_sum = np.bincount(group[scored], weights=sentiment[scored], minlength=n_groups)
+        sentiment_count = np.bincount(group[scored], minlength=n_groups)
+        positive = np.bincount(group[scored & (np.nan_to_num(sentiment) > POSITIVE_SENTIMENT)], minlength=n_groups)
+
+        result = []
+        for i in range(n_groups):
+            histogram = cls()
+            histogram.calls = int(calls[i])
+            histogram.duration_seconds = int(durations_sum[i])
+            histogram.sentiment_sum = float(sentiment_sum[i])
+            histogram.sentiment_count = int(sentiment_count[i])
+            histogram.positive = int(positive[i])
+            histogram.counts = counts[i].tolist()
+            result.append(histogram)
+        return result
+
+    # =====================================
+    # القراءة
+    # =====================================
+
+    def histogram(self, dimension: Dimension) -> List[int]:
+        return self.counts[dimension.offset:dimension.offset + dimension.size]
+
+    def breakdown(self, dimension: Dimension) -> Dict[str, int]:
+        """القيم الموجودة فقط"""
+        return {label: count for label, count in zip(dimension.labels, self.histogram(dimension)) if count}
+
+    def count(self, dimension: Dimension, label: str) -> int:
+        return self.counts[dimension.offset + dimension.code(label)]
+
+    def peak(self, dimension: Dimension) -> Optional[int]:
+        """كود القيمة الأكثر (الأصغر عند التساوي) - None بدون مكالمات"""
+
+        if not self.calls:
+            return None
+        values = self.histogram(dimension)
+        return values.index(max(values))
+
+    @property
+    def avg_sentiment(self) -> Optional[float]:
+        return self.sentiment_sum / self.sentiment_count if self.sentiment_count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_calls": self.calls,
+            "answered_calls": self.count(STATUS, "completed"),
+            "missed_calls": self.count(STATUS, "missed"),
+            "by_status": self.breakdown(STATUS),
+            "total_duration_seconds": self.duration_seconds,
+            "emotion_breakdown": self.breakdown(EMOTION),
+            "priority_breakdown": self.breakdown(PRIORITY),
+            "duration_buckets": self.breakdown(DURATION),
+            "calls_by_hour": self.histogram(HOUR),
+            "calls_by_weekday": self.breakdown(WEEKDAY)
+        }
@@ -0,0 +1,368 @@
+"""
+جلسة مكالمة حية عبر WebSocket
+Full-duplex Call Session: streaming STT → LLM → TTS
+"""
+
+import os
+import json
+import time
+import struct
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+from fastapi import WebSocket
+
+from app.models.schemas import AIResponse, ConversationContext, EmotionType
+from app.services.speech_pipeline import SentencePipeline
+
+logger = logging.getLogger(__name__)
+
+# بداية ملف صوتي مضغوط (wav / webm / ogg) بدل PCM خام
+_CONTAINER_MAGIC = (b"RIFF", b"\x1a\x45\xdf\xa3", b"OggS")
+
+
+def _wav(pcm: bytes, sample_rate: int) -> bytes:
+    """PCM16 mono داخل header WAV - Whisper يحتاج ملف صوتي وليس samples خام"""
+
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(pcm), b"WAVE",
+        b"fmt ", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", len(pcm)
+    )
+    return header + pcm
+
+
+class CallSession:
+    """
+    جلسة مكالمة واحدة على WebSocket
+
+    البروتوكول:
+    - العميل يرسل frames صوتية (binary) بشكل مستمر: PCM16 mono little-endian
+      بمعدل WS_AUDIO_SAMPLE_RATE، أو ملف مضغوط (wav / webm / ogg) مقسم على frames
+      - مع الملف المضغوط لا يوجد نص جزئي (لا يمكن قص نهايته بدون فك الضغط)
+    - العميل يرسل {"type": "end_utterance"} عند انتهاء كلام المتصل
+    - العميل يمكنه إرسال {"type": "text", "text": "..."} بدل الصوت
+    - العميل يرسل {"type": "hangup"} لإنهاء الجلسة
+
+    - الخادم يرسل أحداث JSON: ready, partial_transcript, transcript,
+      thinking_sound, llm_token, audio, response_end, error
+    - كل حدث audio يتبعه frame binary يحتوي على MP3 الجملة
+    - thinking_sound يتبعه frame binary بمقطع تفكير جاهز يُشغل فوراً
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        call_id: str,
+        user_id: str,
+        caller_phone: str,
+        user_settings: Dict[str, Any],
+        ai_service,
+        tts_service,
+        stt_service,
+        previous_messages: Optional[List[Dict[str, str]]] = None,
+        on_turn_complete: Optional[Callable[[str, str], Awaitable[None]]] = None
+    ):
+        self.websocket = websocket
+        self.call_id = call_id
+        self.user_id = user_id
+        self.caller_phone = caller_phone
+        self.user_settings = user_settings
+        self.ai = ai_service
+        self.tts = tts_service
+        self.stt = stt_service
+        self.history = list(previous_messages or [])
+        self.on_turn_complete = on_turn_complete
+
+        self.sample_rate = int(os.getenv("WS_AUDIO_SAMPLE_RATE", "16000"))
+
+        # كل كم byte جديد نحاول نص جزئي - لآخر WS_PARTIAL_WINDOW_SECONDS فقط وليس الجملة كلها
+        self.partial_every_bytes = int(os.getenv("WS_PARTIAL_TRANSCRIPT_BYTES", "32000"))
+        window_seconds = float(os.getenv("WS_PARTIAL_WINDOW_SECONDS", "8"))
+        self.partial_window_bytes = int(window_seconds * self.sample_rate) * 2
+
+        # ~60 ثانية PCM16 بـ 16kHz
+        self.max_utterance_bytes = int(os.getenv("WS_MAX_UTTERANCE_BYTES", str(2 * 1024 * 1024)))
+
+        self._buffer = bytearray()
+        self._encoded = False
+        self._last_partial_size = 0
+        self._partial_task: Optional[asyncio.Task] = None
+        self._reply_task: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+
+    async def run(self):
+        """حلقة الاستقبال الرئيسية - تستمر حتى يغلق العميل الاتصال"""
+
+        await self._send_event("ready", call_id=self.call_id)
+
+        try:
+            while True:
+                message = await self.websocket.receive()
+
+                if message["type"] == "websocket.disconnect":
+                    break
+
+                if message.get("bytes") is not None:
+                    await self._on_audio_frame(message["bytes"])
+                elif message.get("text") is not None:
+                    if not await self._on_control_message(message["text"]):
+                        break
+        finally:
+            await self._cancel_tasks()
+            logger.info(f"📴 Call session closed: {self.call_id}")
+
+    # =====================================
+    # الاستقبال
+    # =====================================
+
+    async def _on_audio_frame(self, frame: bytes):
+        """إضافة frame صوتي للجملة الحالية"""
+
+        if not self._buffer:
+            self._encoded = frame[:4] in _CONTAINER_MAGIC
+
+        self._buffer.extend(frame)
+
+        if len(self._buffer) > self.max_utterance_bytes:
+            logger.warning(f"⚠️ Utterance too large in call {self.call_id}, dropping buffer")
+            self._reset_buffer()
+            await self._send_event("error", message="Utterance too large")
+            return
+
+        # نص جزئي كل partial_every_bytes - واحد فقط في نفس الوقت
+        grown = len(self._buffer) - self._last_partial_size
+        partial_running = self._partial_task is not None and not self._partial_task.done()
+        if self._encoded or grown < self.partial_every_bytes or partial_running:
+            return
+
+        self._last_partial_size = len(self._buffer)
+        # النافذة تبدأ على حدود sample (2 bytes)
+        start = max(0, len(self._buffer) - self.partial_window_bytes) & ~1
+        self._partial_task = asyncio.create_task(
+            self._emit_partial_transcript(self._utterance_audio(start))
+        )
+
+    async def _on_control_message(self, raw: str) -> bool:
+        """معالجة رسائل التحكم - ترجع False لإنهاء الجلسة"""
+
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError:
+            await self._send_event("error", message="Invalid JSON message")
+            return True
+
+        message_type = message.get("type")
+
+        if message_type == "end_utterance":
+            audio = self._utterance_audio() if self._buffer else None
+            self._reset_buffer()
+            if audio:
+                self._start_reply(audio=audio)
+            else:
+                await self._send_event("error", message="No audio received")
+        elif message_type == "text":
+            self._reset_buffer()
+            self._start_reply(text=message.get("text") or "مرحباً")
+        elif message_type == "hangup":
+            return False
+        else:
+            await self._send_event("error", message=f"Unknown message type: {message_type}")
+
+        return True
+
+    def _start_reply(self, audio: Optional[bytes] = None, text: Optional[str] = None):
+        """بدء الرد - لو المتصل قاطع الرد السابق نلغيه"""
+
+        if self._partial_task and not self._partial_task.done():
+            self._partial_task.cancel()
+
+        if self._reply_task and not self._reply_task.done():
+            logger.info(f"✋ Barge-in on call {self.call_id}, cancelling previous reply")
+            self._reply_task.cancel()
+
+        self._reply_task = asyncio.create_task(self._reply(audio=audio, text=text))
+
+    def _reset_buffer(self):
+        self._buffer = bytearray()
+        self._last_partial_size = 0
+        self._encoded = False
+
+    def _utterance_audio(self, start: int = 0) -> bytes:
+        """الصوت من start كملف للـ STT - الملف المضغوط يُرسل كما هو"""
+
+        if self._encoded:
+            return bytes(self._buffer)
+        return _wav(bytes(self._buffer[start:]), self.sample_rate)
+
+    # =====================================
+    # STT → LLM → TTS
+    # =====================================
+
+    async def _emit_partial_transcript(self, audio: bytes):
+        """نص جزئي لآخر نافذة من الصوت"""
+
+        result = await self.stt.speech_to_text(audio, language="ar", user_id=self.user_id)
+
+        if result.get("success") and result.get("text"):
+            await self._send_event("partial_transcript", text=result["text"])
+
+    async def _reply(self, audio: Optional[bytes] = None, text: Optional[str] = None):
+        """دورة رد كاملة لجملة واحدة من المتصل"""
+
+        turn_start = time.perf_counter()
+
+        try:
+            if audio is not None:
+                stt_result = await self.stt.speech_to_text(audio, language="ar", user_id=self.user_id)
+
+                if not stt_result.get("success"):
+                    await self._send_event("error", message="Speech recognition failed")
+                    return
+
+                caller_text = stt_result["text"]
+            else:
+                caller_text = text
+
+            await self._send_event("transcript", text=caller_text)
+            logger.info(f"🎤 [{self.call_id}] Caller said: {caller_text[:100]}")
+
+            context = ConversationContext(
+                user_id=self.user_id,
+                caller_phone=self.caller_phone,
+                previous_messages=self.history,
+                caller_relationship="friend"
+            )
+            personality = {
+                "tone": self.user_settings.get("response_style", "friendly"),
+                "style": "مباشر وواضح",
+                "dialect": "مصرية عامية"
+            }
+
+            # المشاعر تُحدد من كلام المتصل لأن الرد لم يكتمل بعد
+            emotion = self.ai.detect_emotion("", caller_text)
+
+            # مقطع تفكير من الذاكرة يُشغل بينما LLM ما زال يبدأ
+            if self.user_settings.get("use_thinking_sounds", True):
+                clip = self.tts.get_thinking_sound(emotion)
+                if clip:
+                    await self._send_thinking_sound(clip)
+
+            async def synthesize(sentence: str) -> Optional[bytes]:
+                return await self._synthesize(sentence, emotion)
+
+            async def on_token(token: str):
+                await self._send_event("llm_token", text=token)
+
+            final: Dict[str, AIResponse] = {}
+
+            async def tokens():
+                async for item in self.ai.analyze_and_respond_stream(caller_text, context, personality):
+                    if isinstance(item, AIResponse):
+                        final["response"] = item
+                    else:
+                        yield item
+
+            # التوليف يبدأ على أول جملة بينما LLM ما زال يولد الباقي
+            pipeline = SentencePipeline(synthesize)
+            seq = 0
+
+            async for segment in pipeline.stream(tokens(), on_token=on_token):
+                if segment["audio"] is None:
+                    await self._send_event("error", message="Text-to-speech failed", text=segment["text"])
+                    continue
+
+                if seq == 0:
+                    latency_ms = int((time.perf_counter() - turn_start) * 1000)
+                    logger.info(f"⚡ [{self.call_id}] Time to first audio: {latency_ms}ms")
+
+                await self._send_audio(segment["seq"], segment["text"], segment["audio"])
+                seq += 1
+
+            # الـ stream انقطع قبل الرد النهائي (مثلاً فشل إرسال token بعد أول جملة) -
+            # ما تولد بالفعل ونُطق هو الرد
+            response = final.get("response") or AIResponse(
+                text=pipeline.text.strip(),
+                emotion=emotion,
+                confidence=0.0,
+                thinking_time_ms=int((time.perf_counter() - turn_start) * 1000)
+            )
+            response_text = response.text
+
+            await self._send_event(
+                "response_end",
+                text=response_text,
+                emotion=response.emotion.value,
+                suggested_actions=response.suggested_actions,
+                audio_segments=seq,
+                time_to_first_token_ms=response.time_to_first_token_ms
+            )
+
+            self.history.append({"role": "user", "content": caller_text})
+            self.history.append({"role": "assistant", "content": response_text})
+
+            if self.on_turn_complete:
+                await self.on_turn_complete(caller_text, response_text)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error in call session {self.call_id}: {e}", exc_info=True)
+            await self._send_event("error", message=str(e))
+
+    async def _synthesize(self, sentence: str, emotion: EmotionType) -> Optional[bytes]:
+        """تحويل جملة واحدة لصوت MP3"""
+
+        tts_result = await self.tts.text_to_speech(
+            text=sentence,
+            user_id=self.user_id,
+            emotion=emotion,
+            speed=self.user_settings.get("voice_speed", 1.0),
+            add_thinking_sounds=False,
+            as_base64=False
+        )
+
+        if not tts_result.get("success"):
+            return None
+
+        return tts_result["audio_bytes"]
+
+    # =====================================
+    # الإرسال
+    # =====================================
+
+    async def _send_event(self, event_type: str, **data):
+        async with self._send_lock:
+            await self.websocket.send_json({"type": event_type, **data})
+
+    async def _send_audio(self, seq: int, text: str, audio_bytes: bytes):
+        # الحدث والـ binary frame يُرسلان معاً بدون تداخل
+        async with self._send_lock:
+            await self.websocket.send_json({
+                "type": "audio",
+                "seq": seq,
+                "text": text,
+                "format": "mp3",
+                "bytes": len(audio_bytes)
+            })
+            await self.websocket.send_bytes(audio_bytes)
+
+    async def _send_thinking_sound(self, audio_bytes: bytes):
+        async with self._send_lock:
+            await self.websocket.send_json({
+                "type": "thinking_sound",
+                "format": "mp3",
+                "bytes": len(audio_bytes)
+            })
+            await self.websocket.send_bytes(audio_bytes)
+
+    async def _cancel_tasks(self):
+        for task in (self._partial_task, self._reply_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
@@ -0,0 +1,82 @@
+"""
+أشكال قراءة المكالمات
+Named column projections for call queries, shared by every storage backend
+"""
+
+from typing import Any, Dict, Literal, Optional
+
+CallView = Literal["list", "stats", "full"]
+
+# اسم الحقل في النتيجة -> مساره في السجل
+# "summary.x" = حقل من داخل الملخص يُرفع لأعلى بدون قراءة الملخص كاملاً
+CALL_VIEWS: Dict[str, Optional[Dict[str, str]]] = {
+    # سجل المكالمات في التطبيق: كل شيء ما عدا المحادثة (الجزء الأكبر)
+    "list": {
+        "id": "id",
+        "user_id": "user_id",
+        "caller_phone": "caller_phone",
+        "caller_name": "caller_name",
+        "status": "status",
+        "duration_seconds": "duration_seconds",
+        "created_at": "created_at",
+        "start_time": "start_time",
+        "end_time": "end_time",
+        "summary": "summary"
+    },
+    # التقارير والإحصائيات: أعمدة صغيرة فقط
+    "stats": {
+        "id": "id",
+        "caller_phone": "caller_phone",
+        "caller_name": "caller_name",
+        "status": "status",
+        "duration_seconds": "duration_seconds",
+        "created_at": "created_at",
+        "start_time": "start_time",
+        "caller_emotion": "summary.caller_emotion",
+        "caller_sentiment_score": "summary.caller_sentiment_score",
+        "priority_level": "summary.priority_level",
+        "follow_up_suggestions": "summary.follow_up_suggestions"
+    },
+    "full": None
+}
+
+
+def view_fields(view: str) -> Optional[Dict[str, str]]:
+    """الحقول المطلوبة - None = السجل كاملاً"""
+
+    if view not in CALL_VIEWS:
+        raise ValueError(f"Unknown call view '{view}'; available: {', '.join(CALL_VIEWS)}")
+    return CALL_VIEWS[view]
+
+
+def postgrest_select(fields: Optional[Dict[str, str]]) -> str:
+    """select لـ Supabase: alias:summary->x للحقول الداخلية"""
+
+    if fields is None:
+        return "*"
+    return ",".join(
+        name if name == path else f"{name}:{path.replace('.', '->')}"
+        for name, path in fields.items()
+    )
+
+
+def project(record: Dict[str, Any], fields: Optional[Dict[str, str]], partial: bool = False) -> Dict[str, Any]:
+    """
+    تطبيق الشكل على سجل كامل
+
+    partial: للتحديثات - الحقول الموجودة في السجل فقط (بدون None للباقي)
+    """
+
+    if fields is None:
+        return record
+
+    result = {}
+    for name, path in fields.items():
+        root, _, rest = path.partition(".")
+        if partial and root not in record:
+            continue
+        value = record.get(root)
+        if rest:
+            value = value.get(rest) if isinstance(value, dict) else None
+        result[name] = value
+    return result
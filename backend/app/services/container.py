@@ -0,0 +1,77 @@
+"""
+حاوية الخدمات
+Service container: every shared service is built once and injected into routers via Depends
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+from starlette.requests import HTTPConnection
+
+from app.services.ai_service import AIService
+from app.services.database import DatabaseService
+from app.services.http_pool import close_http_pools
+from app.services.speech_engines import STTEngine, TTSEngine, close_speech_engines, get_stt_engine, get_tts_engine
+from app.services.summary_service import SummaryService
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    الخدمات المشتركة لكل الـ routers
+
+    تُبنى مرة واحدة في lifespan، فكل endpoints تستخدم نفس اتصال قاعدة
+    البيانات ونفس التخزين المحلي ونفس محركات الكلام
+    """
+
+    def __init__(self):
+        self.db = DatabaseService()
+        self.ai = AIService()
+        self.summary = SummaryService(ai_service=self.ai)
+        self.stt: STTEngine = get_stt_engine()
+        self.tts: TTSEngine = get_tts_engine()
+        self._background: List[asyncio.Task] = []
+
+    async def startup(self):
+        """الاتصال بقاعدة البيانات + التسخين في الخلفية"""
+
+        await self.db.initialize()
+
+        # مقاطع أصوات التفكير + كاش الردود الاحتياطية - التشغيل لا ينتظر Edge TTS
+        self._background = [
+            asyncio.create_task(self.tts.build_thinking_sounds()),
+            asyncio.create_task(self.tts.prewarm_cache())
+        ]
+
+    async def shutdown(self):
+        """إيقاف التسخين وإغلاق كل الاتصالات"""
+
+        for task in self._background:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+        await self.db.close()
+        await close_speech_engines()
+        await close_http_pools()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "database": self.db.store.name if self.db.store else "supabase",
+            "settings_cache": self.db.settings_cache.stats() if self.db.settings_cache else None,
+            "write_buffer": self.db.writes.stats() if self.db.writes else None,
+            "rollups": self.db.rollups.stats(),
+            "warmup_pending": sum(1 for task in self._background if not task.done())
+        }
+
+
+def get_services(connection: HTTPConnection) -> ServiceContainer:
+    """
+    Dependency للـ routers (HTTP و WebSocket)
+
+    Usage:
+        services: ServiceContainer = Depends(get_services)
+    """
+    return connection.app.state.services
@@ -4,13 +4,60 @@ Database Service using Supabase
 """
 
 import os
+import uuid
+import base64
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Set, Tuple, Union
 from datetime import datetime, timedelta
 import json
 
+from app.services.call_views import CallView, postgrest_select, project, view_fields
+from app.services.local_store import LocalStore
+from app.services.rollups import DailyRollup, DailyRollups
+from app.services.sqlite_store import SQLiteStore
+from app.services.write_buffer import WriteBehindBuffer
+from app.services.settings_cache import SettingsCache
+from app.utils.metrics import DB_QUERY_SECONDS, track_upstream
+
+try:
+    from postgrest.exceptions import APIError
+except ImportError:
+    APIError = None
+
 logger = logging.getLogger(__name__)
 
+# (created_at, id) لآخر مكالمة في الصفحة
+CallCursor = Tuple[str, str]
+
+
+def encode_cursor(call: Dict[str, Any]) -> str:
+    """cursor للصفحة التالية - opaque للعميل"""
+    raw = json.dumps([call["created_at"], call["id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> CallCursor:
+    """ValueError لو الـ cursor غير صالح"""
+    try:
+        created_at, call_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at), str(call_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _row_error(error: Exception) -> bool:
+    """
+    الخطأ سببه بيانات صف (UUID غير صالح، عمود غير موجود، قيد) وليس الاتصال -
+    الدفعة تُقسم لعزل الصف بدل إسقاط الكل. أخطاء الشبكة تفشل الدفعة كاملة
+    """
+
+    if isinstance(error, (ValueError, TypeError, KeyError, sqlite3.IntegrityError, sqlite3.InterfaceError)):
+        return True
+    return APIError is not None and isinstance(error, APIError)
+
 class DatabaseService:
     """خدمة قاعدة البيانات"""
     
@@ -19,17 +66,54 @@ class DatabaseService:
         self.supabase_key = os.getenv("SUPABASE_KEY")
         self.client = None
         
-        # في حالة عدم وجود Supabase، استخدم تخزين محلي
-        self.use_local = not (self.supabase_url and self.supabase_key)
+        # supabase-py متزامن - الاستعلامات تعمل في threads بعدد محدود
+        # حتى لا يتوقف الـ event loop أثناء انتظار PostgREST
+        self.max_concurrency = int(os.getenv("SUPABASE_MAX_CONCURRENCY", "10"))
+        self._executor: Optional[ThreadPoolExecutor] = None
         
-        if self.use_local:
-            logger.warning("⚠️ Using local storage (Supabase not configured)")
-            self.local_storage = {
-                "calls": [],
-                "messages": [],
-                "users": {},
-                "settings": {}
-            }
+        # الإعدادات تُقرأ في بداية كل مكالمة - None لو SETTINGS_CACHE_TTL_SECONDS=0
+        self.settings_cache = SettingsCache.from_env()
+        
+        # حفظ تفاعلات المكالمات والرسائل يُجمع في دفعات (DB_WRITE_BATCH_SIZE<=1 = بدون تجميع)
+        self.write_batch_size = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))
+        self.writes: Optional[WriteBehindBuffer] = None
+        if self.write_batch_size > 1:
+            self.writes = WriteBehindBuffer(
+                self._flush_writes,
+                batch_size=self.write_batch_size,
+                flush_interval=int(os.getenv("DB_WRITE_FLUSH_MS", "500")) / 1000,
+                max_pending=int(os.getenv("DB_WRITE_MAX_PENDING", "5000")),
+                retry_base=int(os.getenv("DB_WRITE_RETRY_MS", "500")) / 1000,
+                on_drop=self._write_dropped
+            )
+        
+        # supabase | sqlite | memory - الافتراضي Supabase لو مُعد، وإلا تخزين محلي
+        default_backend = "supabase" if self.supabase_url and self.supabase_key else "memory"
+        self.backend = os.getenv("DATABASE_BACKEND", default_backend).strip().lower()
+        if self.backend == "supabase" and default_backend != "supabase":
+            logger.warning("⚠️ DATABASE_BACKEND=supabase but SUPABASE_URL/SUPABASE_KEY missing")
+            self.backend = "memory"
+        
+        self.use_local = self.backend != "supabase"
+        
+        # إحصائيات (مستخدم، يوم) تُحدث مع كل كتابة - التقارير لا تقرأ المكالمات الخام.
+        # Supabase مشترك بين الـ workers: تحديث دوري بما تغير لرؤية كتابات الآخرين
+        self.rollups = DailyRollups(
+            refresh_seconds=float(os.getenv("ROLLUP_REFRESH_SECONDS", "300")) if not self.use_local else None,
+            retention_days=int(os.getenv("ROLLUP_RETENTION_DAYS", "90")) or None,
+            max_users=int(os.getenv("ROLLUP_MAX_USERS", "1000")) or None
+        )
+        
+        self.store: Optional[Union[LocalStore, SQLiteStore]] = None
+        
+        if self.backend == "sqlite":
+            self.store = SQLiteStore(
+                os.getenv("SQLITE_PATH", "./data/assistant.db"),
+                pool_size=int(os.getenv("SQLITE_POOL_SIZE", "4"))
+            )
+        elif self.use_local:
+            logger.warning("⚠️ Using in-memory local storage (data is lost on restart)")
+            self.store = LocalStore()
         else:
             logger.info("✅ Supabase configured")
     
@@ -39,20 +123,252 @@ class DatabaseService:
         if not self.use_local:
             try:
                 from supabase import create_client
+                # client واحد (اتصال HTTP واحد يُعاد استخدامه) مشترك بين كل الـ threads
                 self.client = create_client(self.supabase_url, self.supabase_key)
-                logger.info("✅ Connected to Supabase")
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="supabase"
+                )
+                logger.info(f"✅ Connected to Supabase (max {self.max_concurrency} concurrent queries)")
             except ImportError:
                 logger.warning("⚠️ Supabase library not installed, using local storage")
                 self.use_local = True
+                self.store = LocalStore()
             except Exception as e:
                 logger.error(f"❌ Error connecting to Supabase: {e}")
                 self.use_local = True
+                self.store = LocalStore()
+        
+        if self.store is not None:
+            await self.store.initialize()
+        
+        if self.writes is not None:
+            self.writes.start()
     
     async def close(self):
         """إغلاق الاتصال"""
+        if self.writes is not None:
+            # قبل إغلاق الـ executor والتخزين - لا تضيع كتابة مؤجلة
+            await self.writes.close()
+        if self.store is not None:
+            await self.store.close()
+        if self._executor is not None:
+            # انتظار الاستعلامات الجارية بدون إيقاف الـ event loop
+            await asyncio.to_thread(self._executor.shutdown, True)
+            self._executor = None
+        if self.settings_cache is not None:
+            await self.settings_cache.close()
         if self.client:
             logger.info("Closing database connection")
     
+    async def _execute(self, operation: str, query) -> Any:
+        """
+        تنفيذ استعلام Supabase بدون إيقاف الـ event loop
+        
+        Args:
+            operation: اسم العملية للقياس (db_query_duration_seconds)
+            query: query builder جاهز (قبل execute)
+        """
+        
+        loop = asyncio.get_running_loop()
+        with DB_QUERY_SECONDS.time(operation=operation), track_upstream("supabase"):
+            return await loop.run_in_executor(self._executor, query.execute)
+    
+    # =====================================
+    # Write-behind
+    # =====================================
+    
+    async def queue_call(self, call_data: Dict[str, Any]) -> str:
+        """
+        حفظ مكالمة في الدفعة التالية (بدون انتظار قاعدة البيانات)
+        
+        الـ id يُولد هنا (أو id الجلسة الحية لو موجود) فيمكن استخدامه فوراً -
+        get_call يرى السجل قبل كتابته
+        """
+        
+        if self.writes is None:
+            return await self.save_call(call_data)
+        
+        call_data.setdefault("id", str(uuid.uuid4()))
+        call_data["created_at"] = datetime.now().isoformat()
+        await self.writes.insert("calls", call_data["id"], call_data)
+        self.rollups.add(call_data)
+        return call_data["id"]
+    
+    async def queue_call_update(self, call_id: str, updates: Dict[str, Any]):
+        """تحديث مؤجل - التحديثات المتتالية لنفس المكالمة تُدمج في تحديث واحد"""
+        
+        if self.writes is None:
+            await self.update_call(call_id, updates)
+            return
+        
+        # updated_at يُضاف عند الإرسال (_flush_writes) - قيمة واحدة للدفعة
+        await self.writes.update("calls", call_id, updates)
+        self.rollups.update(updates.get("user_id"), call_id, updates)
+    
+    async def queue_message(self, message_data: Dict[str, Any]) -> str:
+        """حفظ رسالة في الدفعة التالية"""
+        
+        if self.writes is None:
+            return await self.save_message(message_data)
+        
+        message_data["id"] = str(uuid.uuid4())
+        message_data["created_at"] = datetime.now().isoformat()
+        await self.writes.insert("messages", message_data["id"], message_data)
+        return message_data["id"]
+    
+    async def _flush_writes(
+        self,
+        table: str,
+        inserts: List[Dict[str, Any]],
+        updates: Dict[str, Dict[str, Any]]
+    ) -> Set[str]:
+        """
+        كتابة دفعة واحدة من WriteBehindBuffer - ترجع ids الصفوف التي فشلت
+        
+        Supabase: upsert واحد لكل مجموعة سجلات بنفس الأعمدة (PostgREST يشترط
+        نفس المفاتيح في كل الصفوف) - upsert يجعل إعادة دفعة فاشلة آمنة.
+        صف سيئ لا يُفشل الدفعة: المجموعة تُقسم حتى يُعزل (_write_isolated)
+        """
+        
+        failed: List[Dict[str, Any]] = []
+        
+        if inserts:
+            if self.use_local:
+                insert_many = {"calls": self.store.insert_calls, "messages": self.store.insert_messages}[table]
+                failed += await self._write_isolated(f"batch_insert_{table}", insert_many, inserts)
+            else:
+                groups: Dict[tuple, List[Dict[str, Any]]] = {}
+                for row in inserts:
+                    groups.setdefault(tuple(sorted(row)), []).append(row)
+                
+                async def upsert(rows: List[Dict[str, Any]]):
+                    await self._execute(f"batch_insert_{table}", self.client.table(table).upsert(rows))
+                
+                for rows in groups.values():
+                    for start in range(0, len(rows), self.write_batch_size):
+                        failed += await self._write_isolated(
+                            f"batch_insert_{table}", upsert, rows[start:start + self.write_batch_size]
+                        )
+            logger.info(f"💾 Flushed {len(inserts) - len(failed)} {table} in one batch")
+        
+        failed_ids = {row["id"] for row in failed}
+        
+        if updates:
+            # التحديثات لمكالمات مكتوبة بالفعل - واحد لكل مكالمة بعد الدمج
+            updated_at = datetime.now().isoformat()
+            updates = {row_id: {**fields, "updated_at": updated_at} for row_id, fields in updates.items()}
+            failed_updates: List[str] = []
+            
+            if self.use_local:
+                async def update_local(row_ids: List[str]):
+                    await self.store.update_calls({row_id: updates[row_id] for row_id in row_ids})
+                
+                failed_updates += await self._write_isolated(
+                    f"batch_update_{table}", update_local, list(updates), row_id=lambda row_id: row_id
+                )
+            else:
+                # upsert جزئي يفشل (أعمدة NOT NULL غير موجودة في التحديث) - المكالمات
+                # بنفس الحقول والقيم (حالة، ملخص فارغ...) تُحدث بطلب واحد على id=in.(...)
+                groups: Dict[str, Tuple[Dict[str, Any], List[str]]] = {}
+                for row_id, fields in updates.items():
+                    key = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+                    groups.setdefault(key, (fields, []))[1].append(row_id)
+                
+                for fields, row_ids in groups.values():
+                    async def update_group(ids: List[str], fields: Dict[str, Any] = fields):
+                        await self._execute(f"batch_update_{table}", self.client.table(table).update(fields).in_("id", ids))
+                    
+                    for start in range(0, len(row_ids), self.write_batch_size):
+                        failed_updates += await self._write_isolated(
+                            f"batch_update_{table}", update_group, row_ids[start:start + self.write_batch_size],
+                            row_id=lambda row_id: row_id
+                        )
+            logger.info(f"💾 Flushed {len(updates) - len(failed_updates)} {table} updates in one batch")
+            failed_ids.update(failed_updates)
+        
+        return failed_ids
+    
+    async def _write_isolated(
+        self,
+        operation: str,
+        write: Callable[[List[Any]], Awaitable[Any]],
+        items: List[Any],
+        row_id: Callable[[Any], str] = lambda row: row["id"]
+    ) -> List[Any]:
+        """
+        كتابة items دفعة واحدة - ترجع العناصر التي فشلت
+        
+        لو الخطأ من بيانات صف: تقسيم نصفين حتى يُعزل الصف السيئ فتُكتب باقي
+        الصفوف (log2(n) طلبات إضافية لكل صف سيئ). خطأ اتصال = كل العناصر فشلت
+        """
+        
+        try:
+            await write(items)
+            return []
+        except Exception as e:
+            if len(items) == 1 or not _row_error(e):
+                what = row_id(items[0]) if len(items) == 1 else f"{len(items)} rows"
+                logger.error(f"❌ {operation} failed for {what}: {e}")
+                return items
+        
+        middle = len(items) // 2
+        return (
+            await self._write_isolated(operation, write, items[:middle], row_id)
+            + await self._write_isolated(operation, write, items[middle:], row_id)
+        )
+    
+    def _write_dropped(self, table: str, row_id: str, row: Dict[str, Any], inserted: bool):
+        """الإحصائيات المجمعة حسبت الكتابة عند إضافتها للدفعة - لم تصل لقاعدة البيانات"""
+        
+        if table != "calls":
+            return
+        if inserted:
+            self.rollups.discard(row.get("user_id"), row_id)
+        else:
+            self.rollups.invalidate(row.get("user_id"), row_id)
+    
+    def _unwritten(self, table: str, row_id: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """نسخة مما لم يُكتب بعد - تُؤخذ قبل الاستعلام (انظر WriteBehindBuffer.unwritten)"""
+        
+        if self.writes is None:
+            return {}, {}
+        return self.writes.unwritten(table, row_id)
+    
+    def _merge_unwritten(self, table: str, snapshot, row_id: Optional[str] = None):
+        """النسخة قبل الاستعلام + ما أضيف أثناءه - الأحدث يفوز"""
+        
+        inserts, updates = snapshot
+        later_inserts, later_updates = self._unwritten(table, row_id)
+        inserts = {**inserts, **later_inserts}
+        merged_updates = {key: dict(fields) for key, fields in updates.items()}
+        for key, fields in later_updates.items():
+            merged_updates.setdefault(key, {}).update(fields)
+        return inserts, merged_updates
+    
+    def _with_pending_calls(
+        self,
+        calls: List[Dict[str, Any]],
+        matches,
+        fields: Optional[Dict[str, str]],
+        snapshot
+    ) -> List[Dict[str, Any]]:
+        """نتيجة القراءة + المكالمات التي لم تُكتب بعد + التحديثات المعلقة (بنفس الشكل)"""
+        
+        inserts, updates = self._merge_unwritten("calls", snapshot)
+        
+        merged = {call["id"]: call for call in calls}
+        for call_id, call in inserts.items():
+            if matches(call):
+                merged[call_id] = project(call, fields)
+        
+        # التحديث يُطبق مرة أخرى حتى لو وصل للسجل - نفس القيم
+        result = []
+        for call_id, call in merged.items():
+            pending = updates.get(call_id)
+            result.append({**call, **project(pending, fields, partial=True)} if pending else call)
+        return result
+    
     # =====================================
     # Call Operations
     # =====================================
@@ -64,16 +380,15 @@ class DatabaseService:
             call_data["created_at"] = datetime.now().isoformat()
             
             if self.use_local:
-                call_id = f"call_{len(self.local_storage['calls']) + 1}"
-                call_data["id"] = call_id
-                self.local_storage["calls"].append(call_data)
+                call_id = await self.store.insert_call(call_data)
                 logger.info(f"💾 Call saved locally: {call_id}")
-                return call_id
             else:
-                response = self.client.table("calls").insert(call_data).execute()
+                response = await self._execute("save_call", self.client.table("calls").insert(call_data))
                 call_id = response.data[0]["id"]
                 logger.info(f"💾 Call saved to Supabase: {call_id}")
-                return call_id
+            
+            self.rollups.add({**call_data, "id": call_id})
+            return call_id
                 
         except Exception as e:
             logger.error(f"❌ Error saving call: {e}")
@@ -83,14 +398,21 @@ class DatabaseService:
         """الحصول على بيانات مكالمة"""
         
         try:
+            # قبل القراءة: دفعة تكتمل أثناءها تظل في النسخة
+            snapshot = self._unwritten("calls", call_id)
+            if call_id in snapshot[0]:
+                return {**snapshot[0][call_id], **snapshot[1].get(call_id, {})}
+            
             if self.use_local:
-                for call in self.local_storage["calls"]:
-                    if call.get("id") == call_id:
-                        return call
-                return None
+                call = await self.store.get_call(call_id)
             else:
-                response = self.client.table("calls").select("*").eq("id", call_id).execute()
-                return response.data[0] if response.data else None
+                response = await self._execute("get_call", self.client.table("calls").select("*").eq("id", call_id))
+                call = response.data[0] if response.data else None
+            
+            if call is not None and self.writes is not None:
+                _, updates = self._merge_unwritten("calls", snapshot, call_id)
+                call = {**call, **updates.get(call_id, {})}
+            return call
                 
         except Exception as e:
             logger.error(f"❌ Error getting call: {e}")
@@ -100,37 +422,92 @@ class DatabaseService:
         self, 
         user_id: str, 
         limit: int = 50,
-        date_from: Optional[str] = None
+        date_from: Optional[str] = None,
+        view: CallView = "full",
+        before: Optional[CallCursor] = None
     ) -> List[Dict[str, Any]]:
-        """الحصول على مكالمات المستخدم"""
+        """
+        الحصول على مكالمات المستخدم (الأحدث أولاً، بترتيب (created_at, id))
+        
+        Args:
+            view: الأعمدة المطلوبة - list (بدون المحادثة) / stats (أعمدة التقارير) / full
+            before: المكالمات الأقدم من (created_at, id) فقط - للصفحة التالية
+        """
         
         try:
-            if self.use_local:
-                calls = [
-                    call for call in self.local_storage["calls"]
-                    if call.get("user_id") == user_id
-                ]
-                
-                if date_from:
-                    calls = [
-                        call for call in calls
-                        if call.get("created_at", "") >= date_from
-                    ]
-                
-                return calls[:limit]
-            else:
-                query = self.client.table("calls").select("*").eq("user_id", user_id)
-                
-                if date_from:
-                    query = query.gte("created_at", date_from)
-                
-                response = query.order("created_at", desc=True).limit(limit).execute()
-                return response.data
-                
+            return await self._fetch_user_calls(user_id, limit, date_from, view, before)
         except Exception as e:
             logger.error(f"❌ Error getting user calls: {e}")
             return []
     
+    async def iter_user_calls(
+        self,
+        user_id: str,
+        view: CallView = "full",
+        date_from: Optional[str] = None,
+        page_size: int = 500
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        كل مكالمات المستخدم (الأحدث أولاً) صفحة بصفحة بالـ keyset
+        
+        للتصدير: الذاكرة بحجم صفحة واحدة مهما كان عدد المكالمات، والخطأ
+        يوقف التصدير بدل أن يرجع نتيجة ناقصة
+        """
+        
+        before = None
+        while True:
+            page = await self._fetch_user_calls(user_id, page_size, date_from, view, before)
+            for call in page:
+                yield call
+            if len(page) < page_size:
+                return
+            before = (page[-1]["created_at"], page[-1]["id"])
+    
+    async def _fetch_user_calls(
+        self,
+        user_id: str,
+        limit: int,
+        date_from: Optional[str],
+        view: CallView,
+        before: Optional[CallCursor]
+    ) -> List[Dict[str, Any]]:
+        """get_user_calls بدون التقاط الأخطاء"""
+        
+        fields = view_fields(view)
+        snapshot = self._unwritten("calls")
+        
+        if self.use_local:
+            calls = await self.store.user_calls(user_id, limit, date_from, fields, before)
+        else:
+            query = self.client.table("calls").select(postgrest_select(fields)).eq("user_id", user_id)
+            
+            if date_from:
+                query = query.gte("created_at", date_from)
+            
+            if before:
+                created_at, call_id = before
+                query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{call_id}")')
+            
+            query = query.order("created_at", desc=True).order("id", desc=True).limit(limit)
+            response = await self._execute("get_user_calls", query)
+            calls = response.data
+        
+        if not any(snapshot) and (self.writes is None or not self.writes.has_unwritten()):
+            return calls
+        
+        calls = self._with_pending_calls(
+            calls,
+            lambda call: (
+                call.get("user_id") == user_id
+                and (not date_from or call["created_at"] >= date_from)
+                and (not before or (call["created_at"], call["id"]) < before)
+            ),
+            fields,
+            snapshot
+        )
+        calls.sort(key=lambda call: (call["created_at"], call["id"]), reverse=True)
+        return calls[:limit]
+    
     async def update_call(self, call_id: str, updates: Dict[str, Any]) -> bool:
         """تحديث بيانات مكالمة"""
         
@@ -138,14 +515,14 @@ class DatabaseService:
             updates["updated_at"] = datetime.now().isoformat()
             
             if self.use_local:
-                for call in self.local_storage["calls"]:
-                    if call.get("id") == call_id:
-                        call.update(updates)
-                        return True
-                return False
+                updated = await self.store.update_call(call_id, updates)
             else:
-                self.client.table("calls").update(updates).eq("id", call_id).execute()
-                return True
+                await self._execute("update_call", self.client.table("calls").update(updates).eq("id", call_id))
+                updated = True
+            
+            if updated:
+                self.rollups.update(updates.get("user_id"), call_id, updates)
+            return updated
                 
         except Exception as e:
             logger.error(f"❌ Error updating call: {e}")
@@ -156,27 +533,41 @@ class DatabaseService:
     # =====================================
     
     async def get_user_settings(self, user_id: str) -> Dict[str, Any]:
-        """الحصول على إعدادات المستخدم"""
+        """الحصول على إعدادات المستخدم (من الكاش لو متاحة)"""
         
         try:
-            if self.use_local:
-                return self.local_storage["settings"].get(user_id, self._default_settings())
-            else:
-                response = self.client.table("user_settings").select("*").eq("user_id", user_id).execute()
-                
-                if response.data:
-                    return response.data[0]
-                else:
-                    # إنشاء إعدادات افتراضية
-                    default = self._default_settings()
-                    default["user_id"] = user_id
-                    await self.save_user_settings(user_id, default)
-                    return default
+            if self.settings_cache is None:
+                return await self._load_user_settings(user_id)
+            return await self.settings_cache.get_or_load(
+                user_id,
+                lambda: self._load_user_settings(user_id)
+            )
                     
         except Exception as e:
+            # الافتراضية عند الخطأ لا تُحفظ في الكاش
             logger.error(f"❌ Error getting user settings: {e}")
             return self._default_settings()
     
+    async def _load_user_settings(self, user_id: str) -> Dict[str, Any]:
+        """قراءة الإعدادات من قاعدة البيانات مباشرة"""
+        
+        if self.use_local:
+            return dict(await self.store.get_settings(user_id) or self._default_settings())
+        
+        response = await self._execute(
+            "get_user_settings",
+            self.client.table("user_settings").select("*").eq("user_id", user_id)
+        )
+        
+        if response.data:
+            return response.data[0]
+        
+        # إنشاء إعدادات افتراضية
+        default = self._default_settings()
+        default["user_id"] = user_id
+        await self.save_user_settings(user_id, default)
+        return default
+    
     async def save_user_settings(self, user_id: str, settings: Dict[str, Any]) -> bool:
         """حفظ إعدادات المستخدم"""
         
@@ -185,12 +576,15 @@ class DatabaseService:
             settings["updated_at"] = datetime.now().isoformat()
             
             if self.use_local:
-                self.local_storage["settings"][user_id] = settings
-                return True
+                await self.store.save_settings(user_id, settings)
             else:
                 # Upsert (Insert or Update)
-                self.client.table("user_settings").upsert(settings).execute()
-                return True
+                await self._execute("save_user_settings", self.client.table("user_settings").upsert(settings))
+            
+            # إصدار جديد للكاش - القراءة التالية ترى الحفظ فوراً
+            if self.settings_cache is not None:
+                await self.settings_cache.put(user_id, settings)
+            return True
                 
         except Exception as e:
             logger.error(f"❌ Error saving user settings: {e}")
@@ -215,38 +609,71 @@ class DatabaseService:
     # Statistics & Reports
     # =====================================
     
+    async def get_period_rollup(self, user_id: str, date_from: str, date_to: Optional[str] = None) -> DailyRollup:
+        """
+        إحصائيات الفترة من date_from إلى date_to (شاملة) مجمعة من أيامها
+        
+        كل المكالمات محسوبة - بدون حد الـ 1000 مكالمة. فترة تبدأ قبل نافذة
+        الاحتفاظ (ROLLUP_RETENTION_DAYS) تُجمع من المكالمات مباشرة
+        """
+        
+        if not self.rollups.covers(date_from):
+            period = DailyRollup()
+            async for call in self.iter_user_calls(user_id, view="stats", date_from=date_from, page_size=1000):
+                if date_to is None or str(call.get("created_at") or "")[:10] <= date_to[:10]:
+                    period.include(call)
+            return period
+        
+        await self.rollups.ensure(
+            user_id,
+            lambda date_from: self._load_rollup_calls(user_id, date_from),
+            None if self.use_local else lambda since: self._load_changed_rollup_calls(user_id, since)
+        )
+        return self.rollups.total(user_id, date_from, date_to)
+    
+    async def _load_rollup_calls(self, user_id: str, date_from: Optional[str]) -> List[Dict[str, Any]]:
+        """مكالمات المستخدم في نافذة الاحتفاظ (أعمدة الإحصائيات فقط) لبناء الإحصائيات أول مرة"""
+        return [call async for call in self.iter_user_calls(user_id, view="stats", date_from=date_from, page_size=1000)]
+    
+    async def _load_changed_rollup_calls(self, user_id: str, since: str, page_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Supabase: المكالمات المضافة أو المحدثة منذ since (من كل الـ workers)
+        
+        المكالمات التي لم تُكتب بعد من هذا الـ process مساهمتها الحالية أحدث من
+        النسخة المقروءة - تُستبعد
+        """
+        
+        snapshot = self._unwritten("calls")
+        select = postgrest_select(view_fields("stats"))
+        calls: List[Dict[str, Any]] = []
+        last_id = None
+        
+        while True:
+            query = self.client.table("calls").select(select).eq("user_id", user_id)\
+                .or_(f'created_at.gte."{since}",updated_at.gte."{since}"')
+            if last_id:
+                query = query.gt("id", last_id)
+            response = await self._execute("get_changed_calls", query.order("id").limit(page_size))
+            calls.extend(response.data)
+            if len(response.data) < page_size:
+                break
+            last_id = response.data[-1]["id"]
+        
+        inserts, updates = self._merge_unwritten("calls", snapshot)
+        return [call for call in calls if call["id"] not in inserts and call["id"] not in updates]
+    
     async def get_daily_stats(self, user_id: str, date: str) -> Dict[str, Any]:
         """الحصول على إحصائيات يومية"""
         
         try:
-            calls = await self.get_user_calls(
-                user_id, 
-                limit=1000,
-                date_from=date
-            )
-            
-            # تصفية المكالمات لليوم المحدد فقط
-            date_calls = [
-                call for call in calls
-                if call.get("created_at", "").startswith(date)
-            ]
-            
-            # حساب الإحصائيات
-            total_calls = len(date_calls)
-            answered_calls = len([c for c in date_calls if c.get("status") == "completed"])
-            missed_calls = len([c for c in date_calls if c.get("status") == "missed"])
-            
-            total_duration = sum(c.get("duration_seconds", 0) for c in date_calls)
-            avg_duration = total_duration / total_calls if total_calls > 0 else 0
+            day = await self.get_period_rollup(user_id, date, date)
             
             return {
                 "date": date,
-                "total_calls": total_calls,
-                "answered_calls": answered_calls,
-                "missed_calls": missed_calls,
-                "total_duration_minutes": total_duration // 60,
-                "average_call_duration": round(avg_duration, 2),
-                "calls": date_calls
+                **day.to_dict(),
+                "total_duration_minutes": day.duration_seconds // 60,
+                "average_call_duration": round(day.duration_seconds / day.calls, 2) if day.calls else 0,
+                "top_callers": day.top_callers()
             }
             
         except Exception as e:
@@ -258,31 +685,8 @@ class DatabaseService:
         
         try:
             date_from = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-            calls = await self.get_user_calls(user_id, limit=1000, date_from=date_from)
-            
-            # تجميع حسب المتصل
-            callers = {}
-            for call in calls:
-                phone = call.get("caller_phone", "unknown")
-                if phone not in callers:
-                    callers[phone] = {
-                        "phone": phone,
-                        "name": call.get("caller_name", "غير معروف"),
-                        "count": 0,
-                        "total_duration": 0
-                    }
-                
-                callers[phone]["count"] += 1
-                callers[phone]["total_duration"] += call.get("duration_seconds", 0)
-            
-            # ترتيب حسب العدد
-            top_callers = sorted(
-                callers.values(),
-                key=lambda x: x["count"],
-                reverse=True
-            )
-            
-            return top_callers[:10]
+            period = await self.get_period_rollup(user_id, date_from)
+            return period.top_callers(10)
             
         except Exception as e:
             logger.error(f"❌ Error getting top callers: {e}")
@@ -299,12 +703,9 @@ class DatabaseService:
             message_data["created_at"] = datetime.now().isoformat()
             
             if self.use_local:
-                message_id = f"msg_{len(self.local_storage['messages']) + 1}"
-                message_data["id"] = message_id
-                self.local_storage["messages"].append(message_data)
-                return message_id
+                return await self.store.insert_message(message_data)
             else:
-                response = self.client.table("messages").insert(message_data).execute()
+                response = await self._execute("save_message", self.client.table("messages").insert(message_data))
                 return response.data[0]["id"]
                 
         except Exception as e:
@@ -320,23 +721,32 @@ class DatabaseService:
         """الحصول على سجل المحادثة مع شخص معين"""
         
         try:
+            snapshot = self._unwritten("messages")
+            
             if self.use_local:
-                messages = [
-                    msg for msg in self.local_storage["messages"]
-                    if msg.get("user_id") == user_id and 
-                       (msg.get("sender_phone") == contact_phone or 
-                        msg.get("recipient_phone") == contact_phone)
-                ]
-                return messages[-limit:]
+                messages = await self.store.conversation(user_id, contact_phone, limit)
             else:
-                response = self.client.table("messages")\
+                query = self.client.table("messages")\
                     .select("*")\
                     .eq("user_id", user_id)\
                     .or_(f"sender_phone.eq.{contact_phone},recipient_phone.eq.{contact_phone}")\
                     .order("created_at", desc=False)\
-                    .limit(limit)\
-                    .execute()
-                return response.data
+                    .limit(limit)
+                response = await self._execute("get_conversation_history", query)
+                messages = response.data
+            
+            inserts, _ = self._merge_unwritten("messages", snapshot)
+            pending = [
+                message for message in inserts.values()
+                if message.get("user_id") == user_id
+                and contact_phone in (message.get("sender_phone"), message.get("recipient_phone"))
+            ]
+            if not pending:
+                return messages
+            
+            # الرسائل التي لم تُكتب بعد هي الأحدث - آخر limit بالترتيب الزمني
+            merged = {message["id"]: message for message in messages + pending}
+            return sorted(merged.values(), key=lambda message: message["created_at"])[-limit:]
                 
         except Exception as e:
             logger.error(f"❌ Error getting conversation history: {e}")
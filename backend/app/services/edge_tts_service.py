@@ -7,18 +7,29 @@ import os
 import base64
 import asyncio
 import logging
-from typing import Optional, Dict, Any
-from pathlib import Path
-import uuid
+from typing import AsyncIterator, Optional, Dict, Any
 
 import edge_tts
 from app.models.schemas import EmotionType
+from app.services.ai_service import FALLBACK_RESPONSE_TEXT
+from app.services.speech_engines import EngineCapabilities, TTSEngine
+from app.services.thinking_sounds import get_thinking_sound_cache
+from app.services.tts_cache import TTSCache, get_tts_cache
+from app.utils.metrics import track_upstream
 
 logger = logging.getLogger(__name__)
 
-class EdgeTTSService:
+TEST_VOICE_TEXT = "أهلاً! أنا مساعدك الذكي. إزيك النهاردة؟"
+
+# نصوص المسارات المتدهورة (فشل OpenRouter، اختبار الصوت، مكالمة بدون صوت)
+DEFAULT_PREWARM_TEXTS = [FALLBACK_RESPONSE_TEXT, TEST_VOICE_TEXT, "مرحباً"]
+
+class EdgeTTSService(TTSEngine):
     """خدمة تحويل النص إلى صوت باستخدام Edge TTS (مجاني!)"""
     
+    name = "edge"
+    capabilities = EngineCapabilities(streaming_output=True, thinking_sounds=True, audio_format="mp3")
+    
     def __init__(self):
         # الصوت المصري الافتراضي
         self.default_voice = os.getenv("TTS_VOICE", "ar-EG-SalmaNeural")
@@ -26,15 +37,23 @@ class EdgeTTSService:
         self.volume = os.getenv("TTS_VOLUME", "+0%")
         self.pitch = os.getenv("TTS_PITCH", "+0Hz")
         
-        self.temp_audio_dir = Path(os.getenv("TEMP_AUDIO_DIR", "/tmp/temp_audio"))
-        self.temp_audio_dir.mkdir(parents=True, exist_ok=True)
-        
         # الأصوات المصرية المتاحة
         self.egyptian_voices = {
             "female": "ar-EG-SalmaNeural",  # سلمى - أنثى
             "male": "ar-EG-ShakirNeural"     # شاكر - ذكر
         }
         
+        # نفس (النص، الصوت، السرعة، الطبقة) لا يُولف مرتين
+        self.cache = get_tts_cache()
+        
+        # نصوص تُولف في الكاش عند التشغيل ("|" بينها)
+        prewarm = os.getenv("TTS_PREWARM_TEXTS")
+        self.prewarm_texts = (
+            [t.strip() for t in prewarm.split("|") if t.strip()] if prewarm is not None
+            else list(DEFAULT_PREWARM_TEXTS)
+        )
+        self.prewarm_concurrency = int(os.getenv("TTS_PREWARM_CONCURRENCY", "4"))
+        
         logger.info(f"✅ Edge TTS Service initialized (Voice: {self.default_voice})")
     
     async def text_to_speech(
@@ -44,7 +63,8 @@ class EdgeTTSService:
         emotion: EmotionType = EmotionType.NEUTRAL,
         speed: float = 1.0,
         voice_gender: str = "female",
-        add_thinking_sounds: bool = False
+        add_thinking_sounds: bool = False,
+        as_base64: bool = True
     ) -> Dict[str, Any]:
         """
         تحويل النص إلى صوت باستخدام Edge TTS
@@ -55,36 +75,47 @@ class EdgeTTSService:
             emotion: المشاعر المطلوبة
             speed: سرعة الكلام (0.5 - 2.0)
             voice_gender: الجنس ("female" أو "male")
-            add_thinking_sounds: إضافة أصوات التفكير
+            add_thinking_sounds: لصق مقطع تفكير جاهز قبل الرد
+            as_base64: False لإرجاع audio_bytes الخام (للنقل الثنائي)
         
         Returns:
-            Dict يحتوي على الصوت بصيغة base64
+            Dict يحتوي على الصوت بصيغة base64 أو bytes
+            (ومقطع التفكير الملصوق إن وجد في thinking_sound_*)
         """
         
         try:
             # اختيار الصوت المناسب
             voice = self.egyptian_voices.get(voice_gender, self.default_voice)
             
-            # إضافة أصوات التفكير إن طُلب
-            if add_thinking_sounds:
-                text = self._add_thinking_sounds(text)
-            
             # تطبيق تأثير المشاعر
             text, rate_adj, pitch_adj = self._apply_emotion(text, emotion, speed)
             
             # توليد الصوت
-            audio_path = await self._generate_speech(text, voice, rate_adj, pitch_adj)
+            audio_bytes = await self._render_audio(text, voice, rate_adj, pitch_adj)
             
-            # قراءة الملف وتحويله لـ base64
-            audio_bytes = audio_path.read_bytes()
-            audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
+            # مقطع التفكير من الذاكرة - يُلصق على مستوى frames الـ MP3 بدون توليف جديد
+            thinking_sound = None
+            if add_thinking_sounds:
+                thinking_sound = self.get_thinking_sound(emotion, voice_gender)
+                if thinking_sound:
+                    audio_bytes = thinking_sound + audio_bytes
             
-            # حذف الملف المؤقت
-            await self._cleanup_temp_file(audio_path)
+            if as_base64:
+                audio_payload = {
+                    "audio_base64": base64.b64encode(audio_bytes).decode('utf-8'),
+                    "thinking_sound_base64": (
+                        base64.b64encode(thinking_sound).decode('utf-8') if thinking_sound else None
+                    )
+                }
+            else:
+                audio_payload = {
+                    "audio_bytes": audio_bytes,
+                    "thinking_sound_bytes": thinking_sound
+                }
             
             return {
                 "success": True,
-                "audio_base64": audio_base64,
+                **audio_payload,
                 "duration_seconds": self._estimate_duration(text, speed),
                 "format": "mp3",
                 "voice": voice
@@ -98,22 +129,126 @@ class EdgeTTSService:
                 "audio_base64": None
             }
     
-    async def _generate_speech(
+    async def stream_speech(
+        self,
+        text: str,
+        user_id: Optional[str] = None,
+        emotion: EmotionType = EmotionType.NEUTRAL,
+        speed: float = 1.0,
+        voice_gender: str = "female"
+    ) -> AsyncIterator[bytes]:
+        """
+        تحويل النص إلى صوت بشكل متدفق
+        
+        Args:
+            text: النص المراد تحويله
+            user_id: معرف المستخدم (اختياري)
+            emotion: المشاعر المطلوبة
+            speed: سرعة الكلام (0.5 - 2.0)
+            voice_gender: الجنس ("female" أو "male")
+        
+        Yields:
+            bytes: أجزاء MP3 فور وصولها من Edge TTS - بدون ملفات مؤقتة
+                   (أو الصوت كاملاً مرة واحدة لو موجود في الكاش)
+        """
+        
+        voice = self.egyptian_voices.get(voice_gender, self.default_voice)
+        text, rate_adj, pitch_adj = self._apply_emotion(text, emotion, speed)
+        key = TTSCache.key(text, voice, rate_adj, pitch_adj, self.volume)
+        
+        cached = await self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        # نمرر الـ chunks للعميل فوراً ونحفظ الصوت كاملاً بعد آخر chunk فقط
+        chunks = []
+        async for chunk in self._stream_audio(text, voice, rate_adj, pitch_adj):
+            chunks.append(chunk)
+            yield chunk
+        await self.cache.put(key, b"".join(chunks))
+    
+    def get_thinking_sound(
+        self,
+        emotion: EmotionType = EmotionType.NEUTRAL,
+        voice_gender: str = "female"
+    ) -> Optional[bytes]:
+        """مقطع تفكير جاهز (MP3) للصوت والمشاعر - None لو لم تُبنى المقاطع بعد"""
+        
+        voice = self.egyptian_voices.get(voice_gender, self.default_voice)
+        return get_thinking_sound_cache().pick(voice, emotion)
+    
+    async def build_thinking_sounds(self) -> int:
+        """توليد مقاطع التفكير لكل الأصوات المصرية وكل المشاعر (عند التشغيل)"""
+        
+        def prosody(emotion: EmotionType) -> tuple[str, str]:
+            _, rate, pitch = self._apply_emotion("", emotion, 1.0)
+            return rate, pitch
+        
+        return await get_thinking_sound_cache().build(
+            list(self.egyptian_voices.values()),
+            prosody,
+            self._render_audio
+        )
+    
+    async def prewarm_cache(self) -> int:
+        """
+        توليف نصوص الـ prewarm لكل الأصوات المصرية في الكاش (عند التشغيل)
+        
+        بنفس السرعة والطبقة التي يستخدمها الرد العادي (NEUTRAL، سرعة 1.0)،
+        فالرد الاحتياطي لا ينتظر Edge TTS حتى لو كانت الخدمة متعثرة
+        
+        Returns:
+            عدد المقاطع الجاهزة
+        """
+        
+        semaphore = asyncio.Semaphore(self.prewarm_concurrency)
+        
+        async def warm(text: str, voice: str) -> bool:
+            text, rate, pitch = self._apply_emotion(text, EmotionType.NEUTRAL, 1.0)
+            async with semaphore:
+                try:
+                    await self._render_audio(text, voice, rate, pitch)
+                    return True
+                except Exception as e:
+                    logger.warning(f"⚠️ TTS prewarm failed ({voice}, {text}): {e}")
+                    return False
+        
+        jobs = [
+            warm(text, voice)
+            for voice in self.egyptian_voices.values()
+            for text in self.prewarm_texts
+        ]
+        warmed = sum(await asyncio.gather(*jobs))
+        logger.info(f"🔥 TTS cache prewarmed: {warmed}/{len(jobs)} clips")
+        return warmed
+    
+    async def _render_audio(self, text: str, voice: str, rate: str, pitch: str) -> bytes:
+        """توليد الصوت كاملاً في الذاكرة (من الكاش لو متاح)"""
+        
+        async def render() -> bytes:
+            chunks = []
+            async for chunk in self._stream_audio(text, voice, rate, pitch):
+                chunks.append(chunk)
+            return b"".join(chunks)
+        
+        return await self.cache.get_or_render(
+            TTSCache.key(text, voice, rate, pitch, self.volume),
+            render
+        )
+    
+    async def _stream_audio(
         self, 
         text: str, 
         voice: str, 
         rate: str, 
         pitch: str
-    ) -> Path:
-        """توليد الصوت باستخدام Edge TTS"""
+    ) -> AsyncIterator[bytes]:
+        """توليد الصوت باستخدام Edge TTS - chunks MP3 كما تصل من الـ websocket"""
         
         try:
             logger.info(f"🔊 Generating speech with voice: {voice}")
             
-            # إنشاء اسم ملف فريد
-            file_id = uuid.uuid4().hex[:8]
-            output_file = self.temp_audio_dir / f"speech_{file_id}.mp3"
-            
             # إنشاء TTS communicate object
             communicate = edge_tts.Communicate(
                 text=text,
@@ -123,35 +258,15 @@ class EdgeTTSService:
                 pitch=pitch
             )
             
-            # حفظ الملف الصوتي
-            await communicate.save(str(output_file))
-            
-            logger.info(f"✅ Speech generated: {output_file}")
-            
-            return output_file
+            with track_upstream("edge_tts"):
+                async for chunk in communicate.stream():
+                    if chunk["type"] == "audio":
+                        yield chunk["data"]
             
         except Exception as e:
             logger.error(f"❌ Error generating speech: {e}")
             raise
     
-    def _add_thinking_sounds(self, text: str) -> str:
-        """إضافة أصوات التفكير الطبيعية"""
-        
-        import random
-        
-        thinking_sounds = [
-            "يعني... ",
-            "خليني أفكر... ",
-            "طب... ",
-            "آه... ",
-        ]
-        
-        # إضافة صوت تفكير عشوائي أحياناً
-        if random.random() < 0.2:  # 20% احتمال
-            text = random.choice(thinking_sounds) + text
-        
-        return text
-    
     def _apply_emotion(
         self, 
         text: str, 
@@ -208,16 +323,6 @@ class EdgeTTSService:
         
         return round(adjusted_duration, 2)
     
-    async def _cleanup_temp_file(self, file_path: Path):
-        """حذف الملف المؤقت"""
-        
-        try:
-            if file_path.exists():
-                file_path.unlink()
-                logger.info(f"🗑️ Deleted temp file: {file_path}")
-        except Exception as e:
-            logger.warning(f"⚠️ Could not delete temp file: {e}")
-    
     async def get_available_voices(self) -> list[Dict[str, str]]:
         """الحصول على قائمة الأصوات المتاحة"""
         
@@ -246,21 +351,17 @@ class EdgeTTSService:
     async def test_voice(self, voice_name: str) -> Dict[str, Any]:
         """اختبار صوت معين"""
         
-        test_text = "أهلاً! أنا مساعدك الذكي. إزيك النهاردة؟"
+        test_text = TEST_VOICE_TEXT
         
         try:
-            audio_path = await self._generate_speech(
+            audio_bytes = await self._render_audio(
                 text=test_text,
                 voice=voice_name,
                 rate=self.rate,
                 pitch=self.pitch
             )
-            
-            audio_bytes = audio_path.read_bytes()
             audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
             
-            await self._cleanup_temp_file(audio_path)
-            
             return {
                 "success": True,
                 "audio_base64": audio_base64,
@@ -0,0 +1,240 @@
+"""
+اتصالات HTTP مشتركة طويلة العمر
+Pooled HTTP/2 keep-alive clients shared per process
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _RequestTrace:
+    """
+    trace callback من httpcore لطلب واحد
+
+    الوقت من بداية الطلب حتى أول حدث اتصال (فتح TCP أو إرسال headers)
+    هو وقت انتظار اتصال فاضي من الـ pool
+    """
+
+    _ACQUIRED_EVENTS = (
+        "connection.connect_tcp.started",
+        "http11.send_request_headers.started",
+        "http2.send_connection_init.started",
+        "http2.send_request_headers.started",
+    )
+
+    def __init__(self, pool: "PooledHTTPClient"):
+        self.pool = pool
+        self.started_at = time.perf_counter()
+        self.acquired = False
+
+    async def __call__(self, event_name: str, info: Dict[str, Any]):
+        if event_name == "connection.connect_tcp.started":
+            self.pool.connections_opened += 1
+
+        if not self.acquired and event_name in self._ACQUIRED_EVENTS:
+            self.acquired = True
+            self.pool._record_wait((time.perf_counter() - self.started_at) * 1000)
+
+
+class PooledHTTPClient:
+    """httpx.AsyncClient واحد لكل process مع connection pooling و HTTP/2 و keep-alive"""
+
+    def __init__(
+        self,
+        name: str,
+        http2: bool = True,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0
+    ):
+        self.name = name
+
+        if http2 and not _http2_available():
+            logger.warning(f"⚠️ [{name}] h2 not installed, falling back to HTTP/1.1")
+            http2 = False
+
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # الإحصائيات
+        self.requests_total = 0
+        self.requests_in_flight = 0
+        self.errors_total = 0
+        self.connections_opened = 0
+        self._wait_samples: deque = deque(maxlen=1000)
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "PooledHTTPClient":
+        """إنشاء من متغيرات البيئة: {prefix}_HTTP2, {prefix}_MAX_CONNECTIONS, ..."""
+
+        return cls(
+            name=name,
+            http2=os.getenv(f"{prefix}_HTTP2", "true").lower() == "true",
+            max_connections=int(os.getenv(f"{prefix}_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv(f"{prefix}_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv(f"{prefix}_KEEPALIVE_EXPIRY_SECONDS", "60")),
+            timeout=float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", "30")),
+            connect_timeout=float(os.getenv(f"{prefix}_CONNECT_TIMEOUT_SECONDS", "5"))
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+            logger.info(
+                f"🔌 [{self.name}] HTTP pool created "
+                f"(http2={self.http2}, max_connections={self.limits.max_connections})"
+            )
+        return self._client
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """POST عبر الـ pool المشترك"""
+
+        self.requests_in_flight += 1
+        try:
+            return await self.client.post(
+                url,
+                extensions={"trace": _RequestTrace(self)},
+                **kwargs
+            )
+        except Exception:
+            self.errors_total += 1
+            raise
+        finally:
+            self.requests_in_flight -= 1
+            self.requests_total += 1
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """طلب متدفق (SSE مثلاً) عبر الـ pool المشترك"""
+
+        self.requests_in_flight += 1
+        try:
+            async with self.client.stream(
+                method,
+                url,
+                extensions={"trace": _RequestTrace(self)},
+                **kwargs
+            ) as response:
+                yield response
+        except Exception:
+            self.errors_total += 1
+            raise
+        finally:
+            self.requests_in_flight -= 1
+            self.requests_total += 1
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info(f"🔌 [{self.name}] HTTP pool closed")
+        self._client = None
+
+    def _record_wait(self, wait_ms: float):
+        self._wait_samples.append(wait_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        """إحصائيات الـ pool: الاتصالات المستخدمة ووقت الانتظار"""
+
+        samples = sorted(self._wait_samples)
+        if samples:
+            wait = {
+                "avg": round(sum(samples) / len(samples), 3),
+                "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+                "max": round(samples[-1], 3)
+            }
+        else:
+            wait = {"avg": 0.0, "p95": 0.0, "max": 0.0}
+
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "requests_total": self.requests_total,
+            "requests_in_flight": self.requests_in_flight,
+            "errors_total": self.errors_total,
+            "connections_opened": self.connections_opened,
+            "connections": self._connection_stats(),
+            "pool_wait_ms": wait
+        }
+
+    def _connection_stats(self) -> Dict[str, int]:
+        stats = {"total": 0, "in_use": 0, "idle": 0, "http2": 0}
+
+        if self._client is None:
+            return stats
+
+        # httpx لا يعرض الـ pool بشكل عام - نقرأ من httpcore بحذر
+        try:
+            connections = self._client._transport._pool.connections
+        except AttributeError:
+            return stats
+
+        for connection in connections:
+            stats["total"] += 1
+            if connection.is_idle():
+                stats["idle"] += 1
+            else:
+                stats["in_use"] += 1
+            if "HTTP/2" in connection.info():
+                stats["http2"] += 1
+
+        return stats
+
+
+# =====================================
+# الـ pools المشتركة على مستوى الـ process
+# =====================================
+
+_pools: Dict[str, PooledHTTPClient] = {}
+
+
+def get_openrouter_pool() -> PooledHTTPClient:
+    """الـ pool المشترك لكل طلبات OpenRouter"""
+
+    pool = _pools.get("openrouter")
+    if pool is None:
+        pool = PooledHTTPClient.from_env("openrouter", "OPENROUTER")
+        _pools["openrouter"] = pool
+    return pool
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    return {name: pool.stats() for name, pool in _pools.items()}
+
+
+async def close_http_pools():
+    """إغلاق كل الاتصالات - يُستدعى من lifespan عند الإيقاف"""
+
+    for pool in list(_pools.values()):
+        await pool.close()
+    _pools.clear()
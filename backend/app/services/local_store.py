@@ -0,0 +1,177 @@
+"""
+التخزين المحلي المفهرس
+Indexed in-memory storage used when Supabase is not configured
+"""
+
+import bisect
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.call_views import project
+
+# (created_at, id) - الترتيب الزمني، والـ id يفصل بين السجلات بنفس الوقت
+IndexEntry = Tuple[str, str]
+
+
+class LocalStore:
+    """
+    نفس عمليات Supabase على dicts في الذاكرة
+
+    - calls / messages: dict بالـ id (O(1) لـ get_call و update_call)
+    - calls_by_user: قائمة (created_at, id) مرتبة لكل مستخدم (bisect لـ date_from)
+    - messages_by_contact: قائمة مرتبة لكل (مستخدم، رقم) مرسل أو مستقبل
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.calls: Dict[str, Dict[str, Any]] = {}
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.settings: Dict[str, Dict[str, Any]] = {}
+
+        self.calls_by_user: Dict[str, List[IndexEntry]] = {}
+        self.messages_by_contact: Dict[Tuple[str, str], List[IndexEntry]] = {}
+
+    async def initialize(self):
+        """لا شيء - للتوافق مع SQLiteStore"""
+
+    async def close(self):
+        """لا شيء - البيانات في الذاكرة فقط"""
+
+    # =====================================
+    # Calls
+    # =====================================
+
+    async def insert_call(self, call_data: Dict[str, Any]) -> str:
+        call_data.setdefault("id", f"call_{len(self.calls) + 1}")
+        self._put_call(call_data)
+        return call_data["id"]
+
+    async def insert_calls(self, rows: List[Dict[str, Any]]):
+        """دفعة من الكتابة المؤجلة - الـ id محدد مسبقاً، وإعادة نفس السجل تستبدله"""
+        for call_data in rows:
+            self._put_call(call_data)
+
+    def _put_call(self, call_data: Dict[str, Any]):
+        self._reindex_call(self.calls.get(call_data["id"]), call_data)
+        self.calls[call_data["id"]] = call_data
+
+    def _reindex_call(self, previous: Optional[Dict[str, Any]], call: Dict[str, Any]):
+        """الاستبدال قد يغير user_id أو created_at - المدخل القديم يُحذف قبل إضافة الجديد"""
+
+        entry = (call["created_at"], call["id"])
+        if previous is not None:
+            old_entry = (previous["created_at"], previous["id"])
+            if previous.get("user_id") == call.get("user_id") and old_entry == entry:
+                return
+            _discard(self.calls_by_user.get(previous.get("user_id")), old_entry)
+        _insort(self.calls_by_user.setdefault(call.get("user_id"), []), entry)
+
+    async def get_call(self, call_id: str) -> Optional[Dict[str, Any]]:
+        return self.calls.get(call_id)
+
+    async def update_call(self, call_id: str, updates: Dict[str, Any]) -> bool:
+        call = self.calls.get(call_id)
+        if call is None:
+            return False
+        if "user_id" in updates or "created_at" in updates:
+            self._reindex_call(dict(call), {**call, **updates})
+        call.update(updates)
+        return True
+
+    async def update_calls(self, updates: Dict[str, Dict[str, Any]]):
+        for call_id, fields in updates.items():
+            await self.update_call(call_id, fields)
+
+    async def user_calls(
+        self,
+        user_id: str,
+        limit: int,
+        date_from: Optional[str] = None,
+        fields: Optional[Dict[str, str]] = None,
+        before: Optional[IndexEntry] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        الأحدث أولاً (مثل Supabase) - O(log n + limit)
+
+        before: (created_at, id) لآخر سجل في الصفحة السابقة - الصفحة التالية تبدأ بعده
+        """
+
+        index = self.calls_by_user.get(user_id)
+        if not index:
+            return []
+
+        start = bisect.bisect_left(index, (date_from, "")) if date_from else 0
+        end = bisect.bisect_left(index, before) if before else len(index)
+        stop = max(start, end - limit)
+        return [project(self.calls[call_id], fields) for _, call_id in reversed(index[stop:end])]
+
+    # =====================================
+    # Messages
+    # =====================================
+
+    async def insert_message(self, message_data: Dict[str, Any]) -> str:
+        message_data["id"] = f"msg_{len(self.messages) + 1}"
+        self._put_message(message_data)
+        return message_data["id"]
+
+    async def insert_messages(self, rows: List[Dict[str, Any]]):
+        for message_data in rows:
+            self._put_message(message_data)
+
+    def _put_message(self, message_data: Dict[str, Any]):
+        message_id = message_data["id"]
+        previous = self.messages.get(message_id)
+        if previous is not None:
+            # الاستبدال: المدخلات القديمة تُحذف (الأرقام أو الوقت قد تتغير)
+            for key in _contact_keys(previous):
+                _discard(self.messages_by_contact.get(key), (previous["created_at"], message_id))
+        entry = (message_data["created_at"], message_id)
+        for key in _contact_keys(message_data):
+            _insort(self.messages_by_contact.setdefault(key, []), entry)
+        self.messages[message_id] = message_data
+
+    async def conversation(self, user_id: str, contact_phone: str, limit: int) -> List[Dict[str, Any]]:
+        """آخر limit رسائل بالترتيب الزمني"""
+
+        index = self.messages_by_contact.get((user_id, contact_phone), [])
+        return [self.messages[message_id] for _, message_id in index[-limit:]] if limit > 0 else []
+
+    # =====================================
+    # Settings
+    # =====================================
+
+    async def get_settings(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self.settings.get(user_id)
+
+    async def save_settings(self, user_id: str, settings: Dict[str, Any]):
+        self.settings[user_id] = settings
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": len(self.calls),
+            "messages": len(self.messages),
+            "users": len(self.calls_by_user)
+        }
+
+
+def _insort(index: List[IndexEntry], entry: IndexEntry):
+    # الإضافة بالترتيب هي الحالة العادية (created_at = الآن) - بدون bisect
+    if not index or index[-1] <= entry:
+        index.append(entry)
+    else:
+        bisect.insort(index, entry)
+
+
+def _discard(index: Optional[List[IndexEntry]], entry: IndexEntry):
+    if not index:
+        return
+    position = bisect.bisect_left(index, entry)
+    if position < len(index) and index[position] == entry:
+        del index[position]
+
+
+def _contact_keys(message_data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    # نفس الرقم مرسل ومستقبل يُفهرس مرة واحدة
+    user_id = message_data.get("user_id")
+    phones = {message_data.get("sender_phone"), message_data.get("recipient_phone")}
+    return [(user_id, phone) for phone in phones if phone is not None]
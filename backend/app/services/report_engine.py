@@ -0,0 +1,376 @@
+"""
+محرك التقارير
+Single-pass report engine: every daily report plus weekly stats, trends and recommendations
+"""
+
+import os
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.analytics import (
+    DURATION, EMOTION, HOUR, PRIORITY, STATUS, WEEKDAY,
+    CallHistogram, Codes, call_codes, lifted
+)
+
+logger = logging.getLogger(__name__)
+
+# المشاعر التي تعني أن المتصل يحتاج اهتماماً
+NEGATIVE_EMOTIONS = ("angry", "sad", "worried")
+
+URGENT = PRIORITY.offset + PRIORITY.code("urgent")
+
+
+def _day(call: Dict[str, Any], day_index: Dict[str, int], day_list: List["_Day"]) -> int:
+    """رقم يوم المكالمة في day_list (يُضاف لو جديد)"""
+
+    date = str(call.get("created_at") or "")[:10]
+    index = day_index.get(date)
+    if index is None:
+        index = day_index[date] = len(day_list)
+        day_list.append(_Day(date))
+    return index
+
+
+def _collect_lists(call: Dict[str, Any], codes: Codes, day: "_Day"):
+    """ما ليس أرقاماً (العاجلة والمتابعات) - نفس المرور في المسارين"""
+
+    if codes[4] == URGENT:
+        day.urgent_count += 1
+        if len(day.urgent) < 5:
+            day.urgent.append(call)
+    for suggestion in call.get("follow_up_suggestions") or ():
+        day.follow_ups[suggestion] = None
+
+
+def _share(part: float, whole: float) -> float:
+    return round(part * 100 / whole, 1) if whole else 0.0
+
+
+class _Day:
+    """يوم واحد: العدادات (CallHistogram) + العاجلة والمتابعات"""
+
+    __slots__ = ("date", "stats", "urgent", "urgent_count", "follow_ups")
+
+    def __init__(self, date: str):
+        self.date = date
+        self.stats = CallHistogram()
+        self.urgent: List[Dict[str, Any]] = []
+        self.urgent_count = 0
+        # dict بدل set: بدون تكرار وبترتيب الظهور
+        self.follow_ups: Dict[str, None] = {}
+
+    @property
+    def calls(self) -> int:
+        return self.stats.calls
+
+    @property
+    def missed(self) -> int:
+        return self.stats.count(STATUS, "missed")
+
+
+class ReportEngine:
+    """
+    يحسب التقارير اليومية والأسبوعية في مرور واحد على المكالمات
+
+    - أقل من numpy_min_calls: العدادات تُحدث مباشرة أثناء المرور
+    - أكثر: المرور يستخرج أعمدة أرقام فقط، والتجميع بـ numpy.bincount
+      لكل الأيام مرة واحدة
+    """
+
+    def __init__(self, numpy_min_calls: Optional[int] = None):
+        self.numpy_min_calls = numpy_min_calls or int(os.getenv("REPORT_NUMPY_MIN_CALLS", "2000"))
+
+    def build(
+        self,
+        user_id: str,
+        calls: List[Dict[str, Any]],
+        days: Iterable[str] = ()
+    ) -> Dict[str, Any]:
+        """
+        التقارير اليومية + إحصائيات الفترة
+
+        days: كل أيام الفترة (YYYY-MM-DD) - الأيام بدون مكالمات تدخل في الاتجاهات كصفر
+        """
+
+        day_list, callers = self._collect(calls, days)
+
+        active = [day for day in day_list if day.calls]
+        weekly_stats = self._weekly_stats(day_list, callers)
+
+        return {
+            "daily_reports": [self._daily_report(user_id, day) for day in active],
+            "weekly_stats": weekly_stats,
+            "trends": self._trends(day_list, weekly_stats),
+            "recommendations": self._recommendations(weekly_stats, callers)
+        }
+
+    def daily(self, user_id: str, calls: List[Dict[str, Any]], date: str) -> Dict[str, Any]:
+        """تقرير يوم واحد - المكالمات من أيام أخرى لا تدخل فيه"""
+
+        day_list, _ = self._collect(calls, [date])
+        return self._daily_report(user_id, next(day for day in day_list if day.date == date))
+
+    def _collect(
+        self,
+        calls: List[Dict[str, Any]],
+        days: Iterable[str]
+    ) -> Tuple[List[_Day], Dict[str, List[Any]]]:
+        """المرور الوحيد على المكالمات - الأيام بالترتيب الزمني + المتصلون"""
+
+        day_index: Dict[str, int] = {}
+        day_list: List[_Day] = []
+        for date in days:
+            if date not in day_index:
+                day_index[date] = len(day_list)
+                day_list.append(_Day(date))
+
+        if len(calls) >= self.numpy_min_calls:
+            callers = self._collect_columns(calls, day_index, day_list)
+        else:
+            callers = self._collect_counters(calls, day_index, day_list)
+
+        return sorted(day_list, key=lambda day: day.date), callers
+
+    @staticmethod
+    def _collect_counters(
+        calls: List[Dict[str, Any]],
+        day_index: Dict[str, int],
+        day_list: List[_Day]
+    ) -> Dict[str, List[Any]]:
+        """الحجم الصغير: العدادات تُحدث مباشرة أثناء المرور"""
+
+        callers: Dict[str, List[Any]] = {}
+
+        for call in calls:
+            day = day_list[_day(call, day_index, day_list)]
+            codes = call_codes(call)
+            duration = int(call.get("duration_seconds") or 0)
+
+            day.stats.add(codes, duration, lifted(call, "caller_sentiment_score"))
+            _collect_lists(call, codes, day)
+
+            phone = call.get("caller_phone") or "unknown"
+            caller = callers.get(phone)
+            if caller is None:
+                caller = callers[phone] = [call.get("caller_name") or "غير معروف", 0, 0]
+            caller[1] += 1
+            caller[2] += duration
+
+        return callers
+
+    @staticmethod
+    def _collect_columns(
+        calls: List[Dict[str, Any]],
+        day_index: Dict[str, int],
+        day_list: List[_Day]
+    ) -> Dict[str, List[Any]]:
+        """
+        الحجم الكبير: المرور يستخرج أعمدة أرقام فقط، وعدادات كل الأيام
+        بـ numpy.bincount (CallHistogram.grouped)
+        """
+
+        phones: Dict[str, int] = {}
+        names: List[str] = []
+        day_col: List[int] = []
+        codes_col: List[Codes] = []
+        phone_col: List[int] = []
+        duration_col: List[int] = []
+        sentiment_col: List[Optional[float]] = []
+
+        for call in calls:
+            index = _day(call, day_index, day_list)
+            codes = call_codes(call)
+            day_col.append(index)
+            codes_col.append(codes)
+            duration_col.append(call.get("duration_seconds") or 0)
+            sentiment_col.append(lifted(call, "caller_sentiment_score"))
+            _collect_lists(call, codes, day_list[index])
+
+            # setdefault: الكود الموجود أو كود جديد = العدد الحالي
+            code = phones.setdefault(call.get("caller_phone") or "unknown", len(phones))
+            if code == len(names):
+                names.append(call.get("caller_name") or "غير معروف")
+            phone_col.append(code)
+
+        histograms = CallHistogram.grouped(day_col, codes_col, duration_col, sentiment_col, len(day_list))
+        for day, histogram in zip(day_list, histograms):
+            day.stats = histogram
+
+        phone = np.asarray(phone_col, dtype=np.int64)
+        caller_counts = np.bincount(phone, minlength=len(names))
+        caller_durations = np.bincount(phone, weights=np.asarray(duration_col, dtype=np.float64), minlength=len(names))
+        return {
+            phone_number: [names[code], int(caller_counts[code]), int(caller_durations[code])]
+            for phone_number, code in phones.items()
+        }
+
+    # =====================================
+    # التقارير
+    # =====================================
+
+    @staticmethod
+    def _daily_report(user_id: str, day: _Day) -> Dict[str, Any]:
+        stats = day.stats
+        average_sentiment = stats.avg_sentiment
+        return {
+            "user_id": user_id,
+            "date": day.date,
+            "stats": {
+                "total_calls": stats.calls,
+                "answered_calls": stats.count(STATUS, "completed"),
+                "missed_calls": day.missed,
+                "rejected_calls": stats.count(STATUS, "rejected"),
+                "total_duration_minutes": stats.duration_seconds // 60,
+                "average_duration": stats.duration_seconds / stats.calls if stats.calls else 0,
+                "avg_sentiment_score": round(average_sentiment, 3) if average_sentiment is not None else None
+            },
+            "emotion_breakdown": stats.breakdown(EMOTION),
+            "priority_breakdown": stats.breakdown(PRIORITY),
+            "duration_buckets": stats.breakdown(DURATION),
+            "calls_by_hour": stats.histogram(HOUR),
+            "urgent_calls": day.urgent,
+            "follow_ups_needed": list(day.follow_ups),
+            "insights": _insights(stats)
+        }
+
+    @staticmethod
+    def _weekly_stats(day_list: List[_Day], callers: Dict[str, List[Any]]) -> Dict[str, Any]:
+        total = CallHistogram()
+        follow_ups: Dict[str, None] = {}
+        for day in day_list:
+            total.merge(day.stats)
+            follow_ups.update(day.follow_ups)
+
+        calls = total.calls
+        answered = total.count(STATUS, "completed")
+        missed = total.count(STATUS, "missed")
+        emotions = total.breakdown(EMOTION)
+        average_sentiment = total.avg_sentiment
+
+        busiest = max(day_list, key=lambda day: day.calls, default=None)
+        peak_weekday = total.peak(WEEKDAY)
+        ranked = sorted(callers.items(), key=lambda item: item[1][1], reverse=True)[:5]
+
+        return {
+            "total_calls": calls,
+            "answered_calls": answered,
+            "missed_calls": missed,
+            "rejected_calls": total.count(STATUS, "rejected"),
+            "answer_rate": _share(answered, calls),
+            "missed_rate": _share(missed, calls),
+            "total_duration_minutes": total.duration_seconds // 60,
+            "average_duration": total.duration_seconds / calls if calls else 0,
+            "avg_sentiment_score": round(average_sentiment, 3) if average_sentiment is not None else None,
+            "emotion_breakdown": emotions,
+            "negative_share": _share(sum(emotions.get(emotion, 0) for emotion in NEGATIVE_EMOTIONS), calls),
+            "priority_breakdown": total.breakdown(PRIORITY),
+            "duration_buckets": total.breakdown(DURATION),
+            "calls_by_day": {day.date: day.calls for day in day_list},
+            "calls_by_hour": total.histogram(HOUR),
+            "calls_by_weekday": total.breakdown(WEEKDAY),
+            "peak_hour": total.peak(HOUR),
+            "peak_weekday": WEEKDAY.labels[peak_weekday] if peak_weekday is not None else None,
+            "busiest_day": busiest.date if busiest is not None and busiest.calls else None,
+            "urgent_calls": sum(day.urgent_count for day in day_list),
+            "follow_ups_needed": len(follow_ups),
+            "top_callers": [
+                {"phone": phone, "name": name, "count": count, "total_duration": total_duration}
+                for phone, (name, count, total_duration) in ranked
+            ]
+        }
+
+    @staticmethod
+    def _trends(day_list: List[_Day], stats: Dict[str, Any]) -> List[str]:
+        """مقارنة النصف الأول من الفترة بالنصف الثاني"""
+
+        if not stats["total_calls"]:
+            return ["لا توجد مكالمات هذا الأسبوع"]
+
+        trends = []
+        half = len(day_list) // 2
+        first, second = day_list[:half], day_list[half:]
+
+        if first:
+            calls_before = sum(day.calls for day in first)
+            calls_after = sum(day.calls for day in second)
+            before = calls_before / len(first)
+            after = calls_after / len(second)
+            if before and (after - before) / before >= 0.2:
+                trends.append(f"📈 المكالمات زادت {_share(after - before, before):.0f}% في النصف الثاني من الأسبوع")
+            elif before and (before - after) / before >= 0.2:
+                trends.append(f"📉 المكالمات قلت {_share(before - after, before):.0f}% في النصف الثاني من الأسبوع")
+            elif not before and after:
+                trends.append("📈 كل مكالمات الأسبوع كانت في النصف الثاني")
+
+            # النسب تُقارن فقط لو في النصفين مكالمات - نصف فارغ ليس 0%
+            if calls_before and calls_after:
+                missed_before = _share(sum(day.missed for day in first), calls_before)
+                missed_after = _share(sum(day.missed for day in second), calls_after)
+                if missed_after - missed_before >= 10:
+                    trends.append(f"⚠️ نسبة المكالمات الفائتة ارتفعت من {missed_before:.0f}% إلى {missed_after:.0f}%")
+                elif missed_before - missed_after >= 10:
+                    trends.append(f"✅ نسبة المكالمات الفائتة انخفضت من {missed_before:.0f}% إلى {missed_after:.0f}%")
+
+                sentiment_before = _average_sentiment(first)
+                sentiment_after = _average_sentiment(second)
+                if sentiment_before is not None and sentiment_after is not None:
+                    if sentiment_after - sentiment_before >= 0.2:
+                        trends.append("😊 مشاعر المتصلين تتحسن خلال الأسبوع")
+                    elif sentiment_before - sentiment_after >= 0.2:
+                        trends.append("😟 مشاعر المتصلين تتراجع خلال الأسبوع")
+
+        busiest = stats["busiest_day"]
+        trends.append(f"📅 أكثر يوم مكالمات: {busiest} ({stats['calls_by_day'][busiest]} مكالمة)")
+        trends.append(f"📞 أكثر وقت للمكالمات: الساعة {stats['peak_hour']}:00")
+        return trends
+
+    @staticmethod
+    def _recommendations(stats: Dict[str, Any], callers: Dict[str, List[Any]]) -> List[str]:
+        if not stats["total_calls"]:
+            return []
+
+        recommendations = []
+        if stats["missed_rate"] > 30:
+            recommendations.append(
+                f"📵 {stats['missed_rate']:.0f}% من المكالمات فائتة - "
+                f"فعّل الرد التلقائي في وقت الذروة (الساعة {stats['peak_hour']}:00)"
+            )
+        if stats["urgent_calls"]:
+            recommendations.append(f"🚨 راجع {stats['urgent_calls']} مكالمة عاجلة")
+        if stats["follow_ups_needed"]:
+            recommendations.append(f"📝 لديك {stats['follow_ups_needed']} متابعة مطلوبة")
+        if stats["negative_share"] > 30:
+            recommendations.append("💬 نسبة كبيرة من المتصلين غاضبون أو قلقون - راجع ردود المساعد وأسلوبه")
+        for caller in stats["top_callers"]:
+            if caller["count"] >= 5:
+                recommendations.append(
+                    f"⭐ {caller['name']} اتصل {caller['count']} مرات - أضفه لجهات الاتصال المهمة"
+                )
+                break
+
+        return recommendations
+
+
+def _average_sentiment(day_list: List[_Day]) -> Optional[float]:
+    count = sum(day.stats.sentiment_count for day in day_list)
+    return sum(day.stats.sentiment_sum for day in day_list) / count if count else None
+
+
+def _insights(stats: CallHistogram) -> List[str]:
+    """رؤى اليوم - من العدادات بدون المرور على المكالمات مرة أخرى"""
+
+    if not stats.calls:
+        return ["لا توجد مكالمات اليوم"]
+
+    insights = []
+    if stats.calls > 10:
+        insights.append(f"🔥 يوم مزدحم! تلقيت {stats.calls} مكالمة")
+
+    insights.append(f"📞 أكثر وقت للمكالمات: الساعة {stats.peak(HOUR)}:00")
+
+    if stats.positive > stats.calls * 0.7:
+        insights.append("😊 معظم المكالمات كانت إيجابية")
+
+    return insights
@@ -0,0 +1,378 @@
+"""
+الإحصائيات اليومية المجمعة
+Per-(user, day) call rollups maintained incrementally on every call write
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.analytics import CODED_FIELDS, CallHistogram, Codes, call_codes, recode
+
+logger = logging.getLogger(__name__)
+
+# الحقول التي تؤثر في الإحصائيات - تحديث لا يمسها لا يغير شيئاً
+ROLLUP_FIELDS = CODED_FIELDS + ("caller_phone", "caller_name")
+
+# (day, codes, duration, phone, name) - مساهمة مكالمة واحدة
+Contribution = Tuple[str, Codes, int, str, str]
+
+# التحديث التدريجي يقرأ من قبل بداية القراءة السابقة بهذا الهامش: الكتابة المؤجلة
+# وفروق الساعة بين الـ workers (إعادة تطبيق نفس المكالمة لا تكررها)
+SYNC_OVERLAP_SECONDS = 60
+
+# load(date_from) كل المكالمات من date_from / load_changed(since) المضافة أو المحدثة منذ since
+Loader = Callable[[Optional[str]], Awaitable[Iterable[Dict[str, Any]]]]
+
+
+def _contribution(call: Dict[str, Any]) -> Contribution:
+    return (
+        str(call.get("created_at") or "")[:10],
+        call_codes(call),
+        int(call.get("duration_seconds") or 0),
+        call.get("caller_phone") or "unknown",
+        call.get("caller_name") or "غير معروف"
+    )
+
+
+class DailyRollup(CallHistogram):
+    """إحصائيات يوم واحد لمستخدم واحد - عدادات CallHistogram + المتصلون"""
+
+    __slots__ = ("callers",)
+
+    def __init__(self):
+        super().__init__()
+        # phone -> [name, count, total_duration]
+        self.callers: Dict[str, List[Any]] = {}
+
+    def apply(self, contribution: Contribution, sign: int):
+        _, codes, duration, phone, name = contribution
+
+        self.add(codes, duration, sign=sign)
+
+        caller = self.callers.get(phone)
+        if caller is None:
+            caller = self.callers[phone] = [name, 0, 0]
+        caller[1] += sign
+        caller[2] += sign * duration
+        if sign > 0:
+            caller[0] = name
+        elif caller[1] <= 0:
+            del self.callers[phone]
+
+    def merge(self, other: "DailyRollup"):
+        super().merge(other)
+        for phone, (name, count, duration) in other.callers.items():
+            caller = self.callers.setdefault(phone, [name, 0, 0])
+            caller[1] += count
+            caller[2] += duration
+
+    def include(self, call: Dict[str, Any]):
+        """إضافة مكالمة مباشرة (بدون تتبع بالـ id) - للفترات خارج نافذة الاحتفاظ"""
+        self.apply(_contribution(call), 1)
+
+    def top_callers(self, limit: int = 10) -> List[Dict[str, Any]]:
+        ranked = sorted(self.callers.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [
+            {"phone": phone, "name": name, "count": count, "total_duration": duration}
+            for phone, (name, count, duration) in ranked
+        ]
+
+
+class _UserRollups:
+    def __init__(self):
+        self.days: Dict[str, DailyRollup] = {}
+        # call_id -> المساهمة الحالية: التحديث يطرح القديمة ويضيف الجديدة بدون قراءة المكالمة
+        self.contributions: Dict[str, Contribution] = {}
+        self.loaded_at = 0.0
+        # wall clock لبداية آخر قراءة - التحديث التالي يقرأ ما تغير بعده فقط
+        self.synced_at = ""
+        # الأيام قبل cutoff خارج نافذة الاحتفاظ
+        self.cutoff = ""
+        self.lock = asyncio.Lock()
+        # أثناء البناء: الكتابات الجديدة تُطبق هنا أيضاً حتى لا تضيع
+        self.building: Optional["_UserRollups"] = None
+        # تحديثات وصلت أثناء البناء لمكالمات لم تُطبق بعد - تُطبق بعد نسخة القراءة
+        self.late_updates: Dict[str, Dict[str, Any]] = {}
+        # أثناء التحديث التدريجي: مكالمات كتبها هذا الـ process - النسخة المقروءة قد تكون أقدم
+        self.touched: Optional[Set[str]] = None
+
+    def touch(self, call_id: str):
+        if self.touched is not None:
+            self.touched.add(call_id)
+
+    def targets(self) -> List["_UserRollups"]:
+        targets = [self] if self.loaded_at else []
+        if self.building is not None:
+            targets.append(self.building)
+        return targets
+
+
+class DailyRollups:
+    """
+    الإحصائيات المجمعة لكل (مستخدم، يوم)
+
+    تُبنى للمستخدم من مكالماته مرة واحدة عند أول طلب، ثم تُحدث مع كل
+    حفظ أو تحديث مكالمة. كل مكالمة تُحسب مرة واحدة بالـ id فإعادة تطبيق
+    نفس المكالمة (أثناء البناء مثلاً) لا تكررها
+
+    refresh_seconds: تحديث دوري لو قاعدة البيانات مشتركة بين عدة processes
+    (Supabase) - كل process يرى كتاباته فقط. التحديث يقرأ المكالمات المضافة
+    أو المحدثة منذ القراءة السابقة فقط (load_changed) وليس كل المكالمات
+
+    retention_days: الأيام الأقدم لا تُحفظ (الذاكرة بحجم النافذة لا بحجم التاريخ)
+    - الفترات الأقدم تُقرأ مباشرة (انظر covers)
+    max_users: أقصى عدد مستخدمين في الذاكرة - الأقدم استخداماً يُحذف ويُبنى من جديد عند طلبه
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: Optional[float] = None,
+        retention_days: Optional[int] = None,
+        max_users: Optional[int] = None
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.retention_days = retention_days
+        self.max_users = max_users
+        self._users: "OrderedDict[str, _UserRollups]" = OrderedDict()
+
+    def cutoff(self) -> str:
+        """أول يوم داخل نافذة الاحتفاظ (YYYY-MM-DD) - "" بدون حد"""
+
+        if not self.retention_days:
+            return ""
+        return (date.today() - timedelta(days=self.retention_days)).isoformat()
+
+    def covers(self, date_from: str) -> bool:
+        return date_from[:10] >= self.cutoff()
+
+    async def ensure(self, user_id: str, load: Loader, load_changed: Optional[Loader] = None):
+        """بناء إحصائيات المستخدم لو لم تُبن، أو تحديثها لو انتهت صلاحيتها"""
+
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserRollups()
+        self._users.move_to_end(user_id)
+
+        cutoff = self.cutoff()
+        if self._fresh(user) and user.cutoff == cutoff:
+            return
+
+        async with user.lock:
+            if not self._fresh(user):
+                if user.loaded_at and load_changed is not None:
+                    await self._refresh(user_id, user, load_changed)
+                else:
+                    await self._build(user_id, user, load, cutoff)
+            _prune(user, cutoff)
+
+        # قد يكون حُذف أثناء القراءة لإفساح مكان لمستخدمين آخرين
+        self._users[user_id] = user
+        self._evict()
+
+    async def _build(self, user_id: str, user: _UserRollups, load: Loader, cutoff: str):
+        started = time.perf_counter()
+        synced_at = _sync_mark()
+        rebuilt = user.building = _UserRollups()
+        rebuilt.cutoff = cutoff
+        try:
+            calls = await load(cutoff or None)
+            for call in calls:
+                # ما كُتب أثناء القراءة أحدث من نسخة القراءة
+                if call.get("id") not in rebuilt.contributions:
+                    _apply(rebuilt, call.get("id"), _contribution(call))
+            for call_id, updates in rebuilt.late_updates.items():
+                if call_id in rebuilt.contributions:
+                    _apply(rebuilt, call_id, _merge_update(rebuilt.contributions[call_id], updates))
+        finally:
+            user.building = None
+
+        user.days, user.contributions = rebuilt.days, rebuilt.contributions
+        user.cutoff, user.synced_at = cutoff, synced_at
+        user.loaded_at = time.monotonic()
+        logger.info(
+            f"📊 Rollups built for {user_id}: {len(user.contributions)} calls, "
+            f"{len(user.days)} days in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+
+    async def _refresh(self, user_id: str, user: _UserRollups, load_changed: Loader):
+        """كتابات الـ workers الأخرى منذ القراءة السابقة - تستبدل مساهمة نفس المكالمة"""
+
+        started = time.perf_counter()
+        synced_at = _sync_mark()
+        user.touched = set()
+        try:
+            calls = list(await load_changed(user.synced_at))
+            for call in calls:
+                if call.get("id") not in user.touched:
+                    _apply(user, call.get("id"), _contribution(call))
+        finally:
+            user.touched = None
+
+        user.synced_at = synced_at
+        user.loaded_at = time.monotonic()
+        logger.info(
+            f"🔄 Rollups refreshed for {user_id}: {len(calls)} changed calls "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+
+    def _evict(self):
+        if not self.max_users:
+            return
+        for user_id in list(self._users)[:max(0, len(self._users) - self.max_users)]:
+            if not self._users[user_id].lock.locked():
+                del self._users[user_id]
+
+    def _fresh(self, user: _UserRollups) -> bool:
+        if not user.loaded_at:
+            return False
+        return self.refresh_seconds is None or time.monotonic() - user.loaded_at < self.refresh_seconds
+
+    # =====================================
+    # التحديث
+    # =====================================
+
+    def add(self, call: Dict[str, Any]):
+        user = self._users.get(call.get("user_id"))
+        if user is None:
+            return
+        contribution = _contribution(call)
+        user.touch(call.get("id"))
+        for target in user.targets():
+            _apply(target, call.get("id"), contribution)
+
+    def update(self, user_id: Optional[str], call_id: str, updates: Dict[str, Any]):
+        """دمج التحديث مع المساهمة المحفوظة"""
+
+        if not any(field in updates for field in ROLLUP_FIELDS):
+            return
+
+        users = [self._users.get(user_id)] if user_id else list(self._users.values())
+        for user in users:
+            if user is None:
+                continue
+            user.touch(call_id)
+            for target in user.targets():
+                previous = target.contributions.get(call_id)
+                if previous is not None:
+                    _apply(target, call_id, _merge_update(previous, updates))
+                elif target is user.building:
+                    target.late_updates.setdefault(call_id, {}).update(updates)
+
+    def discard(self, user_id: Optional[str], call_id: str):
+        """مكالمة لن تُكتب (أسقطتها الكتابة المؤجلة) - تُطرح مساهمتها"""
+
+        for user in self._holding(user_id, call_id):
+            user.touch(call_id)
+            for target in user.targets():
+                _remove(target, call_id)
+            user.late_updates.pop(call_id, None)
+
+    def invalidate(self, user_id: Optional[str], call_id: str):
+        """
+        تحديث لن يُكتب - المساهمة المحفوظة لا تطابق المكالمة المخزنة ولا
+        نعرف قيمها قبل التحديث: إعادة البناء عند الطلب التالي
+        """
+
+        for user in self._holding(user_id, call_id):
+            user.loaded_at = 0.0
+
+    def _holding(self, user_id: Optional[str], call_id: str) -> List[_UserRollups]:
+        users = [self._users.get(user_id)] if user_id else list(self._users.values())
+        return [
+            user for user in users
+            if user is not None and any(call_id in target.contributions for target in user.targets())
+        ]
+
+    # =====================================
+    # القراءة
+    # =====================================
+
+    def days(self, user_id: str, date_from: str, date_to: Optional[str] = None) -> Dict[str, DailyRollup]:
+        """الأيام من date_from إلى date_to (شاملة) - YYYY-MM-DD"""
+
+        user = self._users.get(user_id)
+        if user is None:
+            return {}
+        return {
+            day: rollup for day, rollup in sorted(user.days.items())
+            if day >= date_from[:10] and (date_to is None or day <= date_to[:10])
+        }
+
+    def total(self, user_id: str, date_from: str, date_to: Optional[str] = None) -> DailyRollup:
+        total = DailyRollup()
+        for rollup in self.days(user_id, date_from, date_to).values():
+            total.merge(rollup)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": sum(1 for user in self._users.values() if user.loaded_at),
+            "days": sum(len(user.days) for user in self._users.values()),
+            "calls": sum(len(user.contributions) for user in self._users.values()),
+            "refresh_seconds": self.refresh_seconds,
+            "retention_days": self.retention_days,
+            "max_users": self.max_users
+        }
+
+
+def _merge_update(previous: Contribution, updates: Dict[str, Any]) -> Contribution:
+    day, codes, duration, phone, name = previous
+    return (
+        str(updates["created_at"])[:10] if updates.get("created_at") else day,
+        recode(codes, updates),
+        int(updates.get("duration_seconds", duration) or 0),
+        updates.get("caller_phone", phone) or "unknown",
+        updates.get("caller_name", name) or "غير معروف"
+    )
+
+
+def _sync_mark() -> str:
+    return (datetime.now() - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+
+
+def _apply(user: _UserRollups, call_id: Optional[str], contribution: Contribution):
+    if contribution[0] < user.cutoff:
+        # خارج نافذة الاحتفاظ (أو نُقلت إليها بتحديث created_at)
+        if call_id:
+            _remove(user, call_id)
+        return
+
+    previous = user.contributions.get(call_id) if call_id else None
+    if previous == contribution:
+        return
+
+    if previous is not None:
+        day = user.days[previous[0]]
+        day.apply(previous, -1)
+        if not day.calls:
+            del user.days[previous[0]]
+
+    user.days.setdefault(contribution[0], DailyRollup()).apply(contribution, 1)
+    if call_id:
+        user.contributions[call_id] = contribution
+
+
+def _remove(user: _UserRollups, call_id: str):
+    previous = user.contributions.pop(call_id, None)
+    if previous is None:
+        return
+    day = user.days[previous[0]]
+    day.apply(previous, -1)
+    if not day.calls:
+        del user.days[previous[0]]
+
+
+def _prune(user: _UserRollups, cutoff: str):
+    """حذف ما خرج من نافذة الاحتفاظ منذ آخر مرة (يوم جديد)"""
+
+    if cutoff <= user.cutoff:
+        return
+    user.cutoff = cutoff
+    for day in [day for day in user.days if day < cutoff]:
+        del user.days[day]
+    for call_id in [call_id for call_id, contribution in user.contributions.items() if contribution[0] < cutoff]:
+        del user.contributions[call_id]
@@ -0,0 +1,182 @@
+"""
+كاش إعدادات المستخدمين
+Read-through user-settings cache with TTL and per-user version stamps
+"""
+
+import os
+import copy
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.utils.metrics import SETTINGS_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+Settings = Dict[str, Any]
+
+
+class MemorySettingsBackend:
+    """تخزين داخل الـ process - كل worker له نسخته"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        # user_id -> (version, settings, expires_at)
+        self._entries: "OrderedDict[str, Tuple[int, Settings, float]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+
+    async def get(self, user_id: str) -> Tuple[Optional[Settings], int]:
+        version = self._versions.get(user_id, 0)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None, version
+
+        entry_version, settings, expires_at = entry
+        if entry_version != version or expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None, version
+
+        self._entries.move_to_end(user_id)
+        return settings, version
+
+    async def set(self, user_id: str, version: int, settings: Settings, ttl: float):
+        current = self._entries.get(user_id)
+        if current is not None and current[0] > version:
+            # قراءة بدأت قبل حفظ أحدث - لا تغطي عليه
+            return
+        self._entries[user_id] = (version, settings, time.monotonic() + ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def bump(self, user_id: str) -> int:
+        version = self._versions.get(user_id, 0) + 1
+        self._versions[user_id] = version
+        return version
+
+    async def close(self):
+        self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisSettingsBackend:
+    """
+    تخزين في Redis - مشترك بين كل الـ workers
+
+    رقم الإصدار في مفتاح منفصل (INCR) فالحفظ من أي worker يُبطل
+    النسخ المحفوظة عند الباقين فوراً
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "settings"):
+        import redis.asyncio as redis  # اختياري - فقط مع SETTINGS_CACHE_BACKEND=redis
+
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+
+    def _keys(self, user_id: str) -> Tuple[str, str]:
+        return f"{self.prefix}:{user_id}", f"{self.prefix}:version:{user_id}"
+
+    async def get(self, user_id: str) -> Tuple[Optional[Settings], int]:
+        entry, version = await self._redis.mget(*self._keys(user_id))
+        version = int(version or 0)
+        if entry is None:
+            return None, version
+
+        data = json.loads(entry)
+        if data["version"] != version:
+            return None, version
+        return data["settings"], version
+
+    async def set(self, user_id: str, version: int, settings: Settings, ttl: float):
+        entry_key, _ = self._keys(user_id)
+        payload = json.dumps({"version": version, "settings": settings}, default=str)
+        await self._redis.set(entry_key, payload, px=max(1, int(ttl * 1000)))
+
+    async def bump(self, user_id: str) -> int:
+        _, version_key = self._keys(user_id)
+        return int(await self._redis.incr(version_key))
+
+    async def close(self):
+        await self._redis.close()
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class SettingsCache:
+    """
+    قراءة الإعدادات من الكاش، وعند الـ miss من قاعدة البيانات
+
+    كل مستخدم له رقم إصدار يزيد مع كل حفظ. القراءة تحفظ النتيجة برقم
+    الإصدار الذي رأته قبل الاستعلام، فلو حصل حفظ أثناء الاستعلام تُهمل
+    النسخة القديمة تلقائياً بدل أن تغطي على الجديدة
+    """
+
+    def __init__(self, backend, ttl_seconds: float = 60.0):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+
+    @classmethod
+    def from_env(cls) -> Optional["SettingsCache"]:
+        ttl = float(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "60"))
+        if ttl <= 0:
+            return None
+
+        backend_name = os.getenv("SETTINGS_CACHE_BACKEND", "memory").lower()
+        if backend_name == "redis":
+            try:
+                backend = RedisSettingsBackend(os.getenv("SETTINGS_CACHE_REDIS_URL", "redis://localhost:6379/0"))
+            except ImportError:
+                logger.warning("⚠️ redis library not installed, using in-process settings cache")
+                backend = MemorySettingsBackend()
+        else:
+            backend = MemorySettingsBackend(int(os.getenv("SETTINGS_CACHE_MAX_ENTRIES", "10000")))
+
+        logger.info(f"✅ Settings cache: {backend.name} (TTL {ttl:g}s)")
+        return cls(backend, ttl)
+
+    async def get_or_load(self, user_id: str, load: Callable[[], Awaitable[Settings]]) -> Settings:
+        """نسخة من الإعدادات - المستدعي يستطيع تعديلها بدون أن يمس الكاش"""
+
+        settings, version = await self.backend.get(user_id)
+        if settings is not None:
+            SETTINGS_CACHE_LOOKUPS.inc(result="hit")
+            return copy.deepcopy(settings)
+
+        SETTINGS_CACHE_LOOKUPS.inc(result="miss")
+        settings = await load()
+        await self.backend.set(user_id, version, copy.deepcopy(settings), self.ttl_seconds)
+        return settings
+
+    async def put(self, user_id: str, settings: Settings):
+        """بعد الحفظ: إصدار جديد يُبطل كل النسخ القديمة + النسخة الجديدة جاهزة للقراءة التالية"""
+
+        version = await self.backend.bump(user_id)
+        await self.backend.set(user_id, version, copy.deepcopy(settings), self.ttl_seconds)
+
+    async def invalidate(self, user_id: str):
+        await self.backend.bump(user_id)
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        hits = SETTINGS_CACHE_LOOKUPS.value(result="hit")
+        misses = SETTINGS_CACHE_LOOKUPS.value(result="miss")
+        lookups = hits + misses
+        return {
+            "backend": self.backend.name,
+            "ttl_seconds": self.ttl_seconds,
+            "entries": self.backend.size(),
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+        }
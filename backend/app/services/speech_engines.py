@@ -0,0 +1,183 @@
+"""
+محركات الكلام
+Speech engine registry: common async STT / TTS interfaces, capability flags and config-driven selection
+"""
+
+import os
+import logging
+import importlib
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Union
+
+from app.models.schemas import EmotionType
+
+logger = logging.getLogger(__name__)
+
+# الصوت يصل base64 (JSON) أو bytes خام (WebSocket / رفع مباشر)
+AudioInput = Union[str, bytes, bytearray, memoryview]
+
+
+@dataclass(frozen=True)
+class EngineCapabilities:
+    """ما يدعمه المحرك - للاختيار بين المسارات بدون فحص نوع الكلاس"""
+
+    streaming_output: bool = False    # TTS: الصوت يخرج chunks أثناء التوليف (الـ routers ترد بـ stream_speech)
+    timestamps: bool = False          # STT: segments بتوقيتات
+    language_detection: bool = False
+    voice_cloning: bool = False
+    thinking_sounds: bool = False     # TTS: مقاطع تفكير جاهزة بنفس الصيغة
+    audio_format: str = "mp3"
+    remote: bool = True               # يعتمد على خدمة خارجية
+
+
+class STTEngine(ABC):
+    """الواجهة المشتركة لمحركات تحويل الصوت إلى نص"""
+
+    name = ""
+    capabilities = EngineCapabilities()
+
+    @abstractmethod
+    async def speech_to_text(
+        self,
+        audio_data: AudioInput,
+        language: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict فيه success و text (و error عند الفشل)
+        """
+
+    async def close(self):
+        """تحرير الاتصالات عند الإغلاق"""
+
+
+class TTSEngine(ABC):
+    """الواجهة المشتركة لمحركات تحويل النص إلى صوت"""
+
+    name = ""
+    capabilities = EngineCapabilities()
+
+    @abstractmethod
+    async def text_to_speech(
+        self,
+        text: str,
+        user_id: Optional[str] = None,
+        emotion: EmotionType = EmotionType.NEUTRAL,
+        speed: float = 1.0,
+        voice_gender: str = "female",
+        add_thinking_sounds: bool = False,
+        as_base64: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict فيه success و audio_base64 أو audio_bytes (حسب as_base64)
+        """
+
+    async def stream_speech(
+        self,
+        text: str,
+        user_id: Optional[str] = None,
+        emotion: EmotionType = EmotionType.NEUTRAL,
+        speed: float = 1.0,
+        voice_gender: str = "female"
+    ) -> AsyncIterator[bytes]:
+        """
+        الصوت كـ chunks
+
+        الـ routers تستخدمه فقط لو capabilities.streaming_output، والافتراضي
+        هنا (الصوت كاملاً في chunk واحد) للمحركات بدونه
+        """
+
+        result = await self.text_to_speech(
+            text,
+            user_id=user_id,
+            emotion=emotion,
+            speed=speed,
+            voice_gender=voice_gender,
+            as_base64=False
+        )
+        if not result["success"]:
+            raise RuntimeError(result.get("error") or f"{self.name} TTS failed")
+        yield result["audio_bytes"]
+
+    def get_thinking_sound(
+        self,
+        emotion: EmotionType = EmotionType.NEUTRAL,
+        voice_gender: str = "female"
+    ) -> Optional[bytes]:
+        """مقطع تفكير جاهز - None لو المحرك لا يدعمها"""
+        return None
+
+    async def build_thinking_sounds(self) -> int:
+        """توليد مقاطع التفكير عند التشغيل"""
+        return 0
+
+    async def prewarm_cache(self) -> int:
+        """توليف الردود الثابتة مسبقاً عند التشغيل"""
+        return 0
+
+    async def close(self):
+        """تحرير الاتصالات عند الإغلاق"""
+
+
+# =====================================
+# السجل
+# =====================================
+
+# اسم المحرك -> "module:Class" - الاستيراد عند الاختيار فقط
+STT_ENGINES = {
+    "groq": "app.services.speech_service:SpeechService",   # Groq Whisper - مجاني وسريع!
+    "mock": "app.services.stt_service:STTService"          # للتطوير بدون مفاتيح
+}
+
+TTS_ENGINES = {
+    "edge": "app.services.edge_tts_service:EdgeTTSService"  # Edge TTS - مجاني وطبيعي!
+}
+
+_engines: Dict[str, Union[STTEngine, TTSEngine]] = {}
+
+
+def _create(kind: str, registry: Dict[str, str], env_var: str, default: str):
+    name = os.getenv(env_var, default).strip().lower()
+    if name not in registry:
+        raise ValueError(f"Unknown {kind} engine '{name}' ({env_var}); available: {', '.join(registry)}")
+
+    module_name, class_name = registry[name].split(":")
+    engine = getattr(importlib.import_module(module_name), class_name)()
+    logger.info(f"🔌 {kind.upper()} engine: {name}")
+    return engine
+
+
+def get_stt_engine() -> STTEngine:
+    """محرك STT المشترك على مستوى الـ process (STT_ENGINE)"""
+
+    if "stt" not in _engines:
+        _engines["stt"] = _create("stt", STT_ENGINES, "STT_ENGINE", "groq")
+    return _engines["stt"]
+
+
+def get_tts_engine() -> TTSEngine:
+    """محرك TTS المشترك على مستوى الـ process (TTS_ENGINE)"""
+
+    if "tts" not in _engines:
+        _engines["tts"] = _create("tts", TTS_ENGINES, "TTS_ENGINE", "edge")
+    return _engines["tts"]
+
+
+def get_engine_stats() -> Dict[str, Dict[str, Any]]:
+    """المحركات المستخدمة وقدراتها (للـ /api/status)"""
+
+    return {
+        kind: {"name": engine.name, "capabilities": asdict(engine.capabilities)}
+        for kind, engine in _engines.items()
+    }
+
+
+async def close_speech_engines():
+    """إغلاق كل المحركات عند إيقاف التطبيق"""
+
+    for engine in _engines.values():
+        await engine.close()
+    _engines.clear()
@@ -0,0 +1,153 @@
+"""
+خط إنتاج الجمل: تحويل الرد لصوت أثناء توليده
+Sentence Pipeline - overlap Edge TTS with LLM generation
+"""
+
+import os
+import re
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# حدود الجمل: . ؟ ! ، (و ? اللاتينية) متبوعة بمسافة
+# شرط المسافة يمنع قطع الأرقام العشرية مثل 3.5 أثناء وصول الـ tokens
+SENTENCE_END_PATTERN = re.compile(r"[.!?؟،]+(?=\s)")
+
+class SentencePipeline:
+    """
+    يستهلك tokens الرد من LLM ويبدأ Edge TTS على كل جملة بمجرد اكتمالها
+
+    التوليف يعمل بالتوازي مع استمرار LLM في التوليد، والمقاطع الصوتية
+    تخرج بنفس ترتيب الجمل مهما كان ترتيب انتهاء التوليف
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], Awaitable[Optional[bytes]]],
+        max_concurrency: Optional[int] = None,
+        min_sentence_chars: Optional[int] = None
+    ):
+        self.synthesize = synthesize
+        self.max_concurrency = max_concurrency or int(os.getenv("TTS_PIPELINE_MAX_CONCURRENCY", "3"))
+        # جمل قصيرة جداً ("طب،") تُدمج مع التالية لتجنب مقاطع صوتية متقطعة
+        self.min_sentence_chars = (
+            min_sentence_chars
+            if min_sentence_chars is not None
+            else int(os.getenv("TTS_PIPELINE_MIN_SENTENCE_CHARS", "12"))
+        )
+        self.text = ""
+
+    async def stream(
+        self,
+        tokens: AsyncIterator[str],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        تشغيل الخط
+
+        Args:
+            tokens: مجرى tokens من LLM
+            on_token: callback لكل token (مثلاً لإرساله للعميل)
+
+        Yields:
+            Dict فيه seq و text و audio (bytes أو None لو فشل التوليف)
+        """
+
+        self.text = ""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        producer = asyncio.create_task(
+            self._produce(tokens, queue, semaphore, on_token)
+        )
+
+        try:
+            seq = 0
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+
+                sentence, task = item
+                audio = await task
+
+                yield {"seq": seq, "text": sentence, "audio": audio}
+                seq += 1
+
+            # إظهار أي خطأ من المنتج
+            await producer
+
+        finally:
+            if not producer.done():
+                producer.cancel()
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None and not item[1].done():
+                    item[1].cancel()
+
+    async def _produce(
+        self,
+        tokens: AsyncIterator[str],
+        queue: asyncio.Queue,
+        semaphore: asyncio.Semaphore,
+        on_token: Optional[Callable[[str], Awaitable[None]]]
+    ):
+        """قراءة الـ tokens وجدولة توليف كل جملة مكتملة"""
+
+        pending = ""
+
+        try:
+            try:
+                async for token in tokens:
+                    self.text += token
+                    pending += token
+
+                    if on_token:
+                        await on_token(token)
+
+                    sentence, pending = self._pop_sentence(pending)
+                    while sentence:
+                        self._schedule(sentence, queue, semaphore)
+                        sentence, pending = self._pop_sentence(pending)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.text:
+                    # ننطق ما وصل بالفعل
+                    logger.error(f"❌ LLM stream interrupted: {e}")
+                else:
+                    raise
+
+            if pending.strip():
+                self._schedule(pending, queue, semaphore)
+
+        finally:
+            queue.put_nowait(None)
+
+    def _schedule(self, sentence: str, queue: asyncio.Queue, semaphore: asyncio.Semaphore):
+        sentence = sentence.strip()
+        if not sentence:
+            return
+
+        task = asyncio.create_task(self._synthesize_limited(sentence, semaphore))
+        queue.put_nowait((sentence, task))
+
+    async def _synthesize_limited(self, sentence: str, semaphore: asyncio.Semaphore) -> Optional[bytes]:
+        async with semaphore:
+            try:
+                return await self.synthesize(sentence)
+            except Exception as e:
+                logger.error(f"❌ Sentence synthesis failed: {e}")
+                return None
+
+    def _pop_sentence(self, text: str) -> tuple[str, str]:
+        """فصل أول جملة مكتملة - ترجع ("", text) لو لا توجد جملة كاملة"""
+
+        for match in SENTENCE_END_PATTERN.finditer(text):
+            if len(text[:match.end()].strip()) >= self.min_sentence_chars:
+                return text[:match.end()], text[match.end():]
+
+        return "", text
@@ -7,35 +7,69 @@ import os
 import base64
 import asyncio
 import logging
-from typing import Dict, Any, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, BinaryIO, Dict, Any, Optional, Tuple, Union
 from pathlib import Path
 import uuid
 
-from groq import Groq
+import httpx
+
+from app.services.speech_engines import AudioInput, EngineCapabilities, STTEngine
+from app.utils.metrics import track_upstream
 
 logger = logging.getLogger(__name__)
 
-class SpeechService:
+class SpeechService(STTEngine):
     """خدمة تحويل الصوت إلى نص باستخدام Groq Whisper (مجاني!)"""
     
+    name = "groq"
+    capabilities = EngineCapabilities(timestamps=True, language_detection=True, audio_format="wav")
+    
     def __init__(self):
         self.groq_api_key = os.getenv("GROQ_API_KEY")
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY is required!")
         
-        self.client = Groq(api_key=self.groq_api_key)
+        self.base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
         self.model = "whisper-large-v3"
         self.temp_audio_dir = Path(os.getenv("TEMP_AUDIO_DIR", "/tmp/temp_audio"))
         self.language = os.getenv("WHISPER_LANGUAGE", "ar")
         self.prompt = os.getenv("WHISPER_PROMPT", "محادثة بالعامية المصرية")
+        self.timeout = float(os.getenv("GROQ_TIMEOUT_SECONDS", "60"))
+        
+        # الصوت يُرسل من الذاكرة مباشرة - القرص فقط للملفات الأكبر من هذا الحد
+        self.spill_threshold_bytes = int(os.getenv("STT_SPILL_THRESHOLD_BYTES", str(10 * 1024 * 1024)))
+        
+        # عدد طلبات Groq المتزامنة من نفس الـ worker
+        self.max_concurrency = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
         
         self.temp_audio_dir.mkdir(parents=True, exist_ok=True)
         
-        logger.info(f"✅ Speech Service initialized (Groq Whisper Large v3)")
+        logger.info(f"✅ Speech Service initialized (Groq Whisper Large v3, async, max {self.max_concurrency} concurrent)")
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Client غير متزامن يُعاد استخدامه بين الطلبات"""
+        
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.groq_api_key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency)
+            )
+        return self._client
+    
+    async def close(self):
+        """إغلاق الـ client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     async def speech_to_text(
         self,
-        audio_data: str,
+        audio_data: AudioInput,
         language: Optional[str] = None,
         user_id: Optional[str] = None
     ) -> Dict[str, Any]:
@@ -43,7 +77,7 @@ class SpeechService:
         تحويل الصوت إلى نص باستخدام Groq Whisper
         
         Args:
-            audio_data: بيانات الصوت (base64)
+            audio_data: بيانات الصوت (base64 أو bytes / memoryview خام)
             language: اللغة (ar للعربية)
             user_id: معرف المستخدم (اختياري)
         
@@ -52,17 +86,11 @@ class SpeechService:
         """
         
         try:
-            # حفظ الملف الصوتي مؤقتاً
-            audio_path = await self._save_temp_audio(audio_data, user_id)
-            
-            # تحويل الصوت إلى نص
-            result = await self._transcribe_with_groq(
-                audio_path, 
-                language or self.language
-            )
-            
-            # حذف الملف المؤقت
-            await self._cleanup_temp_file(audio_path)
+            async with self._audio_upload(audio_data, user_id) as upload:
+                result = await self._transcribe_with_groq(
+                    upload,
+                    language or self.language
+                )
             
             return {
                 "success": True,
@@ -80,51 +108,117 @@ class SpeechService:
                 "text": ""
             }
     
-    async def _save_temp_audio(self, audio_base64: str, user_id: Optional[str]) -> Path:
-        """حفظ الملف الصوتي مؤقتاً"""
+    def _decode_audio(self, audio_data: AudioInput) -> Union[bytes, memoryview]:
+        """فك تشفير base64 - الـ bytes الخام تمر بدون نسخ"""
         
-        file_id = uuid.uuid4().hex[:8]
-        filename = f"audio_{user_id or 'unknown'}_{file_id}.wav"
-        audio_path = self.temp_audio_dir / filename
+        if isinstance(audio_data, str):
+            return base64.b64decode(audio_data)
+        if isinstance(audio_data, bytearray):
+            return memoryview(audio_data)
+        return audio_data
+    
+    @asynccontextmanager
+    async def _audio_upload(
+        self,
+        audio_data: AudioInput,
+        user_id: Optional[str]
+    ) -> AsyncIterator[Tuple[str, Union[bytes, memoryview, BinaryIO]]]:
+        """
+        تجهيز الصوت للرفع كـ (filename, content)
         
-        # فك تشفير base64 وحفظ
-        audio_bytes = base64.b64decode(audio_base64)
-        audio_path.write_bytes(audio_bytes)
+        الحالة العادية: المحتوى في الذاكرة بدون أي كتابة على القرص.
+        الملفات الأكبر من STT_SPILL_THRESHOLD_BYTES فقط تُكتب مؤقتاً ويُرفع
+        الملف كـ stream، ويُحذف دائماً حتى لو فشل التحويل.
+        """
+        
+        audio = self._decode_audio(audio_data)
+        filename = f"audio_{user_id or 'unknown'}_{uuid.uuid4().hex[:8]}.wav"
         
-        logger.info(f"💾 Saved temp audio: {audio_path}")
+        if len(audio) <= self.spill_threshold_bytes:
+            yield filename, audio
+            return
         
-        return audio_path
+        audio_path = self.temp_audio_dir / filename
+        await asyncio.to_thread(audio_path.write_bytes, audio)
+        del audio
+        logger.info(f"💾 Large audio spilled to disk: {audio_path}")
+        
+        try:
+            with open(audio_path, "rb") as file:
+                yield filename, file
+        finally:
+            await self._cleanup_temp_file(audio_path)
     
-    async def _transcribe_with_groq(self, audio_path: Path, language: str) -> Dict[str, Any]:
+    async def _transcribe_with_groq(
+        self,
+        upload: Tuple[str, Union[bytes, memoryview, BinaryIO]],
+        language: str
+    ) -> Dict[str, Any]:
         """تحويل الصوت إلى نص باستخدام Groq Whisper API"""
         
         try:
             logger.info(f"🎤 Transcribing with Groq Whisper (language: {language})")
             
-            # قراءة الملف
-            with open(audio_path, "rb") as file:
-                # استدعاء Groq API
-                transcription = self.client.audio.transcriptions.create(
-                    file=(audio_path.name, file.read()),
-                    model=self.model,
-                    language=language,
-                    prompt=self.prompt,
-                    response_format="verbose_json",
-                    temperature=0.0
-                )
+            transcription = await self._create_transcription(
+                upload,
+                language=language,
+                prompt=self.prompt,
+                temperature=0.0
+            )
             
-            logger.info(f"✅ Transcription successful: {transcription.text[:50]}...")
+            logger.info(f"✅ Transcription successful: {transcription['text'][:50]}...")
             
             return {
-                "text": transcription.text,
-                "language": transcription.language,
-                "duration": getattr(transcription, 'duration', 0)
+                "text": transcription["text"],
+                "language": transcription.get("language") or language,
+                "duration": transcription.get("duration", 0)
             }
                 
         except Exception as e:
             logger.error(f"❌ Error in Groq transcription: {e}")
             raise
     
+    async def _create_transcription(
+        self,
+        upload: Tuple[str, Union[bytes, memoryview, BinaryIO]],
+        language: Optional[str] = None,
+        prompt: Optional[str] = None,
+        temperature: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        طلب audio/transcriptions غير متزامن لـ Groq (OpenAI-compatible)
+        
+        الـ event loop لا يتوقف أثناء الرفع والتحويل، والـ semaphore
+        يحد عدد الطلبات المتزامنة لكل worker
+        """
+        
+        data = {
+            "model": self.model,
+            "response_format": "verbose_json"
+        }
+        if language:
+            data["language"] = language
+        if prompt:
+            data["prompt"] = prompt
+        if temperature is not None:
+            data["temperature"] = str(temperature)
+        
+        filename, content = upload
+        if isinstance(content, memoryview):
+            # httpx multipart يقبل bytes أو file-like فقط
+            content = content.tobytes()
+        
+        async with self._semaphore:
+            with track_upstream("groq"):
+                response = await self._get_client().post(
+                    "/audio/transcriptions",
+                    data=data,
+                    files={"file": (filename, content)}
+                )
+                response.raise_for_status()
+        
+        return response.json()
+    
     async def _cleanup_temp_file(self, file_path: Path):
         """حذف الملف المؤقت"""
         
@@ -137,42 +231,34 @@ class SpeechService:
     
     async def transcribe_with_timestamps(
         self,
-        audio_data: str,
+        audio_data: AudioInput,
         language: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         تحويل الصوت لنص مع timestamps
         """
         try:
-            audio_path = await self._save_temp_audio(audio_data, None)
-            
-            with open(audio_path, "rb") as file:
-                transcription = self.client.audio.transcriptions.create(
-                    file=(audio_path.name, file.read()),
-                    model=self.model,
+            async with self._audio_upload(audio_data, None) as upload:
+                transcription = await self._create_transcription(
+                    upload,
                     language=language or self.language,
-                    response_format="verbose_json",
                     temperature=0.0
                 )
             
-            await self._cleanup_temp_file(audio_path)
-            
-            segments = []
-            if hasattr(transcription, 'segments'):
-                segments = [
-                    {
-                        "start": seg.get("start", 0),
-                        "end": seg.get("end", 0),
-                        "text": seg.get("text", "")
-                    }
-                    for seg in transcription.segments
-                ]
+            segments = [
+                {
+                    "start": seg.get("start", 0),
+                    "end": seg.get("end", 0),
+                    "text": seg.get("text", "")
+                }
+                for seg in transcription.get("segments") or []
+            ]
             
             return {
                 "success": True,
-                "text": transcription.text,
+                "text": transcription["text"],
                 "segments": segments,
-                "language": transcription.language
+                "language": transcription.get("language")
             }
             
         except Exception as e:
@@ -182,27 +268,19 @@ class SpeechService:
                 "error": str(e)
             }
     
-    async def detect_language(self, audio_data: str) -> Dict[str, Any]:
+    async def detect_language(self, audio_data: AudioInput) -> Dict[str, Any]:
         """اكتشاف لغة الصوت"""
         
         try:
             # Groq Whisper يكتشف اللغة تلقائياً
-            audio_path = await self._save_temp_audio(audio_data, None)
-            
-            with open(audio_path, "rb") as file:
-                transcription = self.client.audio.transcriptions.create(
-                    file=(audio_path.name, file.read()),
-                    model=self.model,
-                    response_format="verbose_json"
-                )
-            
-            await self._cleanup_temp_file(audio_path)
+            async with self._audio_upload(audio_data, None) as upload:
+                transcription = await self._create_transcription(upload)
             
             return {
                 "success": True,
-                "language": transcription.language,
+                "language": transcription.get("language"),
                 "confidence": 0.95,
-                "text": transcription.text[:100]
+                "text": transcription["text"][:100]
             }
             
         except Exception as e:
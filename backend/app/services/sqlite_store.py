@@ -0,0 +1,303 @@
+"""
+تخزين SQLite المحلي
+Durable embedded storage (SQLite in WAL mode) for single-node deployments
+"""
+
+import json
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app.utils.metrics import DB_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    caller_phone TEXT,
+    status TEXT,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+DROP INDEX IF EXISTS idx_calls_user_created;
+CREATE INDEX IF NOT EXISTS idx_calls_user_created_id ON calls (user_id, created_at, id);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    sender_phone TEXT,
+    recipient_phone TEXT,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_user_created ON messages (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_user_sender ON messages (user_id, sender_phone, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_user_recipient ON messages (user_id, recipient_phone, created_at);
+
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# REPLACE: إعادة دفعة فشلت بعد كتابة جزء منها لا تكرر السجلات
+INSERT_CALL = (
+    "INSERT OR REPLACE INTO calls (id, user_id, caller_phone, status, created_at, data) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+INSERT_MESSAGE = (
+    "INSERT OR REPLACE INTO messages (id, user_id, sender_phone, recipient_phone, created_at, data) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+def _dumps(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+def _json_select(fields: Optional[Dict[str, str]]) -> str:
+    """
+    الحقول المطلوبة فقط كـ JSON صغير - SQLite يستخرجها بدون أن يمر
+    Python على السجل كاملاً (المحادثة والملخص)
+    """
+
+    if fields is None:
+        return "data"
+    pairs = ", ".join(f"'{name}', json_extract(data, '$.{path}')" for name, path in fields.items())
+    return f"json_object({pairs})"
+
+
+def _call_row(call_data: Dict[str, Any]) -> tuple:
+    return (
+        call_data["id"],
+        call_data.get("user_id"),
+        call_data.get("caller_phone"),
+        call_data.get("status"),
+        call_data["created_at"],
+        _dumps(call_data)
+    )
+
+
+def _message_row(message_data: Dict[str, Any]) -> tuple:
+    return (
+        message_data["id"],
+        message_data.get("user_id"),
+        message_data.get("sender_phone"),
+        message_data.get("recipient_phone"),
+        message_data["created_at"],
+        _dumps(message_data)
+    )
+
+
+class SQLiteStore:
+    """
+    نفس واجهة LocalStore لكن على ملف SQLite
+
+    - الكتابة: thread واحد باتصال واحد (SQLite يسمح بكاتب واحد فقط)
+    - القراءة: pool من threads لكل منها اتصالها، وWAL يسمح بالقراءة أثناء الكتابة
+    - السجل كامل JSON في data، والأعمدة المستخدمة في البحث منفصلة ومفهرسة
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, pool_size: int = 4):
+        self.path = path
+        self.pool_size = pool_size
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+    async def initialize(self):
+        """فتح الملف وإنشاء الجداول والفهارس"""
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        self._readers = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite-reader")
+
+        # executescript يدير المعاملة بنفسه - خارج _transaction
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer, lambda: self._connection().executescript(SCHEMA))
+        logger.info(f"✅ SQLite storage ready: {self.path} (WAL, {self.pool_size} readers)")
+
+    async def close(self):
+        for executor in (self._writer, self._readers):
+            if executor is not None:
+                await asyncio.to_thread(executor.shutdown, True)
+        self._writer = self._readers = None
+
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    # =====================================
+    # الاتصالات
+    # =====================================
+
+    def _connection(self) -> sqlite3.Connection:
+        """اتصال خاص بالـ thread الحالي (يُفتح مرة واحدة)"""
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: المعاملات صريحة في _transaction فقط
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _transaction(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def _read(self, operation: str, fn: Callable[[sqlite3.Connection], T]) -> T:
+        loop = asyncio.get_running_loop()
+        with DB_QUERY_SECONDS.time(operation=operation):
+            return await loop.run_in_executor(self._readers, lambda: fn(self._connection()))
+
+    async def _write(self, operation: str, fn: Callable[[sqlite3.Connection], T]) -> T:
+        loop = asyncio.get_running_loop()
+        with DB_QUERY_SECONDS.time(operation=operation):
+            return await loop.run_in_executor(self._writer, self._transaction, fn)
+
+    # =====================================
+    # Calls
+    # =====================================
+
+    async def insert_call(self, call_data: Dict[str, Any]) -> str:
+        call_data.setdefault("id", f"call_{uuid.uuid4().hex[:12]}")
+        await self._write("save_call", lambda conn: conn.execute(INSERT_CALL, _call_row(call_data)))
+        return call_data["id"]
+
+    async def insert_calls(self, rows: List[Dict[str, Any]]):
+        """دفعة كاملة في معاملة واحدة (commit واحد) - إعادة نفس السجل تستبدله"""
+        params = [_call_row(call_data) for call_data in rows]
+        await self._write("save_calls_batch", lambda conn: conn.executemany(INSERT_CALL, params))
+
+    async def get_call(self, call_id: str) -> Optional[Dict[str, Any]]:
+        row = await self._read("get_call", lambda conn: conn.execute(
+            "SELECT data FROM calls WHERE id = ?", (call_id,)
+        ).fetchone())
+        return json.loads(row[0]) if row else None
+
+    async def update_call(self, call_id: str, updates: Dict[str, Any]) -> bool:
+        def update(conn: sqlite3.Connection) -> bool:
+            row = conn.execute("SELECT data FROM calls WHERE id = ?", (call_id,)).fetchone()
+            if row is None:
+                return False
+            call = json.loads(row[0])
+            call.update(updates)
+            conn.execute(
+                "UPDATE calls SET caller_phone = ?, status = ?, data = ? WHERE id = ?",
+                (call.get("caller_phone"), call.get("status"), _dumps(call), call_id)
+            )
+            return True
+
+        return await self._write("update_call", update)
+
+    async def update_calls(self, updates: Dict[str, Dict[str, Any]]):
+        """تحديثات دفعة كاملة في معاملة واحدة (commit واحد) - id غير موجود يُتجاهل"""
+
+        def update(conn: sqlite3.Connection):
+            params = []
+            for call_id, fields in updates.items():
+                row = conn.execute("SELECT data FROM calls WHERE id = ?", (call_id,)).fetchone()
+                if row is None:
+                    continue
+                call = json.loads(row[0])
+                call.update(fields)
+                params.append((call.get("caller_phone"), call.get("status"), _dumps(call), call_id))
+            conn.executemany("UPDATE calls SET caller_phone = ?, status = ?, data = ? WHERE id = ?", params)
+
+        await self._write("update_calls_batch", update)
+
+    async def user_calls(
+        self,
+        user_id: str,
+        limit: int,
+        date_from: Optional[str] = None,
+        fields: Optional[Dict[str, str]] = None,
+        before: Optional[Tuple[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """الأحدث أولاً (مثل Supabase) - من فهرس (user_id, created_at, id)"""
+
+        sql = f"SELECT {_json_select(fields)} FROM calls WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if date_from:
+            sql += " AND created_at >= ?"
+            params.append(date_from)
+        if before:
+            # keyset: يقفز في الفهرس مباشرة بدل OFFSET
+            sql += " AND (created_at, id) < (?, ?)"
+            params.extend(before)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        rows = await self._read("get_user_calls", lambda conn: conn.execute(sql, params).fetchall())
+        return [json.loads(row[0]) for row in rows]
+
+    # =====================================
+    # Messages
+    # =====================================
+
+    async def insert_message(self, message_data: Dict[str, Any]) -> str:
+        message_data["id"] = f"msg_{uuid.uuid4().hex[:12]}"
+        await self._write("save_message", lambda conn: conn.execute(INSERT_MESSAGE, _message_row(message_data)))
+        return message_data["id"]
+
+    async def insert_messages(self, rows: List[Dict[str, Any]]):
+        params = [_message_row(message_data) for message_data in rows]
+        await self._write("save_messages_batch", lambda conn: conn.executemany(INSERT_MESSAGE, params))
+
+    async def conversation(self, user_id: str, contact_phone: str, limit: int) -> List[Dict[str, Any]]:
+        """آخر limit رسائل بالترتيب الزمني"""
+
+        rows = await self._read("get_conversation_history", lambda conn: conn.execute(
+            "SELECT data FROM messages WHERE user_id = ? AND (sender_phone = ? OR recipient_phone = ?) "
+            "ORDER BY created_at DESC LIMIT ?",
+            (user_id, contact_phone, contact_phone, limit)
+        ).fetchall())
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    # =====================================
+    # Settings
+    # =====================================
+
+    async def get_settings(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = await self._read("get_user_settings", lambda conn: conn.execute(
+            "SELECT data FROM user_settings WHERE user_id = ?", (user_id,)
+        ).fetchone())
+        return json.loads(row[0]) if row else None
+
+    async def save_settings(self, user_id: str, settings: Dict[str, Any]):
+        payload = _dumps(settings)
+        await self._write("save_user_settings", lambda conn: conn.execute(
+            "INSERT INTO user_settings (user_id, data) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data",
+            (user_id, payload)
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "readers": self.pool_size}
@@ -7,15 +7,20 @@ import os
 import base64
 import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 from pathlib import Path
 import uuid
 import json
 
+from app.services.speech_engines import EngineCapabilities, STTEngine
+
 logger = logging.getLogger(__name__)
 
-class STTService:
-    """خدمة تحويل الصوت إلى نص"""
+class STTService(STTEngine):
+    """خدمة تحويل الصوت إلى نص (Whisper محلي تجريبي أو OpenAI API)"""
+    
+    name = "mock"
+    capabilities = EngineCapabilities(language_detection=True, audio_format="wav", remote=False)
     
     def __init__(self):
         self.whisper_api_key = os.getenv("WHISPER_API_KEY")
@@ -29,15 +34,15 @@ class STTService:
     
     async def speech_to_text(
         self,
-        audio_data: str,
-        language: str = "ar",
+        audio_data: Union[str, bytes],
+        language: Optional[str] = "ar",
         user_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         تحويل الصوت إلى نص
         
         Args:
-            audio_data: بيانات الصوت (base64)
+            audio_data: بيانات الصوت (base64 أو bytes خام)
             language: اللغة (ar للعربية)
             user_id: معرف المستخدم (اختياري)
         
@@ -48,6 +53,7 @@ class STTService:
         try:
             # حفظ الملف الصوتي مؤقتاً
             audio_path = await self._save_temp_audio(audio_data, user_id)
+            language = language or "ar"
             
             # تحويل الصوت إلى نص
             if self.use_local:
@@ -75,15 +81,18 @@ class STTService:
                 "text": ""
             }
     
-    async def _save_temp_audio(self, audio_base64: str, user_id: Optional[str]) -> Path:
+    async def _save_temp_audio(self, audio_data: Union[str, bytes], user_id: Optional[str]) -> Path:
         """حفظ الملف الصوتي مؤقتاً"""
         
         file_id = uuid.uuid4().hex[:8]
         filename = f"temp_audio_{user_id or 'unknown'}_{file_id}.wav"
         audio_path = self.temp_audio_dir / filename
         
-        # فك تشفير base64 وحفظ
-        audio_bytes = base64.b64decode(audio_base64)
+        # فك تشفير base64 (الرفع الثنائي يرسل bytes مباشرة) وحفظ
+        if isinstance(audio_data, str):
+            audio_bytes = base64.b64decode(audio_data)
+        else:
+            audio_bytes = bytes(audio_data)
         audio_path.write_bytes(audio_bytes)
         
         logger.info(f"💾 Saved temp audio: {audio_path}")
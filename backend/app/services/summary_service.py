@@ -3,11 +3,13 @@
 Smart Summary Service
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, List
-from datetime import datetime
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
 
 from app.services.ai_service import AIService
+from app.services.report_engine import ReportEngine
 from app.models.schemas import CallSummary, EmotionType, CallStatus
 
 logger = logging.getLogger(__name__)
@@ -15,8 +17,9 @@ logger = logging.getLogger(__name__)
 class SummaryService:
     """خدمة توليد الملخصات الذكية للمكالمات"""
     
-    def __init__(self):
-        self.ai_service = AIService()
+    def __init__(self, ai_service: Optional[AIService] = None):
+        self.ai_service = ai_service or AIService()
+        self.reports = ReportEngine()
     
     async def generate_call_summary(
         self,
@@ -360,52 +363,16 @@ class SummaryService:
     async def generate_daily_report(
         self,
         user_id: str,
-        calls: List[Dict[str, Any]]
+        calls: List[Dict[str, Any]],
+        date: Optional[str] = None
     ) -> Dict[str, Any]:
         """توليد تقرير يومي شامل"""
         
         try:
             logger.info(f"📊 Generating daily report for user: {user_id}")
             
-            # إحصائيات أساسية
-            total_calls = len(calls)
-            answered = len([c for c in calls if c.get("status") == "completed"])
-            missed = len([c for c in calls if c.get("status") == "missed"])
-            
-            total_duration = sum(c.get("duration_seconds", 0) for c in calls)
-            
-            # تحليل المشاعر العامة
-            emotions = [c.get("caller_emotion", "neutral") for c in calls]
-            emotion_breakdown = {
-                emotion: emotions.count(emotion)
-                for emotion in set(emotions)
-            }
-            
-            # أهم المكالمات (حسب الأولوية)
-            urgent_calls = [c for c in calls if c.get("priority_level") == "urgent"]
-            
-            # اقتراحات المتابعة
-            all_follow_ups = []
-            for call in calls:
-                all_follow_ups.extend(call.get("follow_up_suggestions", []))
-            
-            unique_follow_ups = list(set(all_follow_ups))
-            
-            report = {
-                "user_id": user_id,
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "stats": {
-                    "total_calls": total_calls,
-                    "answered_calls": answered,
-                    "missed_calls": missed,
-                    "total_duration_minutes": total_duration // 60,
-                    "average_duration": total_duration / total_calls if total_calls > 0 else 0
-                },
-                "emotion_breakdown": emotion_breakdown,
-                "urgent_calls": urgent_calls[:5],
-                "follow_ups_needed": unique_follow_ups,
-                "insights": await self._generate_insights(calls)
-            }
+            date = date or datetime.now().strftime("%Y-%m-%d")
+            report = await self._run_report(self.reports.daily, user_id, calls, date)
             
             logger.info(f"✅ Daily report generated for user: {user_id}")
             
@@ -415,32 +382,39 @@ class SummaryService:
             logger.error(f"❌ Error generating daily report: {e}")
             return {}
     
-    async def _generate_insights(self, calls: List[Dict[str, Any]]) -> List[str]:
-        """توليد رؤى ذكية من المكالمات"""
-        
-        insights = []
-        
-        if not calls:
-            return ["لا توجد مكالمات اليوم"]
+    async def generate_weekly_report(
+        self,
+        user_id: str,
+        calls: List[Dict[str, Any]],
+        week_start: str,
+        week_end: str
+    ) -> Dict[str, Any]:
+        """
+        التقارير اليومية + إحصائيات الأسبوع والاتجاهات والتوصيات
         
-        # تحليل الأنماط
-        total_calls = len(calls)
+        كلها من مرور واحد على المكالمات (ReportEngine)
+        """
         
-        if total_calls > 10:
-            insights.append(f"🔥 يوم مزدحم! تلقيت {total_calls} مكالمة")
+        logger.info(f"📊 Generating weekly report for user: {user_id} ({len(calls)} calls)")
         
-        # تحليل الأوقات
-        call_hours = [
-            datetime.fromisoformat(c.get("start_time", datetime.now().isoformat())).hour
-            for c in calls
+        start = datetime.strptime(week_start, "%Y-%m-%d")
+        days = [
+            (start + timedelta(days=offset)).strftime("%Y-%m-%d")
+            for offset in range((datetime.strptime(week_end, "%Y-%m-%d") - start).days + 1)
         ]
+        report = await self._run_report(self.reports.build, user_id, calls, days)
         
-        peak_hour = max(set(call_hours), key=call_hours.count)
-        insights.append(f"📞 أكثر وقت للمكالمات: الساعة {peak_hour}:00")
+        logger.info(f"✅ Weekly report generated for user: {user_id}")
         
-        # تحليل المشاعر
-        positive_calls = len([c for c in calls if c.get("caller_sentiment_score", 0) > 0.3])
-        if positive_calls > total_calls * 0.7:
-            insights.append("😊 معظم المكالمات كانت إيجابية")
-        
-        return insights
+        return {
+            "user_id": user_id,
+            "week_start": week_start,
+            "week_end": week_end,
+            **report
+        }
+    
+    async def _run_report(self, build, user_id: str, calls: List[Dict[str, Any]], *args):
+        # الحجم الكبير (مسار numpy) في thread حتى لا يوقف الـ event loop
+        if len(calls) >= self.reports.numpy_min_calls:
+            return await asyncio.to_thread(build, user_id, calls, *args)
+        return build(user_id, calls, *args)
@@ -0,0 +1,122 @@
+"""
+أصوات التفكير الجاهزة
+Pre-rendered thinking-sound clips ("مممم...", "يعني...") kept in memory
+"""
+
+import os
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.models.schemas import EmotionType
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FILLERS = "مممم...|يعني...|خليني أفكر...|طب...|آه..."
+
+# (النص، الصوت، السرعة، الطبقة) -> MP3
+RenderFunc = Callable[[str, str, str, str], Awaitable[bytes]]
+
+
+class ThinkingSoundCache:
+    """
+    مقاطع أصوات التفكير لكل (صوت، مشاعر) تُولد مرة واحدة عند التشغيل
+
+    المقاطع بنفس صيغة Edge TTS (MP3 mono) فيمكن لصقها قبل صوت الرد
+    مباشرة على مستوى الـ frames بدون إعادة توليف
+    """
+
+    def __init__(self, fillers: Optional[List[str]] = None, max_concurrency: Optional[int] = None):
+        self.fillers = fillers or [
+            f.strip() for f in os.getenv("THINKING_SOUND_FILLERS", DEFAULT_FILLERS).split("|") if f.strip()
+        ]
+        self.max_concurrency = max_concurrency or int(os.getenv("THINKING_SOUND_BUILD_CONCURRENCY", "4"))
+        self._clips: Dict[Tuple[str, EmotionType], List[bytes]] = {}
+        self.ready = False
+
+    async def build(
+        self,
+        voices: List[str],
+        prosody: Callable[[EmotionType], Tuple[str, str]],
+        render: RenderFunc
+    ) -> int:
+        """
+        توليد كل المقاطع
+
+        Args:
+            voices: أسماء أصوات Edge TTS
+            prosody: المشاعر -> (rate, pitch) بنفس تأثير المشاعر على الرد
+            render: دالة التوليف
+
+        Returns:
+            عدد المقاطع التي تم توليفها
+        """
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # مشاعر بنفس السرعة والطبقة تتشارك نفس المقاطع
+        renders: Dict[Tuple[str, str, str, str], asyncio.Task] = {}
+        plan: Dict[Tuple[str, EmotionType], List[Tuple[str, str, str, str]]] = {}
+
+        async def render_one(text: str, voice: str, rate: str, pitch: str) -> Optional[bytes]:
+            async with semaphore:
+                try:
+                    return await render(text, voice, rate, pitch)
+                except Exception as e:
+                    logger.warning(f"⚠️ Thinking sound failed ({voice}, {text}): {e}")
+                    return None
+
+        for voice in voices:
+            for emotion in EmotionType:
+                rate, pitch = prosody(emotion)
+                keys = []
+                for filler in self.fillers:
+                    key = (filler, voice, rate, pitch)
+                    if key not in renders:
+                        renders[key] = asyncio.create_task(render_one(*key))
+                    keys.append(key)
+                plan[(voice, emotion)] = keys
+
+        try:
+            await asyncio.gather(*renders.values())
+        except asyncio.CancelledError:
+            for task in renders.values():
+                task.cancel()
+            raise
+
+        for slot, keys in plan.items():
+            clips = [renders[key].result() for key in keys]
+            self._clips[slot] = [clip for clip in clips if clip]
+
+        rendered = sum(1 for task in renders.values() if task.result())
+        self.ready = True
+        logger.info(f"🤔 Thinking sounds ready: {rendered}/{len(renders)} clips for {len(voices)} voices")
+        return rendered
+
+    def pick(self, voice: str, emotion: EmotionType = EmotionType.NEUTRAL) -> Optional[bytes]:
+        """مقطع عشوائي للصوت والمشاعر - None لو لم تُبنى المقاطع بعد"""
+
+        clips = self._clips.get((voice, emotion)) or self._clips.get((voice, EmotionType.NEUTRAL))
+        if not clips:
+            return None
+        return random.choice(clips)
+
+    def stats(self) -> Dict[str, object]:
+        # المقطع الواحد قد يُشارك بين أكثر من مشاعر
+        unique = {id(clip): len(clip) for clips in self._clips.values() for clip in clips}
+        return {
+            "ready": self.ready,
+            "clips": len(unique),
+            "bytes": sum(unique.values())
+        }
+
+
+# =====================================
+# نسخة مشتركة على مستوى الـ process
+# =====================================
+
+_cache = ThinkingSoundCache()
+
+
+def get_thinking_sound_cache() -> ThinkingSoundCache:
+    return _cache
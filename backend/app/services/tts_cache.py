@@ -0,0 +1,283 @@
+"""
+كاش الصوت المولد
+Content-addressed TTS audio cache: in-memory LRU + size-capped disk tier
+"""
+
+import os
+import re
+import asyncio
+import hashlib
+import logging
+import tempfile
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.utils.metrics import TTS_CACHE_BYTES, TTS_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """نفس النطق = نفس المفتاح: توحيد Unicode والمسافات"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class TTSCache:
+    """
+    كاش صوت Edge TTS بمفتاح hash لـ (النص، الصوت، السرعة، الطبقة، الارتفاع)
+
+    - الذاكرة: LRU محدود بالحجم بالـ bytes
+    - القرص: ملف MP3 لكل مفتاح، محدود بالحجم ويحذف الأقدم استخداماً
+    - الطلبات المتزامنة لنفس المفتاح تنتظر توليفاً واحداً
+    """
+
+    def __init__(
+        self,
+        memory_max_bytes: int = 32 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024
+    ):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+
+        # فهرس القرص بترتيب آخر استخدام: key -> الحجم
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        if self.disk_dir is not None:
+            self._load_disk_index()
+
+    @classmethod
+    def from_env(cls) -> "TTSCache":
+        if os.getenv("TTS_CACHE_ENABLED", "true").lower() != "true":
+            return cls(memory_max_bytes=0, disk_dir=None)
+
+        return cls(
+            memory_max_bytes=int(os.getenv("TTS_CACHE_MEMORY_MAX_BYTES", str(32 * 1024 * 1024))),
+            disk_dir=os.getenv("TTS_CACHE_DIR", "./tts_cache") or None,
+            disk_max_bytes=int(os.getenv("TTS_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+        )
+
+    @staticmethod
+    def key(text: str, voice: str, rate: str, pitch: str, volume: str) -> str:
+        material = "\x1f".join((normalize_text(text), voice, rate, pitch, volume))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    # =====================================
+    # القراءة والكتابة
+    # =====================================
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """الذاكرة ثم القرص - None لو غير موجود"""
+
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            TTS_CACHE_LOOKUPS.inc(result="memory_hit")
+            return audio
+
+        if key in self._disk:
+            audio = await asyncio.to_thread(self._read_disk, key)
+            if audio is not None:
+                self._disk.move_to_end(key)
+                self._remember(key, audio)
+                TTS_CACHE_LOOKUPS.inc(result="disk_hit")
+                return audio
+            self._forget_disk(key)
+
+        TTS_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def put(self, key: str, audio: bytes):
+        if not audio:
+            return
+
+        self._remember(key, audio)
+
+        if self.disk_dir is not None and key not in self._disk and len(audio) <= self.disk_max_bytes:
+            try:
+                await asyncio.to_thread(self._write_disk, key, audio)
+            except OSError as e:
+                logger.warning(f"⚠️ TTS cache disk write failed: {e}")
+                return
+            self._disk[key] = len(audio)
+            self._disk_bytes += len(audio)
+            await self._evict_disk()
+
+        self._update_gauges()
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        """من الكاش أو توليف واحد مشترك بين كل من يطلب نفس المفتاح"""
+
+        audio = await self.get(key)
+        if audio is not None:
+            return audio
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # صاحب التوليف اتلغى (barge-in مثلاً) - نولد بأنفسنا
+                if not pending.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            audio = await render()
+            await self.put(key, audio)
+            future.set_result(audio)
+            return audio
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # لو لا أحد ينتظر لا نريد تحذير "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    # =====================================
+    # الذاكرة
+    # =====================================
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.memory_max_bytes:
+            return
+
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # =====================================
+    # القرص
+    # =====================================
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.mp3"
+
+    def _load_disk_index(self):
+        """قراءة الملفات الموجودة من تشغيل سابق بترتيب آخر استخدام"""
+
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.disk_dir.glob("*/*.mp3"), key=lambda p: p.stat().st_mtime)
+        except OSError as e:
+            logger.warning(f"⚠️ TTS cache disk tier disabled: {e}")
+            self.disk_dir = None
+            return
+
+        for path in files:
+            size = path.stat().st_size
+            self._disk[path.stem] = size
+            self._disk_bytes += size
+
+        if files:
+            logger.info(f"💾 TTS cache: {len(files)} clips on disk ({self._disk_bytes // 1024} KB)")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+            # mtime = آخر استخدام (للحذف بعد إعادة التشغيل)
+            os.utime(path)
+            return audio
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, audio: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # اسم مؤقت فريد: نفس المفتاح قد يُكتب من أكثر من thread أو worker في نفس الوقت
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{key}.", suffix=".tmp", delete=False) as file:
+            file.write(audio)
+        try:
+            os.replace(file.name, path)
+        except OSError:
+            os.unlink(file.name)
+            raise
+
+    def _forget_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    async def _evict_disk(self):
+        evicted = []
+        while self._disk_bytes > self.disk_max_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(self._path(key))
+
+        if evicted:
+            await asyncio.to_thread(self._unlink_all, evicted)
+
+    @staticmethod
+    def _unlink_all(paths):
+        for path in paths:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    # =====================================
+    # الإحصائيات
+    # =====================================
+
+    def _update_gauges(self):
+        TTS_CACHE_BYTES.set(self._memory_bytes, tier="memory")
+        TTS_CACHE_BYTES.set(self._disk_bytes, tier="disk")
+
+    def stats(self) -> Dict[str, object]:
+        hits_memory = TTS_CACHE_LOOKUPS.value(result="memory_hit")
+        hits_disk = TTS_CACHE_LOOKUPS.value(result="disk_hit")
+        misses = TTS_CACHE_LOOKUPS.value(result="miss")
+        lookups = hits_memory + hits_disk + misses
+
+        return {
+            "memory": {"entries": len(self._memory), "bytes": self._memory_bytes, "max_bytes": self.memory_max_bytes},
+            "disk": {
+                "enabled": self.disk_dir is not None,
+                "entries": len(self._disk),
+                "bytes": self._disk_bytes,
+                "max_bytes": self.disk_max_bytes
+            },
+            "hits": {"memory": int(hits_memory), "disk": int(hits_disk)},
+            "misses": int(misses),
+            "hit_rate": round((hits_memory + hits_disk) / lookups, 3) if lookups else 0.0
+        }
+
+
+# =====================================
+# نسخة مشتركة على مستوى الـ process
+# =====================================
+
+_cache: Optional[TTSCache] = None
+
+
+def get_tts_cache() -> TTSCache:
+    global _cache
+    if _cache is None:
+        _cache = TTSCache.from_env()
+    return _cache
@@ -0,0 +1,308 @@
+"""
+الكتابة المؤجلة المجمعة
+Write-behind buffer: coalesces inserts and updates into bulk batches flushed on size or time
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.utils.metrics import DB_WRITE_BATCHES, DB_WRITE_DROPPED, DB_WRITE_ROWS
+
+logger = logging.getLogger(__name__)
+
+Row = Dict[str, Any]
+
+# (table, inserts, updates) - updates: id -> الحقول المدمجة
+# ترجع ids الصفوف التي فشلت فقط (None = كُتبت كلها)، والاستثناء = فشلت الدفعة كلها
+FlushFn = Callable[[str, List[Row], Dict[str, Row]], Awaitable[Optional[Set[str]]]]
+
+# (table, id, السجل أو التحديث, inserted) - كتابة أُسقطت بعد max_attempts
+DropFn = Callable[[str, str, Row, bool], None]
+
+
+class _Pending:
+    """ما ينتظر الكتابة لجدول واحد"""
+
+    def __init__(self):
+        self.inserts: Dict[str, Row] = {}
+        self.updates: Dict[str, Row] = {}
+
+    def __len__(self) -> int:
+        return len(self.inserts) + len(self.updates)
+
+    def subset(self, row_ids: Set[str]) -> "_Pending":
+        part = _Pending()
+        part.inserts = {row_id: row for row_id, row in self.inserts.items() if row_id in row_ids}
+        part.updates = {row_id: row for row_id, row in self.updates.items() if row_id in row_ids}
+        return part
+
+    def absorb(self, older: "_Pending"):
+        """إضافة صفوف أقدم - الموجود هنا أحدث ويفوز"""
+
+        for kind in ("inserts", "updates"):
+            target = getattr(self, kind)
+            for row_id, row in getattr(older, kind).items():
+                target[row_id] = {**row, **target.get(row_id, {})}
+
+        # تحديث وصل لسجل لم تُكتب إضافته بعد - يدخل في الإضافة
+        for row_id in list(self.updates):
+            if row_id in self.inserts:
+                self.inserts[row_id].update(self.updates.pop(row_id))
+
+
+class WriteBehindBuffer:
+    """
+    يجمع الكتابات في الذاكرة ويرسلها دفعة واحدة
+
+    - الإضافة ثم التحديث لنفس السجل قبل الإرسال = إضافة واحدة بالقيم النهائية
+    - عدة تحديثات لنفس السجل = تحديث واحد
+    - الإرسال عند batch_size أو كل flush_interval ثانية (أيهما أولاً)
+    - عند امتلاء max_pending ينتظر المستدعي حتى يفرغ مكان (backpressure)
+    - close() يرسل كل المتبقي قبل الإغلاق
+    - الصفوف الفاشلة فقط تُعاد (flush ترجع ids الفاشلة) بعد انتظار يتضاعف
+      مع كل محاولة (retry_base ثم 2x ...)، وتسقط بعد max_attempts
+    - on_drop: يُستدعى لكل كتابة أُسقطت بعد max_attempts
+    """
+
+    def __init__(
+        self,
+        flush: FlushFn,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_pending: int = 5000,
+        max_attempts: int = 3,
+        retry_base: float = 0.5,
+        on_drop: Optional[DropFn] = None
+    ):
+        self._flush_fn = flush
+        self._on_drop = on_drop
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+
+        self._pending: Dict[str, _Pending] = {}
+        # الدفعة الجاري إرسالها - تظل مرئية للقراءة حتى تكتمل
+        self._in_flight: Dict[str, _Pending] = {}
+        self._attempts: Dict[Tuple[str, str], int] = {}
+        # الصفوف الفاشلة تنتظر هنا حتى _retry_at ثم ترجع لـ pending
+        self._backoff: Dict[str, _Pending] = {}
+        self._retry_at = 0.0
+
+        self._flush_lock = asyncio.Lock()
+        self._space = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """إيقاف المؤقت وإرسال كل ما تبقى"""
+
+        # بدون cancel - الدفعة الجارية تكتمل ولا تضيع في المنتصف
+        self._closing = True
+        self._wake.set()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        # الفاشل يرجع بعد الانتظار ويسقط بعد max_attempts - الحلقة تنتهي دائماً
+        while self.pending_count():
+            if not self._ready_count():
+                await asyncio.sleep(max(self._retry_at - time.monotonic(), 0))
+            await self.flush()
+
+    # =====================================
+    # الإضافة
+    # =====================================
+
+    async def insert(self, table: str, row_id: str, row: Row):
+        await self._reserve()
+        self._table(table).inserts[row_id] = row
+        self._after_put()
+
+    async def update(self, table: str, row_id: str, updates: Row):
+        pending = self._table(table)
+        if row_id in pending.inserts:
+            # لم يُرسل بعد - التحديث يدخل في نفس الإضافة
+            pending.inserts[row_id].update(updates)
+            return
+
+        if row_id not in pending.updates:
+            await self._reserve()
+        pending.updates.setdefault(row_id, {}).update(updates)
+        self._after_put()
+
+    def _table(self, table: str) -> _Pending:
+        return self._pending.setdefault(table, _Pending())
+
+    async def _reserve(self):
+        if self.pending_count() < self.max_pending:
+            return
+        self._wake.set()
+        async with self._space:
+            await self._space.wait_for(lambda: self.pending_count() < self.max_pending)
+
+    def _after_put(self):
+        if self._ready_count() >= self.batch_size:
+            self._wake.set()
+
+    # =====================================
+    # القراءة (read-your-writes)
+    # =====================================
+
+    def unwritten(self, table: str, row_id: Optional[str] = None) -> Tuple[Dict[str, Row], Dict[str, Row]]:
+        """
+        نسخة مما لم يُكتب بعد (معلق + جاري إرساله): (inserts, updates)
+
+        القراءة تأخذ النسخة قبل الاستعلام: دفعة تكتمل أثناء الاستعلام
+        تظل في النسخة حتى لو لم يرها الاستعلام
+        """
+
+        inserts: Dict[str, Row] = {}
+        updates: Dict[str, Row] = {}
+        # من الأقدم للأحدث: المنتظر بعد فشل، ثم الجاري إرساله، ثم المعلق
+        for batches in (self._backoff, self._in_flight, self._pending):
+            pending = batches.get(table)
+            if pending is None:
+                continue
+            if row_id is None:
+                inserts.update((key, dict(row)) for key, row in pending.inserts.items())
+                for key, fields in pending.updates.items():
+                    updates.setdefault(key, {}).update(fields)
+            else:
+                if row_id in pending.inserts:
+                    inserts[row_id] = dict(pending.inserts[row_id])
+                if row_id in pending.updates:
+                    updates.setdefault(row_id, {}).update(pending.updates[row_id])
+        return inserts, updates
+
+    def pending_count(self) -> int:
+        """كل ما لم يُرسل بعد (بما فيه المنتظر بعد فشل) - للـ backpressure"""
+        return self._ready_count() + sum(len(pending) for pending in self._backoff.values())
+
+    def _ready_count(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def has_unwritten(self) -> bool:
+        """معلق أو جاري إرساله - القراءة تحتاج الدمج"""
+        return bool(self.pending_count() or self._in_flight)
+
+    # =====================================
+    # الإرسال
+    # =====================================
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """إرسال كل الموجود الآن - دفعة لكل جدول"""
+
+        async with self._flush_lock:
+            self._release_backoff()
+            if not self._ready_count():
+                return
+
+            self._in_flight, self._pending = self._pending, {}
+            try:
+                for table, batch in self._in_flight.items():
+                    if not batch:
+                        continue
+                    try:
+                        failed = await self._flush_fn(table, list(batch.inserts.values()), batch.updates) or set()
+                        failed &= {*batch.inserts, *batch.updates}
+                    except Exception as e:
+                        logger.error(f"❌ Error flushing {len(batch)} {table} writes: {e}")
+                        failed = {*batch.inserts, *batch.updates}
+
+                    written = len(batch) - len(failed)
+                    if written:
+                        DB_WRITE_BATCHES.inc(table=table)
+                        DB_WRITE_ROWS.inc(written, table=table)
+                    self._forget(table, batch, failed)
+                    if failed:
+                        self._requeue(table, batch.subset(failed))
+            finally:
+                self._in_flight = {}
+
+        async with self._space:
+            self._space.notify_all()
+
+    def _forget(self, table: str, batch: _Pending, failed: Set[str]):
+        if self._attempts:
+            for row_id in (*batch.inserts, *batch.updates):
+                if row_id not in failed:
+                    self._attempts.pop((table, row_id), None)
+
+    def _requeue(self, table: str, batch: _Pending):
+        """الصفوف الفاشلة تنتظر retry_base * 2^(المحاولة - 1) ثم ترجع لـ pending"""
+
+        backoff = self._backoff.setdefault(table, _Pending())
+        attempt = 0
+        for kind, rows in (("inserts", batch.inserts), ("updates", batch.updates)):
+            target = getattr(backoff, kind)
+            for row_id, row in rows.items():
+                key = (table, row_id)
+                self._attempts[key] = self._attempts.get(key, 0) + 1
+                if self._attempts[key] >= self.max_attempts:
+                    logger.error(f"❌ Dropping {table} write {row_id} after {self.max_attempts} attempts")
+                    DB_WRITE_DROPPED.inc(table=table)
+                    self._attempts.pop(key)
+                    self._dropped(table, row_id, row, kind == "inserts")
+                    continue
+                target[row_id] = row
+                attempt = max(attempt, self._attempts[key])
+
+        if attempt:
+            delay = self.retry_base * 2 ** (attempt - 1)
+            self._retry_at = max(self._retry_at, time.monotonic() + delay)
+            logger.warning(f"⏳ Retrying {len(backoff)} {table} writes in {delay:.1f}s")
+
+    def _release_backoff(self):
+        """الصفوف التي انتهى انتظارها ترجع لـ pending - ما أضيف بعدها أحدث ويفوز"""
+
+        if not self._backoff or time.monotonic() < self._retry_at:
+            return
+        for table, failed in self._backoff.items():
+            self._table(table).absorb(failed)
+        self._backoff = {}
+
+    def _dropped(self, table: str, row_id: str, row: Row, inserted: bool):
+        if self._on_drop is None:
+            return
+        try:
+            self._on_drop(table, row_id, row, inserted)
+        except Exception as e:
+            logger.error(f"❌ Error in drop callback for {table} {row_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        tables = {}
+        for (table,), batches in DB_WRITE_BATCHES.values().items():
+            rows = DB_WRITE_ROWS.value(table=table)
+            tables[table] = {
+                "batches": int(batches),
+                "rows": int(rows),
+                "avg_batch": round(rows / batches, 1) if batches else 0.0,
+                "dropped": int(DB_WRITE_DROPPED.value(table=table))
+            }
+
+        return {
+            "pending": self.pending_count(),
+            "retrying": sum(len(pending) for pending in self._backoff.values()),
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "max_pending": self.max_pending,
+            "tables": tables
+        }
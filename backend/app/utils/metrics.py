@@ -0,0 +1,388 @@
+"""
+مقاييس الأداء
+In-process metrics: counters, gauges and latency histograms (Prometheus text format)
+"""
+
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# حدود الـ buckets بالثواني - من 5ms حتى 30s لتغطية Groq / OpenRouter / Edge TTS
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# عدد آخر العينات المحفوظة لكل سلسلة لحساب p50 / p95 / p99
+RESERVOIR_SIZE = int(os.getenv("METRICS_RESERVOIR_SIZE", "2048"))
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.extend(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def quantile(sorted_samples: Sequence[float], q: float) -> float:
+    """quantile بأقرب رتبة من عينات مرتبة"""
+
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(q * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+class _Metric(ABC):
+    """أساس مشترك: اسم + وصف + labels"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+            *self._samples()
+        ]
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """أسطر القيم بصيغة Prometheus"""
+
+
+class Counter(_Metric):
+    """عداد تصاعدي فقط"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def values(self) -> Dict[LabelValues, float]:
+        return dict(self._values)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """قيمة تزيد وتنقص (مثل الطلبات الجارية)"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        self._values[self._key(labels)] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def values(self) -> Dict[LabelValues, float]:
+        return dict(self._values)
+
+    @contextmanager
+    def track_in_progress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class _HistogramSeries:
+    """سلسلة واحدة: buckets تراكمية + عينات حديثة للـ percentiles"""
+
+    def __init__(self, bucket_count: int):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+        self.samples: Deque[float] = deque(maxlen=RESERVOIR_SIZE)
+
+
+class Histogram(_Metric):
+    """
+    توزيع زمن الاستجابة
+
+    Prometheus يحصل على buckets تراكمية (لـ histogram_quantile)،
+    و summary() يحسب p50 / p95 / p99 من آخر RESERVOIR_SIZE عينة
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _HistogramSeries(len(self.buckets))
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series.bucket_counts[i] += 1
+                break
+        series.count += 1
+        series.sum += value
+        series.samples.append(value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """قياس زمن تنفيذ block (يُسجل حتى لو حصل خطأ)"""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """count / avg / p50 / p95 / p99 / max بالملي ثانية لكل سلسلة"""
+
+        result = {}
+        for key, series in sorted(self._series.items()):
+            samples = sorted(series.samples)
+            label = ",".join(key) or self.name
+            result[label] = {
+                "count": series.count,
+                "avg_ms": round(series.sum / series.count * 1000, 2) if series.count else 0.0,
+                "p50_ms": round(quantile(samples, 0.50) * 1000, 2),
+                "p95_ms": round(quantile(samples, 0.95) * 1000, 2),
+                "p99_ms": round(quantile(samples, 0.99) * 1000, 2),
+                "max_ms": round(samples[-1] * 1000, 2) if samples else 0.0
+            }
+        return result
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series.bucket_counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, {"le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, {"le": "+Inf"})
+            lines.append(f"{self.name}_bucket{labels} {series.count}")
+            base = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{base} {_format_value(series.sum)}")
+            lines.append(f"{self.name}_count{base} {series.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """كل المقاييس المسجلة في الـ process"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self.started_at = time.time()
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """كل المقاييس بصيغة Prometheus text exposition 0.0.4"""
+
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# =====================================
+# المقاييس المشتركة
+# =====================================
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+REGISTRY = MetricsRegistry()
+
+# مراحل handle-incoming: settings, stt, history, llm, tts, total
+CALL_STAGE_SECONDS = REGISTRY.histogram(
+    "call_stage_duration_seconds",
+    "Latency of each stage of handling an incoming call",
+    ["stage"]
+)
+
+CALLS_TOTAL = REGISTRY.counter(
+    "calls_total",
+    "Incoming calls handled, by outcome",
+    ["status"]
+)
+
+CALLS_IN_FLIGHT = REGISTRY.gauge(
+    "calls_in_flight",
+    "Incoming calls currently being processed"
+)
+
+UPSTREAM_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "upstream_requests_in_flight",
+    "Requests currently waiting on an upstream API",
+    ["upstream"]
+)
+
+UPSTREAM_ERRORS_TOTAL = REGISTRY.counter(
+    "upstream_errors_total",
+    "Failed requests to upstream APIs",
+    ["upstream"]
+)
+
+# استعلامات Supabase (تشمل انتظار دور في الـ executor)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds",
+    "Latency of Supabase queries by operation",
+    ["operation"]
+)
+
+# الكتابة المؤجلة: عدد الدفعات والسجلات (السجلات / الدفعات = متوسط حجم الدفعة)
+DB_WRITE_BATCHES = REGISTRY.counter(
+    "db_write_batches_total",
+    "Write-behind batches flushed by table",
+    ["table"]
+)
+
+DB_WRITE_ROWS = REGISTRY.counter(
+    "db_write_rows_total",
+    "Rows written through the write-behind buffer by table",
+    ["table"]
+)
+
+DB_WRITE_DROPPED = REGISTRY.counter(
+    "db_write_dropped_total",
+    "Buffered writes dropped after repeated flush failures",
+    ["table"]
+)
+
+SETTINGS_CACHE_LOOKUPS = REGISTRY.counter(
+    "settings_cache_lookups_total",
+    "User-settings cache lookups by result (hit, miss)",
+    ["result"]
+)
+
+# كاش Edge TTS
+TTS_CACHE_LOOKUPS = REGISTRY.counter(
+    "tts_cache_lookups_total",
+    "TTS cache lookups by result (memory_hit, disk_hit, miss)",
+    ["result"]
+)
+
+TTS_CACHE_BYTES = REGISTRY.gauge(
+    "tts_cache_bytes",
+    "Audio bytes held by the TTS cache",
+    ["tier"]
+)
+
+
+@contextmanager
+def track_upstream(upstream: str) -> Iterator[None]:
+    """طلب لخدمة خارجية (groq / openrouter / edge_tts / supabase): gauge جاري + عداد أخطاء"""
+
+    UPSTREAM_REQUESTS_IN_FLIGHT.inc(upstream=upstream)
+    try:
+        yield
+    except BaseException as e:
+        # الإلغاء (barge-in / قطع الاتصال) ليس خطأ من الخدمة الخارجية
+        if isinstance(e, Exception):
+            UPSTREAM_ERRORS_TOTAL.inc(upstream=upstream)
+        raise
+    finally:
+        UPSTREAM_REQUESTS_IN_FLIGHT.dec(upstream=upstream)
+
+
+def metrics_summary() -> Dict[str, object]:
+    """ملخص للـ /api/status"""
+
+    stages = CALL_STAGE_SECONDS.summary()
+    total = stages.get("total")
+
+    return {
+        "uptime_seconds": int(time.time() - REGISTRY.started_at),
+        "calls": {status: int(value) for (status,), value in CALLS_TOTAL.values().items()},
+        "calls_in_flight": int(CALLS_IN_FLIGHT.value()),
+        "avg_response_time": f"{total['avg_ms'] / 1000:.2f}s" if total else None,
+        "stages": stages,
+        "database": DB_QUERY_SECONDS.summary(),
+        "upstream": {
+            upstream: {
+                "in_flight": int(UPSTREAM_REQUESTS_IN_FLIGHT.value(upstream=upstream)),
+                "errors": int(UPSTREAM_ERRORS_TOTAL.value(upstream=upstream))
+            }
+            for upstream in ("groq", "openrouter", "edge_tts", "supabase")
+        }
+    }
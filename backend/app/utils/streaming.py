@@ -0,0 +1,37 @@
+"""
+أدوات الردود المتدفقة
+Helpers for forwarding audio streams to HTTP clients
+"""
+
+import logging
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+async def prime_stream(
+    chunks: AsyncIterator[bytes],
+    prefix: Optional[bytes] = None
+) -> AsyncIterator[bytes]:
+    """
+    انتظار أول chunk قبل بدء الرد
+
+    الفشل قبل أول byte (Edge TTS لا يرد مثلاً) يظهر كخطأ عادي يتحول لـ 500،
+    بدلاً من رد 200 بجسم فارغ بعد إرسال الـ headers.
+    prefix (مقطع تفكير مثلاً) يُرسل قبل أول chunk
+    """
+
+    first = await chunks.__anext__()
+
+    async def forward() -> AsyncIterator[bytes]:
+        if prefix:
+            yield prefix
+        yield first
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            # الـ headers أُرسلت بالفعل - العميل يستقبل صوتاً مقطوعاً
+            logger.error(f"❌ Audio stream interrupted: {e}")
+
+    return forward()
@@ -0,0 +1,89 @@
+"""
+حد حجم الرفع
+Streaming upload size guard (ASGI middleware)
+"""
+
+import json
+import logging
+from typing import Iterable
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLarge(HTTPException):
+    """
+    الطلب تجاوز الحد المسموح
+
+    HTTPException حتى لا يحولها FastAPI لخطأ 400 أثناء قراءة الـ form
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Audio upload exceeds {max_bytes} bytes")
+
+
+class UploadSizeLimitMiddleware:
+    """
+    يرفض الرفع الأكبر من max_bytes قبل تخزينه في الذاكرة
+
+    - لو Content-Length أكبر من الحد: 413 فوراً بدون قراءة الجسم
+    - لو الجسم chunked: العد يتم أثناء الاستقبال ويتوقف عند تجاوز الحد
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            logger.warning(f"⛔ Upload rejected by Content-Length ({int(content_length)} bytes): {scope['path']}")
+            await self._send_413(send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLarge(self.max_bytes)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLarge:
+            logger.warning(f"⛔ Upload exceeded {self.max_bytes} bytes while streaming: {scope['path']}")
+            if not response_started:
+                await self._send_413(send)
+
+    async def _send_413(self, send):
+        body = json.dumps({
+            "detail": f"Audio upload exceeds {self.max_bytes} bytes"
+        }).encode("utf-8")
+
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,183 @@
+"""
+قياس سرعة التحليلات على عدد كبير من المكالمات
+Analytics micro-benchmark: the per-list code the reports used before
+(max(set(x), key=x.count) for the peak hour, list.count per emotion,
+fromisoformat per call, one daily report per day) against the shared
+CallHistogram counters - per-call and numpy.bincount - and the weekly
+ReportEngine built on them.
+
+The histograms fill all six dimensions (hour, weekday, emotion, status,
+priority, duration) plus sentiment in the same pass, the legacy rows only
+what they print.
+
+Every variant runs on the same synthetic calls (stats view shape) and the
+results are cross-checked before timing, so a faster but wrong path fails.
+
+Usage (from backend/):
+    python -m benchmarks.analytics
+    python -m benchmarks.analytics --calls 100000 --days 7 --repeat 5 --json analytics.json
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from app.models.schemas import CallStatus, EmotionType
+from app.services.analytics import EMOTION, HOUR, CallHistogram, call_codes
+from app.services.report_engine import ReportEngine
+
+PRIORITIES = ("low", "medium", "high", "urgent")
+FOLLOW_UPS = ("الرد على الرسالة", "تأكيد الموعد", "إرسال العرض", "معاودة الاتصال")
+
+
+def make_calls(count: int, days: int, seed: int) -> List[Dict[str, Any]]:
+    """مكالمات بشكل view="stats" موزعة على آخر days يوم"""
+
+    rnd = random.Random(seed)
+    end = datetime(2024, 1, 15)
+    statuses = [status.value for status in CallStatus]
+    emotions = [emotion.value for emotion in EmotionType]
+    calls = []
+    for i in range(count):
+        start = end - timedelta(seconds=rnd.randint(0, days * 86400 - 1))
+        calls.append({
+            "id": f"call_{i}",
+            "caller_phone": f"+2010{rnd.randint(0, 500):07d}",
+            "caller_name": f"متصل {i % 500}",
+            "status": rnd.choice(statuses),
+            "duration_seconds": rnd.randint(0, 900),
+            "created_at": start.isoformat(),
+            "start_time": start.isoformat(),
+            "caller_emotion": rnd.choice(emotions),
+            "caller_sentiment_score": round(rnd.uniform(-1, 1), 2),
+            "priority_level": rnd.choice(PRIORITIES),
+            "follow_up_suggestions": rnd.sample(FOLLOW_UPS, rnd.randint(0, 2))
+        })
+    return calls
+
+
+# =====================================
+# التنفيذ القديم (للمقارنة فقط)
+# =====================================
+
+def legacy(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    emotions = [c.get("caller_emotion", "neutral") for c in calls]
+    emotion_breakdown = {emotion: emotions.count(emotion) for emotion in set(emotions)}
+    call_hours = [datetime.fromisoformat(c.get("start_time")).hour for c in calls]
+    peak_hour = max(set(call_hours), key=call_hours.count)
+    return {"peak_calls": call_hours.count(peak_hour), "emotion_breakdown": emotion_breakdown}
+
+
+def legacy_weekly(calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """تجميع حسب اليوم ثم تقرير يومي لكل يوم - كل مقياس مرور منفصل"""
+
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for call in calls:
+        by_day.setdefault(call["created_at"][:10], []).append(call)
+
+    reports = []
+    for day_calls in by_day.values():
+        follow_ups = []
+        for call in day_calls:
+            follow_ups.extend(call.get("follow_up_suggestions", []))
+        reports.append({
+            "answered": len([c for c in day_calls if c.get("status") == "completed"]),
+            "missed": len([c for c in day_calls if c.get("status") == "missed"]),
+            "duration": sum(c.get("duration_seconds", 0) for c in day_calls),
+            "urgent": [c for c in day_calls if c.get("priority_level") == "urgent"][:5],
+            "follow_ups": list(set(follow_ups)),
+            "positive": len([c for c in day_calls if c.get("caller_sentiment_score", 0) > 0.3]),
+            **legacy(day_calls)
+        })
+    return reports
+
+
+def counters(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    histogram = CallHistogram()
+    for call in calls:
+        histogram.add(call_codes(call), call.get("duration_seconds") or 0, call.get("caller_sentiment_score"))
+    return {"peak_calls": max(histogram.histogram(HOUR)), "emotion_breakdown": histogram.breakdown(EMOTION)}
+
+
+def bincount(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    histogram = CallHistogram.grouped(
+        [0] * len(calls),
+        [call_codes(call) for call in calls],
+        [call.get("duration_seconds") or 0 for call in calls],
+        [call.get("caller_sentiment_score") for call in calls],
+        1
+    )[0]
+    return {"peak_calls": max(histogram.histogram(HOUR)), "emotion_breakdown": histogram.breakdown(EMOTION)}
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(args: argparse.Namespace) -> int:
+    calls = make_calls(args.calls, args.days, args.seed)
+    week = sorted({call["created_at"][:10] for call in calls})
+
+    # الكل يجب أن يعطي نفس النتيجة قبل المقارنة
+    expected = legacy(calls)
+    for name, fn in (("counters", counters), ("bincount", bincount)):
+        # عند التساوي القديم يختار أي ساعة من الأكثر - نقارن عدد مكالماتها وليس الساعة
+        if fn(calls) != expected:
+            print(f"❌ FAIL: {name} peak hour / emotion breakdown differ from the legacy code")
+            return 1
+
+    serial = ReportEngine(numpy_min_calls=args.calls + 1)
+    vectorized = ReportEngine(numpy_min_calls=1)
+    if json.dumps(serial.build("bench", calls, week), default=str) != json.dumps(vectorized.build("bench", calls, week), default=str):
+        print("❌ FAIL: ReportEngine counters and numpy paths disagree")
+        return 1
+
+    rows = {
+        "legacy peak hour+emotions": best_of(lambda: legacy(calls), args.repeat),
+        "legacy weekly report": best_of(lambda: legacy_weekly(calls), args.repeat),
+        "CallHistogram.add": best_of(lambda: counters(calls), args.repeat),
+        "CallHistogram.grouped": best_of(lambda: bincount(calls), args.repeat),
+        "weekly report (counters)": best_of(lambda: serial.build("bench", calls, week), args.repeat),
+        "weekly report (numpy)": best_of(lambda: vectorized.build("bench", calls, week), args.repeat)
+    }
+
+    print(f"\n{args.calls} calls over {len(week)} days, best of {args.repeat}")
+    print(f"{'variant':<28}{'ms':>10}{'µs/call':>10}")
+    for name, seconds in rows.items():
+        print(f"{name:<28}{seconds * 1000:>10.1f}{seconds * 1e6 / args.calls:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "calls": args.calls,
+                "days": len(week),
+                "repeat": args.repeat,
+                "ms": {name: round(seconds * 1000, 2) for name, seconds in rows.items()}
+            }, f, indent=2)
+        print(f"\n💾 Saved: {args.json}")
+
+    print("✅ OK")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write the timings to this file")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
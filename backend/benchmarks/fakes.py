@@ -0,0 +1,214 @@
+"""
+خوادم محلية بديلة للخدمات الخارجية
+Local stand-in servers for upstream APIs (benchmarks only)
+"""
+
+import json
+import asyncio
+import random
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from aiohttp import WSMsgType, web
+
+
+class FakeUpstream(ABC):
+    """خادم aiohttp محلي بزمن استجابة قابل للتحكم"""
+
+    def __init__(self, latency_ms: float = 300.0, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @abstractmethod
+    def build_app(self) -> web.Application:
+        """الـ routes الخاصة بكل خدمة"""
+
+    async def start(self) -> "FakeUpstream":
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _simulate(self):
+        """تأخير + حقن أخطاء - ترجع True لو يجب إرجاع خطأ"""
+
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+            await asyncio.sleep(max(delay, 0) / 1000)
+        finally:
+            self.in_flight -= 1
+        return random.random() < self.error_rate
+
+
+class FakeGroq(FakeUpstream):
+    """يحاكي POST /audio/transcriptions من Groq (verbose_json)"""
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_post("/openai/v1/audio/transcriptions", self.transcribe)
+        return app
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.base_url}/openai/v1"
+
+    async def transcribe(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        audio = form.get("file")
+        size = len(audio.file.read()) if audio is not None else 0
+
+        if await self._simulate():
+            return web.json_response({"error": {"message": "injected failure"}}, status=503)
+
+        return web.json_response({
+            "text": "أهلاً، أنا كنت عايز أسأل على ميعاد بكرة",
+            "language": form.get("language", "arabic"),
+            "duration": round(size / 32000, 2),
+            "segments": [
+                {"start": 0.0, "end": 2.0, "text": "أهلاً، أنا كنت عايز أسأل على ميعاد بكرة"}
+            ]
+        })
+
+
+class FakeOpenRouter(FakeUpstream):
+    """
+    يحاكي POST /chat/completions من OpenRouter
+
+    latency_ms هو الزمن حتى أول token، والباقي يصل بمعدل tokens_per_second
+    عند stream=true (SSE) - أو دفعة واحدة في الرد العادي
+    """
+
+    REPLY = "أهلاً بيك، أنا مش فاضي دلوقتي. هكلمك كمان شوية عشان نتكلم على الموعد. سلام!"
+
+    def __init__(self, tokens_per_second: float = 80.0, **kwargs):
+        super().__init__(**kwargs)
+        self.tokens_per_second = tokens_per_second
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/v1/chat/completions", self.chat)
+        return app
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.base_url}/api/v1"
+
+    def _tokens(self):
+        # كلمة + مسافة لكل token تقريباً
+        words = self.REPLY.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+
+        if await self._simulate():
+            return web.json_response({"error": {"message": "injected failure"}}, status=503)
+
+        tokens = self._tokens()
+        usage = {"prompt_tokens": 200, "completion_tokens": len(tokens), "total_tokens": 200 + len(tokens)}
+
+        if not body.get("stream"):
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            return web.json_response({
+                "choices": [{"message": {"role": "assistant", "content": "".join(tokens)}}],
+                "usage": usage
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+
+        for token in tokens:
+            chunk = {"choices": [{"delta": {"content": token}}]}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+        await response.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+class FakeEdgeTTS(FakeUpstream):
+    """
+    يحاكي websocket الخاص بـ Edge TTS (speech.platform.bing.com)
+
+    يستقبل speech.config ثم ssml ويرد بـ turn.start ثم audio ثم turn.end.
+    edge_tts يقرأ العنوان من edge_tts.communicate.WSS_URL - استخدم install()
+    """
+
+    PATH = "/consumer/speech/synthesize/readaloud/edge/v1"
+
+    def __init__(self, audio_bytes_per_char: int = 400, **kwargs):
+        super().__init__(**kwargs)
+        self.audio_bytes_per_char = audio_bytes_per_char
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(self.PATH, self.synthesize)
+        return app
+
+    @property
+    def wss_url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}{self.PATH}?TrustedClientToken=benchmark"
+
+    def install(self):
+        """توجيه edge_tts للخادم المحلي"""
+        import edge_tts.communicate
+
+        edge_tts.communicate.WSS_URL = self.wss_url
+
+    async def synthesize(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async for message in ws:
+            if message.type != WSMsgType.TEXT or "Path:ssml" not in message.data:
+                continue
+
+            request_id = message.data.split("X-RequestId:", 1)[-1].split("\r\n", 1)[0]
+            ssml = message.data.split("\r\n\r\n", 1)[-1]
+
+            if await self._simulate():
+                # بدون صوت - edge_tts يرفع NoAudioReceived
+                await ws.close()
+                break
+
+            await ws.send_str(self._text_message(request_id, "turn.start", "{}"))
+
+            # MP3 وهمي بحجم يتناسب مع طول النص، على دفعات مثل الخدمة الحقيقية
+            audio = b"\xff\xf3" + b"\0" * (len(ssml) * self.audio_bytes_per_char)
+            header = f"X-RequestId:{request_id}\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n".encode()
+            for offset in range(0, len(audio), 4096):
+                await ws.send_bytes(len(header).to_bytes(2, "big") + header + audio[offset:offset + 4096])
+
+            await ws.send_str(self._text_message(request_id, "turn.end", "{}"))
+
+        return ws
+
+    def _text_message(self, request_id: str, path: str, body: str) -> str:
+        return (
+            f"X-RequestId:{request_id}\r\n"
+            "Content-Type:application/json; charset=utf-8\r\n"
+            f"Path:{path}\r\n\r\n"
+            f"{body}"
+        )
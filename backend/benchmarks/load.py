@@ -0,0 +1,360 @@
+"""
+اختبار حمل شامل للـ backend
+End-to-end load benchmark: the real FastAPI app served by uvicorn on a local
+port, wired to local fakes for Groq, OpenRouter (incl. SSE) and Edge TTS.
+
+Drives /api/calls/handle-incoming, /api/messages/handle and /api/reports/*
+at a target concurrency and prints throughput and latency percentiles per
+endpoint, plus the server-side stage breakdown from /api/status.
+
+The app, the fakes and the load generator share one event loop, so absolute
+numbers are pessimistic - compare runs against each other, not against prod.
+
+Usage (from backend/):
+    python -m benchmarks.load --concurrency 20 --duration 30
+    python -m benchmarks.load --mix calls=6,messages=3,reports=1 --error-rate 0.02
+    python -m benchmarks.load --requests 500 --max-p95-ms 2500 --json result.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import base64
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fakes import FakeEdgeTTS, FakeGroq, FakeOpenRouter
+
+# 2 ثانية PCM 16kHz mono - نفس حجم جملة قصيرة من المتصل
+CALLER_AUDIO = base64.b64encode(b"\0" * 64000).decode()
+
+REPORT_PATHS = ("daily", "weekly", "stats")
+
+
+class LoadStats:
+    """زمن كل طلب وأخطاؤه مجمعة حسب الـ endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+    def record(self, name: str, seconds: float, status_code: Optional[int]):
+        self.latencies[name].append(seconds)
+        self.status_codes[name][status_code or 0] += 1
+        if status_code is None or status_code >= 400:
+            self.errors[name] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        from app.utils.metrics import quantile
+
+        wall = max(self.finished_at - self.started_at, 1e-9)
+        endpoints = {}
+        all_samples: List[float] = []
+
+        for name, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            all_samples.extend(ordered)
+            endpoints[name] = {
+                "requests": len(ordered),
+                "errors": self.errors[name],
+                "throughput_rps": round(len(ordered) / wall, 2),
+                "p50_ms": round(quantile(ordered, 0.50) * 1000, 1),
+                "p95_ms": round(quantile(ordered, 0.95) * 1000, 1),
+                "p99_ms": round(quantile(ordered, 0.99) * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+                "status_codes": dict(self.status_codes[name])
+            }
+
+        all_samples.sort()
+        total = len(all_samples)
+        errors = sum(self.errors.values())
+
+        return {
+            "wall_seconds": round(wall, 2),
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "throughput_rps": round(total / wall, 2),
+            "p50_ms": round(quantile(all_samples, 0.50) * 1000, 1),
+            "p95_ms": round(quantile(all_samples, 0.95) * 1000, 1),
+            "p99_ms": round(quantile(all_samples, 0.99) * 1000, 1),
+            "endpoints": endpoints
+        }
+
+
+# =====================================
+# السيناريوهات
+# =====================================
+
+def _user(i: int, users: int) -> str:
+    return f"bench_user_{i % users}"
+
+
+async def call_scenario(client: httpx.AsyncClient, i: int, users: int) -> httpx.Response:
+    return await client.post("/api/calls/handle-incoming", json={
+        "user_id": _user(i, users),
+        "caller_phone": f"+2010{i % 97:08d}",
+        "caller_name": "Benchmark",
+        "audio_data": CALLER_AUDIO
+    })
+
+
+async def message_scenario(client: httpx.AsyncClient, i: int, users: int) -> httpx.Response:
+    return await client.post("/api/messages/handle", json={
+        "user_id": _user(i, users),
+        "sender_phone": f"+2011{i % 97:08d}",
+        "message_text": "إزيك؟ فاضي نتكلم النهاردة؟",
+        "message_type": "text",
+        "platform": "whatsapp"
+    })
+
+
+async def report_scenario(client: httpx.AsyncClient, i: int, users: int) -> httpx.Response:
+    report = REPORT_PATHS[i % len(REPORT_PATHS)]
+    return await client.get(f"/api/reports/{report}/{_user(i, users)}")
+
+
+SCENARIOS: Dict[str, Callable[[httpx.AsyncClient, int, int], Awaitable[httpx.Response]]] = {
+    "calls": call_scenario,
+    "messages": message_scenario,
+    "reports": report_scenario,
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """"calls=6,messages=3,reports=1" -> أوزان"""
+
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name} (choose from {', '.join(SCENARIOS)})")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+# =====================================
+# التشغيل
+# =====================================
+
+async def drive(
+    client: httpx.AsyncClient,
+    weights: Dict[str, float],
+    concurrency: int,
+    users: int,
+    duration: Optional[float],
+    requests: Optional[int],
+    seed: int
+) -> LoadStats:
+    """concurrency عامل متوازي يرسلون طلبات حتى انتهاء المدة أو العدد"""
+
+    stats = LoadStats()
+    rng = random.Random(seed)
+    names = list(weights)
+    weight_values = list(weights.values())
+    counter = 0
+    deadline = None
+
+    def next_request() -> Optional[tuple]:
+        nonlocal counter
+        if requests is not None and counter >= requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        counter += 1
+        return counter, rng.choices(names, weights=weight_values)[0]
+
+    async def worker():
+        while True:
+            item = next_request()
+            if item is None:
+                return
+            i, name = item
+            start = time.perf_counter()
+            try:
+                response = await SCENARIOS[name](client, i, users)
+                status_code = response.status_code
+            except httpx.HTTPError:
+                status_code = None
+            stats.record(name, time.perf_counter() - start, status_code)
+
+    stats.started_at = time.perf_counter()
+    if duration is not None:
+        deadline = stats.started_at + duration
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    stats.finished_at = time.perf_counter()
+
+    return stats
+
+
+async def start_server(app) -> tuple:
+    """uvicorn داخل نفس الـ process على port عشوائي"""
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"http://127.0.0.1:{port}"
+
+
+async def run(args: argparse.Namespace) -> int:
+    fake_kwargs = {"jitter_ms": args.jitter_ms, "error_rate": args.error_rate}
+    groq = await FakeGroq(latency_ms=args.stt_latency_ms, **fake_kwargs).start()
+    openrouter = await FakeOpenRouter(
+        latency_ms=args.llm_latency_ms,
+        tokens_per_second=args.llm_tokens_per_second,
+        **fake_kwargs
+    ).start()
+    edge = await FakeEdgeTTS(latency_ms=args.tts_latency_ms, **fake_kwargs).start()
+
+    # الخدمات تقرأ البيئة عند الاستيراد - لازم قبل استيراد app
+    os.environ.update({
+        "GROQ_API_KEY": "benchmark",
+        "GROQ_BASE_URL": groq.api_base,
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENROUTER_BASE_URL": openrouter.api_base,
+        "TEMP_AUDIO_DIR": tempfile.mkdtemp(prefix="bench_audio_"),
+    })
+    os.environ.pop("SUPABASE_URL", None)
+    edge.install()
+
+    from app.main import app
+
+    # سجلات التطبيق تغرق التقرير - نرفع المستوى لكل loggers الـ app
+    for name in list(logging.root.manager.loggerDict):
+        if name == "app" or name.startswith("app."):
+            logging.getLogger(name).setLevel(args.app_log_level.upper())
+
+    server, server_task, base_url = await start_server(app)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            if args.warmup:
+                print(f"🔥 Warm-up: {args.warmup} calls")
+                await drive(client, {"calls": 1}, args.concurrency, args.users, None, args.warmup, args.seed)
+
+            print(
+                f"🚀 Load: concurrency={args.concurrency} "
+                + (f"duration={args.duration}s" if args.requests is None else f"requests={args.requests}")
+                + f" mix={args.mix}"
+            )
+            stats = await drive(
+                client,
+                parse_mix(args.mix),
+                args.concurrency,
+                args.users,
+                None if args.requests is not None else args.duration,
+                args.requests,
+                args.seed
+            )
+
+            server_status = (await client.get("/api/status")).json()
+    finally:
+        server.should_exit = True
+        await server_task
+        for fake in (groq, openrouter, edge):
+            await fake.stop()
+
+    result = stats.summary()
+    result["server_stages"] = server_status.get("latency", {})
+    result["upstream"] = {
+        name: {"requests": fake.requests, "max_in_flight": fake.max_in_flight}
+        for name, fake in (("groq", groq), ("openrouter", openrouter), ("edge_tts", edge))
+    }
+
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Saved: {args.json}")
+
+    failed = False
+    if result["error_rate"] > args.max_error_rate:
+        print(f"❌ FAIL: error rate {result['error_rate']:.2%} > {args.max_error_rate:.2%}")
+        failed = True
+    if args.max_p95_ms is not None and result["p95_ms"] > args.max_p95_ms:
+        print(f"❌ FAIL: p95 {result['p95_ms']}ms > {args.max_p95_ms}ms")
+        failed = True
+
+    if failed:
+        return 1
+
+    print("✅ OK")
+    return 0
+
+
+def print_report(result: Dict[str, Any]):
+    print()
+    print(f"{'endpoint':<12}{'reqs':>8}{'errs':>7}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    rows = list(result["endpoints"].items()) + [("ALL", {
+        **result,
+        "max_ms": max((e["max_ms"] for e in result["endpoints"].values()), default=0.0)
+    })]
+    for name, row in rows:
+        print(
+            f"{name:<12}{row['requests']:>8}{row['errors']:>7}{row['throughput_rps']:>9}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}"
+        )
+
+    if result["server_stages"]:
+        print(f"\n{'server stage':<12}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for stage, row in result["server_stages"].items():
+            print(f"{stage:<12}{row['count']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+    print(f"\n{'upstream':<12}{'requests':>10}{'max in-flight':>15}")
+    for name, row in result["upstream"].items():
+        print(f"{name:<12}{row['requests']:>10}{row['max_in_flight']:>15}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    parser.add_argument("--mix", default="calls=6,messages=3,reports=1")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured calls before the run")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--app-log-level", default="critical", help="log level for the app under test")
+
+    upstream = parser.add_argument_group("fake upstreams")
+    upstream.add_argument("--stt-latency-ms", type=float, default=300.0)
+    upstream.add_argument("--llm-latency-ms", type=float, default=500.0, help="time to first token")
+    upstream.add_argument("--llm-tokens-per-second", type=float, default=80.0)
+    upstream.add_argument("--tts-latency-ms", type=float, default=250.0)
+    upstream.add_argument("--jitter-ms", type=float, default=50.0)
+    upstream.add_argument("--error-rate", type=float, default=0.0, help="injected failure rate per upstream")
+
+    gates = parser.add_argument_group("pass / fail")
+    gates.add_argument("--max-error-rate", type=float, default=0.01)
+    gates.add_argument("--max-p95-ms", type=float, default=None)
+    gates.add_argument("--json", help="write the full result to this file")
+
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+التحقق من أن تحويل الصوت لنص لا يوقف الـ event loop
+STT concurrency check: N parallel /handle-incoming requests against a slow
+fake Groq should finish in about one upstream latency, not N of them.
+
+Usage (from backend/):
+    python -m benchmarks.stt_concurrency --requests 10 --latency-ms 500
+"""
+
+import os
+import sys
+import time
+import base64
+import asyncio
+import argparse
+
+import httpx
+
+from benchmarks.fakes import FakeGroq
+
+
+async def run(requests: int, latency_ms: float, tolerance: float) -> int:
+    groq = await FakeGroq(latency_ms=latency_ms).start()
+    os.environ["GROQ_API_KEY"] = "benchmark"
+    os.environ["GROQ_BASE_URL"] = groq.api_base
+    # الحد الافتراضي للـ semaphore يقسم الطلبات لموجات - نرفعه لعزل أثر الـ event loop
+    os.environ["GROQ_MAX_CONCURRENCY"] = str(requests)
+
+    from app.main import app
+    from app.models.schemas import AIResponse, EmotionType
+    from app.services.container import ServiceContainer
+
+    # httpx ASGI client لا يشغل lifespan - الحاوية تُبنى هنا بدون التسخين
+    services = ServiceContainer()
+    app.state.services = services
+    ai, tts = services.ai, services.tts
+
+    # LLM و TTS فوريين - نقيس STT فقط
+    async def instant_reply(*args, **kwargs):
+        return AIResponse(text="تمام", emotion=EmotionType.NEUTRAL, confidence=1.0, thinking_time_ms=0)
+
+    async def instant_tts(*args, **kwargs):
+        return {"success": True, "audio_bytes": b""}
+
+    ai.analyze_and_respond = instant_reply
+    tts.text_to_speech = instant_tts
+
+    audio = base64.b64encode(b"\0" * 32000).decode()
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+        async def one(i: int) -> float:
+            start = time.perf_counter()
+            response = await client.post("/api/calls/handle-incoming", json={
+                "user_id": "bench_user",
+                "caller_phone": f"+2010000{i:05d}",
+                "audio_data": audio
+            })
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        durations = await asyncio.gather(*(one(i) for i in range(requests)))
+        wall = time.perf_counter() - start
+
+    await services.shutdown()
+    await groq.stop()
+
+    single = latency_ms / 1000
+    print(f"requests:          {requests}")
+    print(f"upstream latency:  {single:.3f}s")
+    print(f"wall time:         {wall:.3f}s")
+    print(f"slowest request:   {max(durations):.3f}s")
+    print(f"serial would take: {single * requests:.3f}s")
+    print(f"max in-flight at fake Groq: {groq.max_in_flight}")
+
+    if wall > single * tolerance:
+        print(f"❌ FAIL: wall time exceeds {tolerance}x the upstream latency")
+        return 1
+
+    print("✅ OK: transcriptions overlapped")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--tolerance", type=float, default=2.0,
+                        help="allowed wall time as a multiple of one upstream latency")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args.requests, args.latency_ms, args.tolerance)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+إعداد الاختبارات
+Shared fakes for the backend tests (no network, no API keys)
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ["SUPABASE_URL"] = ""
+os.environ["SUPABASE_KEY"] = ""
+os.environ.setdefault("DATABASE_BACKEND", "memory")
+
+from app.models.schemas import AIResponse, EmotionType  # noqa: E402
+
+
+class FakeAI:
+    """رد ثابت متدفق token بعد token"""
+
+    def __init__(self, reply: str = "أهلاً بيك، أنا معاك. قولي محتاج إيه بالظبط؟ "):
+        self.reply = reply
+
+    def detect_emotion(self, response_text: str, caller_text: str) -> EmotionType:
+        return EmotionType.NEUTRAL
+
+    async def analyze_and_respond_stream(self, *args, **kwargs) -> AsyncIterator[Union[str, AIResponse]]:
+        for word in self.reply.split(" "):
+            yield word + " "
+        yield AIResponse(text=self.reply, emotion=EmotionType.NEUTRAL, confidence=0.9, thinking_time_ms=0)
+
+
+class FakeTTS:
+    async def text_to_speech(self, text: str, **kwargs) -> Dict[str, Any]:
+        return {"success": True, "audio_bytes": b"ID3" + text.encode()}
+
+    def get_thinking_sound(self, *args, **kwargs) -> Optional[bytes]:
+        return None
+
+
+class FakeSTT:
+    def __init__(self):
+        self.uploads: List[bytes] = []
+
+    async def speech_to_text(self, audio_data, language=None, user_id=None) -> Dict[str, Any]:
+        self.uploads.append(bytes(audio_data))
+        return {"success": True, "text": "مرحبا"}
+
+
+class FakeServices:
+    """نفس شكل ServiceContainer بقاعدة بيانات حقيقية في الذاكرة"""
+
+    def __init__(self, db):
+        self.db = db
+        self.ai = FakeAI()
+        self.tts = FakeTTS()
+        self.stt = FakeSTT()
@@ -0,0 +1,125 @@
+"""جلسة المكالمة: النص الجزئي لنافذة محدودة من الصوت، والرد عند انقطاع الـ stream"""
+
+import asyncio
+import json
+from typing import Any, Dict, List
+
+from app.services.call_session import CallSession
+from tests.conftest import FakeAI, FakeSTT, FakeTTS
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+
+    async def send_json(self, data: Dict[str, Any]):
+        self.events.append(data)
+
+    async def send_bytes(self, data: bytes):
+        pass
+
+
+class FailingTokenWebSocket(FakeWebSocket):
+    """إرسال الـ tokens يفشل بعد أول جملة"""
+
+    def __init__(self, fail_after: int):
+        super().__init__()
+        self.fail_after = fail_after
+        self.tokens = 0
+
+    async def send_json(self, data: Dict[str, Any]):
+        if data["type"] == "llm_token":
+            self.tokens += 1
+            if self.tokens > self.fail_after:
+                raise RuntimeError("client went away")
+        await super().send_json(data)
+
+
+def make_session(monkeypatch, websocket=None, **env) -> CallSession:
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    return CallSession(
+        websocket=websocket or FakeWebSocket(),
+        call_id="call_1",
+        user_id="user_a",
+        caller_phone="+2010",
+        user_settings={"use_thinking_sounds": False},
+        ai_service=FakeAI(),
+        tts_service=FakeTTS(),
+        stt_service=FakeSTT()
+    )
+
+
+async def feed(session: CallSession, frames: List[bytes]):
+    for frame in frames:
+        await session._on_audio_frame(frame)
+        if session._partial_task:
+            await session._partial_task
+
+
+def test_partial_transcripts_use_trailing_window(monkeypatch):
+    async def scenario():
+        session = make_session(monkeypatch, WS_PARTIAL_TRANSCRIPT_BYTES="3200", WS_PARTIAL_WINDOW_SECONDS="0.5")
+        # 5 ثوانٍ PCM16 بـ 16kHz على frames من 100ms
+        await feed(session, [bytes(3200)] * 50)
+
+        partials = session.stt.uploads
+        assert len(partials) == 50
+        assert all(upload[:4] == b"RIFF" for upload in partials)
+        assert max(len(upload) for upload in partials) == 44 + 16000
+
+        await session._on_control_message(json.dumps({"type": "end_utterance"}))
+        await session._reply_task
+        final = session.stt.uploads[-1]
+        assert final[:4] == b"RIFF" and len(final) == 44 + 160000
+        assert session._buffer == bytearray()
+
+    asyncio.run(scenario())
+
+
+def test_encoded_audio_skips_partials_and_is_sent_as_is(monkeypatch):
+    async def scenario():
+        session = make_session(monkeypatch, WS_PARTIAL_TRANSCRIPT_BYTES="3200")
+        webm = b"\x1a\x45\xdf\xa3" + bytes(3196)
+        await feed(session, [webm] + [bytes(3200)] * 9)
+        assert session.stt.uploads == []
+
+        await session._on_control_message(json.dumps({"type": "end_utterance"}))
+        await session._reply_task
+        assert session.stt.uploads == [webm + bytes(28800)]
+
+    asyncio.run(scenario())
+
+
+def test_utterance_over_cap_is_dropped(monkeypatch):
+    async def scenario():
+        session = make_session(monkeypatch, WS_PARTIAL_TRANSCRIPT_BYTES="1000000", WS_MAX_UTTERANCE_BYTES="10000")
+        await feed(session, [bytes(3200)] * 4)
+
+        assert session._buffer == bytearray()
+        assert session.websocket.events[-1] == {"type": "error", "message": "Utterance too large"}
+
+    asyncio.run(scenario())
+
+
+def test_reply_ends_with_streamed_text_when_on_token_fails(monkeypatch):
+    async def scenario():
+        # "أهلاً بيك، أنا معاك." = أول 4 tokens
+        session = make_session(monkeypatch, websocket=FailingTokenWebSocket(fail_after=4))
+        turns = []
+
+        async def on_turn_complete(caller_text: str, response_text: str):
+            turns.append((caller_text, response_text))
+
+        session.on_turn_complete = on_turn_complete
+        await session._reply(text="السلام عليكم")
+
+        events = session.websocket.events
+        assert not [event for event in events if event["type"] == "error"]
+        end = events[-1]
+        assert end["type"] == "response_end"
+        assert end["text"] == "أهلاً بيك، أنا معاك. قولي"
+        assert [event["text"] for event in events if event["type"] == "audio"] == ["أهلاً بيك، أنا معاك.", "قولي"]
+        assert turns == [("السلام عليكم", "أهلاً بيك، أنا معاك. قولي")]
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+"""جلسة المكالمة الحية: سجل واحد لكل جلسة بـ id من الخادم"""
+
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import calls
+from app.services.container import get_services
+from app.services.database import DatabaseService
+from tests.conftest import FakeServices
+
+
+def make_client():
+    db = DatabaseService()
+    services = FakeServices(db)
+    app = FastAPI()
+    app.include_router(calls.router, prefix="/api/calls")
+    app.dependency_overrides[get_services] = lambda: services
+    return TestClient(app), services
+
+
+def run_session(client, user_id: str, call_id: str, turns):
+    """جلسة بأدوار نصية - ترجع call_id من حدث ready"""
+
+    with client.websocket_connect(f"/api/calls/ws/{call_id}?user_id={user_id}&caller_phone=%2B2010") as ws:
+        ready = ws.receive_json()
+        assert ready["type"] == "ready"
+        for text in turns:
+            ws.send_text(json.dumps({"type": "text", "text": text}))
+            while True:
+                message = ws.receive()
+                if message.get("text") and json.loads(message["text"])["type"] == "response_end":
+                    break
+        ws.send_text(json.dumps({"type": "hangup"}))
+    return ready["call_id"]
+
+
+def test_turns_share_one_call_row():
+    client, services = make_client()
+    with client:
+        record_id = run_session(client, "user_a", "call_123", ["السلام عليكم", "عايز أحجز موعد"])
+
+        history = client.get("/api/calls/history", params={"user_id": "user_a", "view": "full"}).json()
+        assert history["total"] == 1
+        assert history["calls"][0]["id"] == record_id
+        assert len(history["calls"][0]["conversation"]) == 4
+
+        ended = client.post("/api/calls/end-call", params={"call_id": record_id, "user_id": "user_a", "duration_seconds": 30})
+        assert ended.status_code == 200
+
+
+def test_reused_call_id_does_not_overwrite_other_users_call():
+    client, services = make_client()
+    with client:
+        first = run_session(client, "user_a", "call_123", ["السلام عليكم"])
+        second = run_session(client, "user_b", "call_123", ["أنا مستخدم تاني"])
+        # نفس الـ id كـ call_id مباشرة أيضاً
+        third = run_session(client, "user_b", first, ["محاولة استبدال"])
+
+        assert len({first, second, third}) == 3
+        assert first != "call_123"
+
+        call = client.get(f"/api/calls/summary/{first}")
+        assert call.status_code == 200
+        history = client.get("/api/calls/history", params={"user_id": "user_a", "view": "full"}).json()
+        assert [c["id"] for c in history["calls"]] == [first]
+        assert history["calls"][0]["user_id"] == "user_a"
+        assert history["calls"][0]["conversation"][0]["content"] == "السلام عليكم"
+
+        other = client.get("/api/calls/history", params={"user_id": "user_b"}).json()
+        assert other["total"] == 2
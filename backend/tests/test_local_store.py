@@ -0,0 +1,39 @@
+"""فهرس LocalStore بعد استبدال السجلات"""
+
+import asyncio
+
+from app.services.local_store import LocalStore
+
+
+def test_replaced_call_moves_between_user_indexes():
+    async def scenario():
+        store = LocalStore()
+        await store.insert_calls([
+            {"id": "c1", "user_id": "a", "created_at": "2024-01-01T10:00:00"},
+            {"id": "c2", "user_id": "a", "created_at": "2024-01-02T10:00:00"}
+        ])
+        # نفس الـ id بمستخدم ووقت مختلفين
+        await store.insert_calls([{"id": "c1", "user_id": "b", "created_at": "2024-01-03T10:00:00"}])
+
+        assert [c["id"] for c in await store.user_calls("a", 10)] == ["c2"]
+        assert [c["id"] for c in await store.user_calls("b", 10)] == ["c1"]
+        assert [c["id"] for c in await store.user_calls("a", 10, before=("2024-01-05", "z"))] == ["c2"]
+        assert store.calls_by_user["a"] == [("2024-01-02T10:00:00", "c2")]
+
+        await store.update_call("c2", {"created_at": "2023-12-31T10:00:00"})
+        assert store.calls_by_user["a"] == [("2023-12-31T10:00:00", "c2")]
+
+    asyncio.run(scenario())
+
+
+def test_replaced_message_is_indexed_once():
+    async def scenario():
+        store = LocalStore()
+        message = {"id": "m1", "user_id": "a", "sender_phone": "1", "created_at": "2024-01-01T10:00:00"}
+        await store.insert_messages([message])
+        await store.insert_messages([{**message, "sender_phone": "2", "created_at": "2024-01-02T10:00:00"}])
+
+        assert await store.conversation("a", "1", 10) == []
+        assert [m["id"] for m in await store.conversation("a", "2", 10)] == ["m1"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,20 @@
+"""محرك التقارير: نفس النتيجة من السجل الكامل (الملخص) وشكل stats"""
+
+import pytest
+
+from app.services.report_engine import ReportEngine
+
+CALLS = [
+    # السجل الكامل: المشاعر داخل الملخص
+    {"id": "a", "created_at": "2026-10-12T09:00:00", "status": "completed", "summary": {"caller_sentiment_score": 0.8}},
+    # شكل stats: الحقل مرفوع للمكالمة نفسها
+    {"id": "b", "created_at": "2026-10-12T10:00:00", "status": "completed", "caller_sentiment_score": 0.2},
+    {"id": "c", "created_at": "2026-10-12T11:00:00", "status": "missed"},
+]
+
+
+@pytest.mark.parametrize("numpy_min_calls", [1, 10000])
+def test_sentiment_is_read_from_summary_in_both_paths(numpy_min_calls):
+    report = ReportEngine(numpy_min_calls=numpy_min_calls).daily("u", CALLS, "2026-10-12")
+    assert report["stats"]["avg_sentiment_score"] == 0.5
+    assert report["stats"]["total_calls"] == 3
@@ -0,0 +1,97 @@
+"""الإحصائيات المجمعة: التحديث التدريجي ونافذة الاحتفاظ وحد المستخدمين"""
+
+import asyncio
+from datetime import date, datetime, timedelta
+
+from app.services.analytics import STATUS
+from app.services.database import DatabaseService
+from app.services.rollups import DailyRollups
+
+
+def call(call_id: str, days_ago: int = 0, status: str = "completed", user_id: str = "u"):
+    created_at = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    return {"id": call_id, "user_id": user_id, "created_at": created_at, "status": status, "caller_phone": "+2010"}
+
+
+def day(days_ago: int) -> str:
+    return (date.today() - timedelta(days=days_ago)).isoformat()
+
+
+def test_refresh_reads_only_changed_calls():
+    async def scenario():
+        rollups = DailyRollups(refresh_seconds=0)
+        loads, changes = [], []
+
+        async def load(date_from):
+            loads.append(date_from)
+            return [call("a"), call("b")]
+
+        async def load_changed(since):
+            changes.append(since)
+            # نفس المكالمة "a" من worker آخر بعد تحديثها + مكالمة جديدة، وأثناء
+            # القراءة هذا الـ process حدث "b" - النسخة المقروءة أقدم
+            rollups.update("u", "b", {"status": "missed"})
+            return [call("a", status="missed"), call("b"), call("c")]
+
+        await rollups.ensure("u", load, load_changed)
+        await rollups.ensure("u", load, load_changed)
+
+        assert loads == [None]
+        assert len(changes) == 1 and changes[0] < datetime.now().isoformat()
+        total = rollups.total("u", day(0))
+        assert total.calls == 3
+        assert total.breakdown(STATUS) == {"missed": 2, "completed": 1}
+
+    asyncio.run(scenario())
+
+
+def test_retention_window_drops_old_days():
+    async def scenario():
+        rollups = DailyRollups(retention_days=30)
+
+        async def load(date_from):
+            assert date_from == day(30)
+            return [call("new", 1), call("old", 45)]
+
+        await rollups.ensure("u", load)
+        rollups.add(call("late", 60))
+
+        assert not rollups.covers(day(31)) and rollups.covers(day(30))
+        assert rollups.total("u", day(30)).calls == 1
+        assert rollups.stats()["calls"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_used_users_are_evicted():
+    async def scenario():
+        rollups = DailyRollups(max_users=2)
+
+        async def load(date_from):
+            return [call("x")]
+
+        for user_id in ("a", "b", "a", "c"):
+            await rollups.ensure(user_id, load)
+
+        assert rollups.stats()["users"] == 2
+        assert rollups.total("a", day(0)).calls == 1
+        assert rollups.total("b", day(0)).calls == 0
+
+    asyncio.run(scenario())
+
+
+def test_period_before_retention_is_read_from_calls(monkeypatch):
+    async def scenario():
+        monkeypatch.setenv("ROLLUP_RETENTION_DAYS", "30")
+        db = DatabaseService()
+        await db.initialize()
+        for days_ago in (1, 45, 100):
+            await db.store.insert_call(call(f"call_{days_ago}", days_ago))
+
+        assert (await db.get_period_rollup("u", day(60))).calls == 2
+        assert (await db.get_period_rollup("u", day(60), day(10))).calls == 1
+        assert (await db.get_period_rollup("u", day(7))).calls == 1
+        assert db.rollups.stats()["calls"] == 1
+        await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,106 @@
+"""الكتابة المؤجلة: صف سيئ لا يُسقط باقي الدفعة"""
+
+import asyncio
+import time
+
+from postgrest.exceptions import APIError
+
+from app.services.database import DatabaseService
+from app.services.write_buffer import WriteBehindBuffer
+
+
+def make_db(monkeypatch, backend: str, tmp_path=None) -> DatabaseService:
+    monkeypatch.setenv("DATABASE_BACKEND", backend)
+    monkeypatch.setenv("DB_WRITE_RETRY_MS", "10")
+    if tmp_path is not None:
+        monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "calls.db"))
+    return DatabaseService()
+
+
+def test_poisoned_row_does_not_drop_good_rows_sqlite(monkeypatch, tmp_path):
+    async def scenario():
+        db = make_db(monkeypatch, "sqlite", tmp_path)
+        await db.initialize()
+        dropped = []
+        db.writes._on_drop = lambda table, row_id, row, inserted: dropped.append(row_id)
+
+        good = [await db.queue_call({"user_id": "u", "caller_phone": str(i), "status": "completed"}) for i in range(10)]
+        # created_at NOT NULL - SQLite يرفض الصف
+        await db.writes.insert("calls", "poisoned", {"id": "poisoned", "user_id": "u", "created_at": None})
+        await db.close()
+
+        db = make_db(monkeypatch, "sqlite", tmp_path)
+        await db.initialize()
+        stored = [call["id"] for call in await db.get_user_calls("u", limit=100)]
+        await db.close()
+
+        assert sorted(stored) == sorted(good)
+        assert dropped == ["poisoned"]
+
+    asyncio.run(scenario())
+
+
+class _Query:
+    def __init__(self, client, rows=None, ids=None):
+        self.client, self.rows, self.ids = client, rows, ids
+
+    def upsert(self, rows):
+        return _Query(self.client, rows=rows)
+
+    def update(self, fields):
+        return self
+
+    def in_(self, key, ids):
+        return _Query(self.client, ids=list(ids))
+
+    def execute(self):
+        self.client.requests += 1
+        ids = [row["id"] for row in self.rows] if self.rows is not None else self.ids
+        if any(not row_id.startswith("ok") for row_id in ids):
+            raise APIError({"message": "invalid input syntax for type uuid", "code": "22P02"})
+        self.client.written.extend(ids)
+
+
+class _FakeSupabase:
+    def __init__(self):
+        self.requests = 0
+        self.written = []
+
+    def table(self, name):
+        return _Query(self)
+
+
+def test_poisoned_row_is_isolated_in_supabase_upsert(monkeypatch):
+    async def scenario():
+        db = make_db(monkeypatch, "memory")
+        db.use_local = False
+        db.client = _FakeSupabase()
+
+        rows = [{"id": f"ok_{i}", "user_id": "u"} for i in range(15)]
+        rows.insert(7, {"id": "call_123", "user_id": "u"})
+        failed = await db._flush_writes("calls", rows, {"ok_x": {"status": "missed"}, "bad_y": {"status": "missed"}})
+
+        assert failed == {"call_123", "bad_y"}
+        assert sorted(db.client.written) == sorted([f"ok_{i}" for i in range(15)] + ["ok_x"])
+
+    asyncio.run(scenario())
+
+
+def test_failed_rows_back_off_before_retry():
+    async def scenario():
+        attempts = []
+
+        async def flush(table, inserts, updates):
+            attempts.append(time.monotonic())
+            raise ConnectionError("down")
+
+        buffer = WriteBehindBuffer(flush, batch_size=100, flush_interval=10, max_attempts=3, retry_base=0.05)
+        await buffer.insert("calls", "c1", {"id": "c1"})
+        await buffer.close()
+
+        assert len(attempts) == 3
+        assert attempts[1] - attempts[0] >= 0.05
+        assert attempts[2] - attempts[1] >= 0.1
+        assert buffer.pending_count() == 0
+
+    asyncio.run(scenario())